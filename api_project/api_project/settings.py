@@ -10,11 +10,18 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Repository root, where the perftools package shared by the projects lives
+REPO_DIR = BASE_DIR.parent
+sys.path.append(str(REPO_DIR))
+
+from perftools.sqlite import SQLITE_OPTIONS
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.1/howto/deployment/checklist/
@@ -40,10 +47,12 @@ INSTALLED_APPS = [
     "demo",
     "rest_framework",
     "corsheaders",
+    "perftools",
 ]
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "perftools.profiling.QueryProfilingMiddleware",  # removes itself unless QUERY_PROFILING is enabled
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -55,6 +64,13 @@ MIDDLEWARE = [
 
 CORS_ALLOW_ALL_ORIGINS = True  # dev only
 
+# Per-request SQL profiling (perftools/profiling.py): Server-Timing header and N+1 warnings
+QUERY_PROFILING = {
+    "ENABLED": DEBUG,
+    "SAMPLE_RATE": 1.0,
+    "N_PLUS_ONE_THRESHOLD": 5,
+}
+
 ROOT_URLCONF = "api_project.urls"
 
 
@@ -80,10 +96,12 @@ WSGI_APPLICATION = "api_project.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
+# SQLite tuned for concurrent readers and writers (perftools/sqlite.py)
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": SQLITE_OPTIONS,
     }
 }
 
@@ -0,0 +1,169 @@
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from demo.models import Product
+from demo.serializers import ProductSerializer
+
+# Bulk product writes
+# - Every item is validated with ProductSerializer; invalid items are
+#   reported by their position in the request and skipped, the rest are saved
+# - Valid items are written BATCH_SIZE at a time, one transaction and one
+#   bulk_create/bulk_update/DELETE per batch instead of one per product
+# - If a batch fails in the database, its items are retried one by one
+#   (each in a savepoint) so the error can be pinned to the item
+
+BATCH_SIZE = 500
+
+
+class BulkResult:
+    def __init__(self):
+        self.ids = []
+        self.errors = []
+
+    def error(self, index, errors):
+        self.errors.append({'index': index, 'errors': errors})
+
+    @property
+    def status(self):
+        if not self.errors:
+            return 'success'
+        return 'partial' if self.ids else 'failed'
+
+    def as_dict(self, action):
+        return {
+            'message': self.status,
+            action: len(self.ids),
+            'ids': self.ids,
+            'errors': sorted(self.errors, key=lambda e: e['index']),
+        }
+
+
+def _batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _validate(items, result, partial=False, require_id=False):
+    """Return [(index, id, validated_data)] for the items that pass validation"""
+    serializer = ProductSerializer(partial=partial)
+    valid = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            result.error(index, {'non_field_errors': ['Expected an object.']})
+            continue
+        pk = item.get('id')
+        if require_id and not isinstance(pk, int):
+            result.error(index, {'id': ['This field is required.']})
+            continue
+        try:
+            valid.append((index, pk, serializer.run_validation(item)))
+        except ValidationError as e:
+            result.error(index, e.detail)
+    return valid
+
+
+def _write(batch, result, write_batch, write_one):
+    """
+    Run write_batch(batch) in a transaction, falling back to item by item.
+    The write functions return (ids, [(index, errors)]); nothing is recorded
+    for a transaction that was rolled back.
+    """
+    try:
+        with transaction.atomic():
+            ids, errors = write_batch(batch)
+    except DatabaseError:
+        pass
+    else:
+        result.ids.extend(ids)
+        for index, error in errors:
+            result.error(index, error)
+        return
+
+    for entry in batch:
+        try:
+            with transaction.atomic():
+                ids, errors = write_one(entry)
+        except DatabaseError as e:
+            result.error(entry[0], {'non_field_errors': [str(e)]})
+        else:
+            result.ids.extend(ids)
+            for index, error in errors:
+                result.error(index, error)
+
+
+def bulk_create_products(items, batch_size=BATCH_SIZE):
+    result = BulkResult()
+    valid = _validate(items, result)
+
+    def write_batch(batch):
+        products = Product.objects.bulk_create([Product(**data) for _, _, data in batch])
+        return [product.id for product in products], []
+
+    def write_one(entry):
+        return [Product.objects.create(**entry[2]).id], []
+
+    for batch in _batches(valid, batch_size):
+        _write(batch, result, write_batch, write_one)
+    return result
+
+
+def bulk_update_products(items, partial=False, batch_size=BATCH_SIZE):
+    """Items must carry their `id`; with partial=True only the given fields change"""
+    result = BulkResult()
+    valid = _validate(items, result, partial=partial, require_id=True)
+
+    def write_batch(batch):
+        existing = Product.objects.in_bulk([pk for _, pk, _ in batch])
+        changed = []
+        missing = []
+        fields = set()
+        for index, pk, data in batch:
+            product = existing.get(pk)
+            if product is None:
+                missing.append((index, {'id': [f'Product {pk} does not exist.']}))
+                continue
+            for field, value in data.items():
+                setattr(product, field, value)
+            fields.update(data)
+            changed.append(product)
+        if changed and fields:
+            # bulk_update() skips save(), so bump the ETag validators here
+            now = timezone.now()
+            for product in changed:
+                product.version += 1
+                product.updated_at = now
+            Product.objects.bulk_update(changed, sorted(fields | {'version', 'updated_at'}))
+        return [product.id for product in changed], missing
+
+    def write_one(entry):
+        return write_batch([entry])
+
+    for batch in _batches(valid, batch_size):
+        _write(batch, result, write_batch, write_one)
+    return result
+
+
+def bulk_delete_products(ids, batch_size=BATCH_SIZE):
+    """`ids` may be plain ids or objects with an `id`"""
+    result = BulkResult()
+    wanted = []
+    for index, item in enumerate(ids):
+        pk = item.get('id') if isinstance(item, dict) else item
+        if not isinstance(pk, int):
+            result.error(index, {'id': ['A valid integer is required.']})
+            continue
+        wanted.append((index, pk))
+
+    for batch in _batches(wanted, batch_size):
+        with transaction.atomic():
+            existing = set(
+                Product.objects.filter(id__in=[pk for _, pk in batch]).values_list('id', flat=True)
+            )
+            Product.objects.filter(id__in=existing).delete()
+        for index, pk in batch:
+            if pk in existing:
+                result.ids.append(pk)
+            else:
+                result.error(index, {'id': [f'Product {pk} does not exist.']})
+    return result
@@ -0,0 +1,52 @@
+import json
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+
+from demo.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare creating products one request at a time with the bulk endpoint "
+        "(products/sec over HTTP through the full middleware stack). Runs in a throwaway "
+        "SQLite file, like db.sqlite3, so every per-item commit pays for its fsync."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        count = options['items']
+        items = [{'name': f'Product {i}', 'price': f'{i % 1000}.99', 'stock': i % 50} for i in range(count)]
+        client = Client(HTTP_HOST='localhost')
+
+        old_name = connection.settings_dict['NAME']
+        handle, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        connection.settings_dict['TEST']['NAME'] = path
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            started = time.perf_counter()
+            for item in items:
+                client.post('/api/product/list/', json.dumps(item), content_type='application/json')
+            single = time.perf_counter() - started
+            assert Product.objects.count() == count
+            Product.objects.all().delete()
+
+            started = time.perf_counter()
+            for start in range(0, count, 5000):
+                body = '\n'.join(json.dumps(item) for item in items[start:start + 5000])
+                client.post('/api/product/bulk/', body, content_type='application/x-ndjson')
+            bulk = time.perf_counter() - started
+            assert Product.objects.count() == count
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.stdout.write(f"per item {single:7.2f}s  {count / single:9.0f} products/sec")
+        self.stdout.write(f"bulk     {bulk:7.2f}s  {count / bulk:9.0f} products/sec")
+        self.stdout.write(self.style.SUCCESS(f"{single / bulk:.0f}x faster"))
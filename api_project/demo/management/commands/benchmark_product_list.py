@@ -0,0 +1,78 @@
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework.renderers import JSONRenderer
+
+from demo.models import Product
+from demo.serializers import ProductSerializer
+from demo.streaming import stream_json_array, stream_ndjson
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the serializer product list with the streaming one "
+        "(total time, time to the first rows, peak memory). Runs in a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--skip-serializer', action='store_true',
+                            help="Only benchmark streaming (the serializer path is slow at 1M rows)")
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.seed(options['rows'])
+            queryset = Product.objects.all()
+            chunk_size = options['chunk_size']
+
+            if not options['skip_serializer']:
+                self.report('serializer', lambda: [
+                    JSONRenderer().render(ProductSerializer(queryset, many=True).data)
+                ])
+            self.report('stream json', lambda: stream_json_array(queryset, chunk_size))
+            self.report('stream ndjson', lambda: stream_ndjson(queryset, chunk_size))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def seed(self, rows):
+        started = time.perf_counter()
+        with transaction.atomic():
+            for start in range(0, rows, 10000):
+                Product.objects.bulk_create(
+                    Product(name=f'Product {i}', price=Decimal(i % 1000) + Decimal('0.99'), stock=i % 50)
+                    for i in range(start, min(start + 10000, rows))
+                )
+        self.stdout.write(f"Seeded {rows} products in {time.perf_counter() - started:.1f}s")
+
+    def consume(self, make_body):
+        started = time.perf_counter()
+        first_rows = None
+        size = 0
+        for chunk in make_body():
+            # The opening '[' alone doesn't count
+            if first_rows is None and len(chunk) > 1:
+                first_rows = time.perf_counter() - started
+            size += len(chunk)
+        return time.perf_counter() - started, first_rows or 0, size
+
+    def report(self, label, make_body):
+        total, first_rows, size = self.consume(make_body)
+
+        # Separate run for memory; tracemalloc slows everything down
+        tracemalloc.start()
+        try:
+            self.consume(make_body)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.stdout.write(
+            f"{label:<14} total {total:7.2f}s  first rows {first_rows * 1000:8.1f}ms  "
+            f"peak {peak / 1024 / 1024:8.1f}MB  body {size / 1024 / 1024:.1f}MB"
+        )
@@ -6,7 +6,17 @@ class Product(models.Model):
     name = models.CharField(max_length=255)
     price = models.DecimalField(decimal_places=2,max_digits=10,default=0.0)
     stock = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    version = models.PositiveIntegerField(default=1, editable=False)
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # A new version on every change; it is the ETag of ProductDetail (perftools/conditional.py)
+        if not self._state.adding:
+            self.version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version', 'updated_at'}
+        super().save(*args, **kwargs)
+
@@ -1,7 +1,12 @@
 from rest_framework import serializers
 from demo.models import Product
+from perftools.compiled import CompiledSerializer
 
 class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
-        fields = '__all__'
\ No newline at end of file
+        fields = ['id', 'name', 'price', 'stock']
+
+
+# Read-only fast path for list output (plain list and streaming, demo/streaming.py)
+PRODUCT_ROWS = CompiledSerializer(ProductSerializer)
@@ -0,0 +1,90 @@
+import json
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from demo.serializers import PRODUCT_ROWS
+
+# Streaming product lists
+# - Rows are read with QuerySet.iterator(), so only one chunk of products is
+#   in memory at a time instead of the whole table
+# - Each row is encoded straight from values_list() tuples by the compiled
+#   ProductSerializer (PRODUCT_ROWS.json_rows(), perftools/compiled.py), so
+#   the fields always follow the serializer; the output is the same JSON
+#   ProductSerializer + JSONRenderer produce, without building a serializer,
+#   a dict and a Decimal field per row
+# - Encoded rows are joined into blocks so the response yields a few KB at a
+#   time rather than one tiny string per product
+
+CHUNK_SIZE = 2000
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Newline-delimited JSON: one object per line (lets `Accept: application/x-ndjson` negotiate)"""
+
+    media_type = NDJSON_MEDIA_TYPE
+    format = 'ndjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        rows = data if isinstance(data, list) else [data]
+        return b''.join(JSONRenderer().render(row) + b'\n' for row in rows)
+
+
+class NDJSONParser(BaseParser):
+    """Parses `Content-Type: application/x-ndjson` bodies into a list of objects"""
+
+    media_type = NDJSON_MEDIA_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        items = []
+        for number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                raise ParseError(f'NDJSON parse error on line {number}: {e}')
+        return items
+
+
+def _blocks(queryset, separator, chunk_size):
+    rows = queryset.values_list(*PRODUCT_ROWS.sources).iterator(chunk_size=chunk_size)
+    while chunk := list(islice(rows, chunk_size)):
+        yield _finish(separator.join(PRODUCT_ROWS.json_rows(chunk)))
+
+
+def _finish(text):
+    # JSONRenderer escapes these two for JavaScript compatibility
+    if '\u2028' in text or '\u2029' in text:
+        text = text.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
+    return text.encode('utf-8')
+
+
+def stream_json_array(queryset, chunk_size=CHUNK_SIZE):
+    """Yield `[row,row,...]` in blocks of chunk_size rows"""
+    yield b'['
+    first = True
+    for block in _blocks(queryset, ',', chunk_size):
+        if not first:
+            yield b','
+        first = False
+        yield block
+    yield b']'
+
+
+def stream_ndjson(queryset, chunk_size=CHUNK_SIZE):
+    """Yield one JSON object per line"""
+    for block in _blocks(queryset, '\n', chunk_size):
+        yield block + b'\n'
+
+
+def streaming_product_response(queryset, ndjson=False, chunk_size=CHUNK_SIZE):
+    if ndjson:
+        return StreamingHttpResponse(stream_ndjson(queryset, chunk_size), content_type=NDJSON_MEDIA_TYPE)
+    return StreamingHttpResponse(stream_json_array(queryset, chunk_size), content_type='application/json')
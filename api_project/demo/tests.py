@@ -1,3 +1,222 @@
-from django.test import TestCase
+import json
+from decimal import Decimal
+from unittest.mock import patch
 
-# Create your tests here.
+from django.http import StreamingHttpResponse
+from django.test import TestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+
+from demo.models import Product
+from perftools.compiled import CompiledSerializer
+from perftools.profiling import query_budget
+from demo.serializers import ProductSerializer
+from demo.streaming import stream_json_array
+
+
+def streamed_body(response):
+    return b''.join(response.streaming_content).decode('utf-8')
+
+
+class ProductQueryBudgetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Product.objects.bulk_create(Product(name=f'Product {i}', price=i, stock=i) for i in range(20))
+
+    def test_product_list_runs_one_query(self):
+        with query_budget(1):
+            response = self.client.get('/api/product/list/')
+            body = streamed_body(response)
+        self.assertEqual(len(json.loads(body)), 20)
+
+    @override_settings(QUERY_PROFILING={'ENABLED': True})
+    def test_server_timing_header(self):
+        response = self.client.get('/api/product/list/')
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+
+class ProductStreamingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Product.objects.bulk_create([
+            Product(name='Plain', price=Decimal('10'), stock=3),
+            Product(name='Quote " and \\ slash', price=Decimal('0.5'), stock=0),
+            Product(name='Ünïcode   line', price=Decimal('12345678.99'), stock=-1),
+        ])
+
+    def expected(self):
+        return ProductSerializer(Product.objects.all(), many=True).data
+
+    def test_json_array_matches_serializer(self):
+        response = self.client.get('/api/product/list/', HTTP_ACCEPT='application/json')
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        body = streamed_body(response)
+        self.assertEqual(json.loads(body), self.expected())
+        self.assertNotIn(' ', body)
+
+    def test_ndjson(self):
+        response = self.client.get('/api/product/list/', HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = streamed_body(response).splitlines()
+        self.assertEqual([json.loads(line) for line in lines], self.expected())
+
+    def test_small_chunks_and_empty_table(self):
+        body = b''.join(stream_json_array(Product.objects.all(), chunk_size=2))
+        self.assertEqual(json.loads(body), self.expected())
+        self.assertEqual(b''.join(stream_json_array(Product.objects.none())), b'[]')
+
+    def test_stream_is_byte_for_byte_the_rendered_serializer(self):
+        body = b''.join(stream_json_array(Product.objects.all()))
+        self.assertEqual(body, JSONRenderer().render(self.expected()))
+
+    def test_stream_follows_the_serializer_fields(self):
+        class AllFieldsSerializer(ProductSerializer):
+            class Meta(ProductSerializer.Meta):
+                fields = '__all__'
+
+        with patch('demo.streaming.PRODUCT_ROWS', CompiledSerializer(AllFieldsSerializer)):
+            body = b''.join(stream_json_array(Product.objects.all()))
+        expected = AllFieldsSerializer(Product.objects.all(), many=True).data
+        self.assertEqual(body, JSONRenderer().render(expected))
+        self.assertIn('version', json.loads(body)[0])
+
+    def test_browsable_api_is_not_streamed(self):
+        response = self.client.get('/api/product/list/', HTTP_ACCEPT='text/html')
+        self.assertNotIsInstance(response, StreamingHttpResponse)
+
+
+class CompiledSerializerTests(TestCase):
+
+    def test_matches_model_serializer(self):
+        Product.objects.bulk_create([
+            Product(name='Plain', price=Decimal('10'), stock=3),
+            Product(name='Ünïcode', price=Decimal('0.005'), stock=-1),
+        ])
+        queryset = Product.objects.order_by('id')
+        self.assertEqual(
+            CompiledSerializer(ProductSerializer).serialize(queryset),
+            ProductSerializer(queryset, many=True).data,
+        )
+
+    def test_browsable_list_uses_compiled_rows(self):
+        Product.objects.create(name='Lamp', price=Decimal('5.5'), stock=1)
+        response = self.client.get('/api/product/list/', HTTP_ACCEPT='text/html')
+        self.assertContains(response, '&quot;price&quot;: &quot;5.50&quot;')
+
+
+class ProductBulkTests(TestCase):
+    url = '/api/product/bulk/'
+
+    def send(self, method, items, content_type='application/json'):
+        if content_type == 'application/json':
+            body = json.dumps(items)
+        else:
+            body = '\n'.join(json.dumps(item) for item in items) + '\n'
+        return getattr(self.client, method)(self.url, body, content_type=content_type)
+
+    def test_create_json(self):
+        items = [{'name': f'Bulk {i}', 'price': '1.50', 'stock': i} for i in range(1200)]
+        # 3 batches of at most 500: a savepoint and its release each, plus the
+        # multi-row INSERTs SQLite's 999-variable limit splits them into
+        with query_budget(14):
+            response = self.send('post', items)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 1200)
+        self.assertEqual(Product.objects.count(), 1200)
+
+    def test_create_ndjson_reports_invalid_items(self):
+        items = [{'name': 'Good', 'price': '2.00'}, {'price': 'abc'}, {'name': 'Also good'}]
+        response = self.send('post', items, 'application/x-ndjson')
+        self.assertEqual(response.status_code, 207)
+        data = response.json()
+        self.assertEqual(data['created'], 2)
+        self.assertEqual([e['index'] for e in data['errors']], [1])
+        self.assertIn('name', data['errors'][0]['errors'])
+        self.assertIn('price', data['errors'][0]['errors'])
+
+    def test_bad_ndjson_line(self):
+        response = self.client.post(self.url, '{"name": "a"}\n{oops\n', content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+
+    def test_patch_and_put(self):
+        products = Product.objects.bulk_create(Product(name=f'P{i}', price=1, stock=1) for i in range(3))
+        response = self.send('patch', [{'id': p.id, 'stock': 9} for p in products] + [{'id': 999999, 'stock': 1}])
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.json()['errors'][0]['index'], 3)
+        self.assertEqual(set(Product.objects.values_list('stock', flat=True)), {9})
+        self.assertEqual(Product.objects.get(id=products[0].id).name, 'P0')
+
+        response = self.send('put', [{'id': products[0].id, 'stock': 1}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('name', response.json()['errors'][0]['errors'])
+
+    def test_delete(self):
+        products = Product.objects.bulk_create(Product(name=f'P{i}', price=1) for i in range(3))
+        response = self.send('delete', [products[0].id, {'id': products[1].id}, 'x'])
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.json()['deleted'], 2)
+        self.assertEqual(list(Product.objects.values_list('id', flat=True)), [products[2].id])
+
+    def test_body_must_be_a_list(self):
+        response = self.send('post', {'name': 'single'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ProductConditionalTests(TestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(name='Lamp', price=Decimal('5.00'), stock=2)
+        self.url = f'/api/product/{self.product.id}/'
+
+    def test_etag_and_304(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertEqual(etag, f'"{self.product.id}-1"')
+        self.assertIn('Last-Modified', response)
+
+        # One query for the validators, none for the product or serializer
+        with query_budget(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_get_a_new_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.product.stock = 5
+        self.product.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], f'"{self.product.id}-2"')
+
+    def test_if_match_on_put_and_patch(self):
+        etag = self.client.get(self.url)['ETag']
+        body = json.dumps({'name': 'Lamp', 'price': '6.00', 'stock': 1})
+        response = self.client.put(self.url, body, content_type='application/json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        new_etag = response['ETag']
+        self.assertNotEqual(new_etag, etag)
+
+        # The old ETag is stale now
+        response = self.client.patch(self.url, json.dumps({'stock': 9}), content_type='application/json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        response = self.client.patch(self.url, json.dumps({'stock': 9}), content_type='application/json', HTTP_IF_MATCH=new_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Product.objects.get(id=self.product.id).stock, 9)
+
+    def test_stale_version_caught_inside_transaction(self):
+        from perftools.conditional import claim_version
+        request = type('Request', (), {'headers': {'If-Match': f'"{self.product.id}-1"'}})()
+        self.assertTrue(claim_version(request, Product.objects.all(), self.product.id))
+        Product.objects.get(id=self.product.id).save()
+        self.assertFalse(claim_version(request, Product.objects.all(), self.product.id))
+
+    def test_bulk_update_bumps_version(self):
+        self.client.patch('/api/product/bulk/', json.dumps([{'id': self.product.id, 'stock': 4}]), content_type='application/json')
+        self.assertEqual(Product.objects.get(id=self.product.id).version, 2)
+
+    def test_missing_product(self):
+        self.assertEqual(self.client.get('/api/product/999999/').status_code, 404)
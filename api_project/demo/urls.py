@@ -3,5 +3,6 @@ from demo import views
 urlpatterns = [
     path("",views.home,name="home"),
     path('product/list/',views.ProductList.as_view(),name='product-list'),
+    path('product/bulk/',views.ProductBulk.as_view(),name='product-bulk'),
     path('product/<int:id>/',views.ProductDetail.as_view(),name='product-detail'),
 ]
\ No newline at end of file
@@ -1,11 +1,17 @@
 from django.shortcuts import render
 from demo.models import Product
-from demo.serializers import ProductSerializer
+from demo.serializers import ProductSerializer, PRODUCT_ROWS
 
 from django.http import Http404
+from django.db import transaction
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer, BrowsableAPIRenderer
+from rest_framework.parsers import JSONParser
+from demo.streaming import NDJSONParser, NDJSONRenderer, streaming_product_response
+from perftools.conditional import conditional_detail, claim_version, make_etag
+from demo.bulk import bulk_create_products, bulk_update_products, bulk_delete_products
 
 # Create your views here.
 
@@ -13,12 +19,16 @@ def home(request):
     return render(request,'index.html')
 
 
-
 class ProductList(APIView):
+    # JSON is streamed as an array, NDJSON (Accept: application/x-ndjson) one product per line;
+    # the browsable API gets the compiled (values_list based) serializer
+    renderer_classes = [JSONRenderer, NDJSONRenderer, BrowsableAPIRenderer]
+
     def get(self,request):
         object = Product.objects.all()
-        serializer = ProductSerializer(object,many=True)
-        return Response(serializer.data,status=status.HTTP_200_OK)
+        if request.accepted_renderer.format != 'api':
+            return streaming_product_response(object, ndjson=request.accepted_renderer.format == 'ndjson')
+        return Response(PRODUCT_ROWS.serialize(object),status=status.HTTP_200_OK)
     def post(self,request):
         serializer = ProductSerializer(data = request.data)
         if serializer.is_valid():
@@ -26,8 +36,81 @@ class ProductList(APIView):
             return Response({'message':'success','data':serializer.data},status=status.HTTP_200_OK)
         return Response(serializer.errors,status=status.HTTP_400_BAD_REQUEST)
 
+@conditional_detail(Product)
 class ProductDetail(APIView):
+    # ETag / Last-Modified come from the version and updated_at columns (perftools/conditional.py):
+    # GET answers 304 without loading the product, PUT/PATCH honour If-Match
+    def get_object(self,id):
+        try:
+            return Product.objects.get(id=id)
+        except Product.DoesNotExist:
+            raise Http404
+
     def get(self,request,id):
-        product = Product.objects.get(id=id)
+        product = self.get_object(id)
         serializer = ProductSerializer(product)
         return Response(serializer.data,status=status.HTTP_200_OK)
+
+    def put(self,request,id):
+        return self.update(request,id)
+
+    def patch(self,request,id):
+        return self.update(request,id,partial=True)
+
+    def update(self,request,id,partial=False):
+        with transaction.atomic():
+            if not claim_version(request,Product.objects.all(),id):
+                return Response({'message':'Product was changed by someone else'},status=status.HTTP_412_PRECONDITION_FAILED)
+            product = self.get_object(id)
+            serializer = ProductSerializer(product,data=request.data,partial=partial)
+            if not serializer.is_valid():
+                return Response(serializer.errors,status=status.HTTP_400_BAD_REQUEST)
+            serializer.save()
+        response = Response(serializer.data,status=status.HTTP_200_OK)
+        response['ETag'] = make_etag(product.id,product.version)
+        return response
+
+
+class ProductBulk(APIView):
+    """
+    Bulk writes: the body is a JSON array or NDJSON (one product per line).
+    POST creates, PUT/PATCH update (items need an `id`), DELETE takes ids.
+    Invalid items are reported by index in `errors`; the valid ones are saved.
+    """
+    parser_classes = [JSONParser, NDJSONParser]
+    max_items = 10000
+
+    def items(self, request):
+        if not isinstance(request.data, list):
+            return None, Response({'message': 'Expected a list of products'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > self.max_items:
+            return None, Response({'message': f'At most {self.max_items} items per request'}, status=status.HTTP_400_BAD_REQUEST)
+        return request.data, None
+
+    def respond(self, result, action, success_status=status.HTTP_200_OK):
+        codes = {'success': success_status, 'partial': status.HTTP_207_MULTI_STATUS, 'failed': status.HTTP_400_BAD_REQUEST}
+        return Response(result.as_dict(action), status=codes[result.status])
+
+    def post(self,request):
+        items, error = self.items(request)
+        if error:
+            return error
+        return self.respond(bulk_create_products(items), 'created', status.HTTP_201_CREATED)
+
+    def put(self,request):
+        items, error = self.items(request)
+        if error:
+            return error
+        return self.respond(bulk_update_products(items), 'updated')
+
+    def patch(self,request):
+        items, error = self.items(request)
+        if error:
+            return error
+        return self.respond(bulk_update_products(items, partial=True), 'updated')
+
+    def delete(self,request):
+        items, error = self.items(request)
+        if error:
+            return error
+        return self.respond(bulk_delete_products(items), 'deleted')
@@ -20,7 +20,7 @@ export default function App() {
         <TaskForm refresh={handleRefresh} />
         
         <div className="mt-8">
-          <TaskList key={refreshTrigger} />
+          <TaskList refreshTrigger={refreshTrigger} />
         </div>
       </div>
     </div>
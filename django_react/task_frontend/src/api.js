@@ -4,4 +4,31 @@ const API = axios.create({
   baseURL: "http://127.0.0.1:8000/api/"
 });
 
-export default API;
\ No newline at end of file
+// One page of tasks: { results, next }. Pass `next` back as the cursor for the following page.
+// Filters: completed (true/false) and title (prefix)
+export const fetchTasks = async ({ cursor, completed, title, pageSize = 50 } = {}) => {
+  const res = cursor
+    ? await API.get(cursor)
+    : await API.get("tasks/", {
+        params: {
+          page_size: pageSize,
+          completed: completed ?? undefined,
+          title: title || undefined
+        }
+      });
+  return res.data;
+};
+
+// Changes since a sync token: { since, tasks, deleted, more }.
+// Without a token only the current one is returned; take it together with the first page.
+export const syncTasks = async (since) => {
+  const res = await API.get("tasks/sync/", {
+    params: { since: since ?? undefined }
+  });
+  return res.data;
+};
+
+// Server-sent task events (created / updated / deleted / resync); needs the ASGI server
+export const openTaskEvents = () => new EventSource(`${API.defaults.baseURL}tasks/events/`);
+
+export default API;
@@ -1,15 +1,30 @@
-import { useEffect, useState } from "react";
-import API from "../api";
+import { useEffect, useRef, useState } from "react";
+import { fetchTasks, openTaskEvents, syncTasks } from "../api";
 import TaskItem from "./TaskItem";
 
-export default function TaskList() {
+export default function TaskList({ refreshTrigger }) {
   const [tasks, setTasks] = useState([]);
+  const [next, setNext] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [completed, setCompleted] = useState(null);
+  const [title, setTitle] = useState("");
+  const syncToken = useRef(null);
+  // Latest filters and paging state, for the long-lived event stream handlers
+  const view = useRef({ completed, title, next });
+  useEffect(() => {
+    view.current = { completed, title, next };
+  }, [completed, title, next]);
 
-  const fetchTasks = async () => {
+  const loadFirstPage = async () => {
     try {
-      const res = await API.get("tasks/");
-      setTasks(res.data);
+      // Token first: a write that lands before the page is read then comes back
+      // again from the next sync instead of being missed
+      const token = await syncTasks();
+      const data = await fetchTasks({ completed, title: title.trim() });
+      syncToken.current = token.since;
+      setTasks(data.results);
+      setNext(data.next);
     } catch (err) {
       console.error(err);
     } finally {
@@ -17,14 +32,104 @@ export default function TaskList() {
     }
   };
 
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const data = await fetchTasks({ cursor: next });
+      setTasks((prev) => [...prev, ...data.results]);
+      setNext(data.next);
+    } catch (err) {
+      console.error(err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  const matchesFilters = (task) => {
+    const { completed, title } = view.current;
+    return (completed === null || task.completed === completed) && task.title.startsWith(title.trim());
+  };
+
+  const mergeChanges = (changedTasks, deletedIds) => {
+    const changed = new Map(changedTasks.map((task) => [task.id, task]));
+    const deleted = new Set(deletedIds);
+    setTasks((prev) => {
+      const kept = prev
+        .filter((task) => !deleted.has(task.id))
+        .map((task) => changed.get(task.id) ?? task)
+        .filter(matchesFilters);
+      const known = new Set(prev.map((task) => task.id));
+      // New tasks sort last, so they belong on screen once the last page is loaded
+      const added = view.current.next
+        ? []
+        : changedTasks.filter((task) => !known.has(task.id) && matchesFilters(task));
+      return [...kept, ...added];
+    });
+  };
+
+  // Apply only what changed since the last sync instead of reloading the list
+  const applyChanges = async () => {
+    if (syncToken.current === null) return;
+    try {
+      let data;
+      do {
+        data = await syncTasks(syncToken.current);
+        syncToken.current = data.since;
+        mergeChanges(data.tasks, data.deleted);
+      } while (data.more);
+    } catch (err) {
+      console.error(err);
+    }
+  };
+
+  useEffect(() => {
+    const timer = setTimeout(loadFirstPage, 250);
+    return () => clearTimeout(timer);
+  }, [completed, title]);
+
+  useEffect(() => {
+    if (refreshTrigger) applyChanges();
+  }, [refreshTrigger]);
+
+  // Pushed changes; after (re)connecting or falling behind, catch up with a sync.
+  // One stream for the component's lifetime: the handlers read the current
+  // filters through `view`, so changing them doesn't reconnect
   useEffect(() => {
-    fetchTasks();
+    const source = openTaskEvents();
+    const onChange = (e) => {
+      const { id, task } = JSON.parse(e.data);
+      mergeChanges(task ? [task] : [], task ? [] : [id]);
+    };
+    source.addEventListener("created", onChange);
+    source.addEventListener("updated", onChange);
+    source.addEventListener("deleted", onChange);
+    source.addEventListener("resync", applyChanges);
+    source.onopen = applyChanges;
+    return () => source.close();
   }, []);
 
   if (loading) return <div className="text-center py-10 text-slate-400">Loading tasks...</div>;
 
   return (
     <div className="space-y-3">
+      <div className="flex gap-3">
+        <input
+          className="flex-1 bg-white border border-slate-200 p-2 rounded-xl outline-none focus:ring-2 focus:ring-blue-500"
+          placeholder="Title starts with..."
+          value={title}
+          onChange={(e) => setTitle(e.target.value)}
+        />
+        <select
+          className="bg-white border border-slate-200 p-2 rounded-xl outline-none"
+          value={completed === null ? "" : String(completed)}
+          onChange={(e) => setCompleted(e.target.value === "" ? null : e.target.value === "true")}
+        >
+          <option value="">All</option>
+          <option value="false">Open</option>
+          <option value="true">Completed</option>
+        </select>
+      </div>
+
       {tasks.length === 0 ? (
         <div className="text-center py-12 bg-white rounded-2xl border-2 border-dashed border-slate-200">
           <p className="text-slate-400">No tasks found. Start by adding one above!</p>
@@ -34,10 +139,20 @@ export default function TaskList() {
           <TaskItem
             key={task.id}
             task={task}
-            refresh={fetchTasks}
+            refresh={applyChanges}
           />
         ))
       )}
+
+      {next && (
+        <button
+          onClick={loadMore}
+          disabled={loadingMore}
+          className="w-full bg-white border border-slate-200 text-slate-600 font-semibold py-2 rounded-xl hover:bg-slate-100 transition-all disabled:opacity-50"
+        >
+          {loadingMore ? "Loading..." : "Load more"}
+        </button>
+      )}
     </div>
   );
-}
\ No newline at end of file
+}
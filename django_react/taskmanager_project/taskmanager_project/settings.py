@@ -10,11 +10,18 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Repository root, where the perftools package shared by the projects lives
+REPO_DIR = BASE_DIR.parent.parent
+sys.path.append(str(REPO_DIR))
+
+from perftools.sqlite import SQLITE_OPTIONS
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/6.0/howto/deployment/checklist/
@@ -39,10 +46,12 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'tasks',
     'corsheaders',
+    'perftools',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'perftools.profiling.QueryProfilingMiddleware',  # removes itself unless QUERY_PROFILING is enabled
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -52,6 +61,13 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
 ]
 
+# Per-request SQL profiling (perftools/profiling.py): Server-Timing header and N+1 warnings
+QUERY_PROFILING = {
+    'ENABLED': DEBUG,
+    'SAMPLE_RATE': 1.0,
+    'N_PLUS_ONE_THRESHOLD': 5,
+}
+
 ROOT_URLCONF = 'taskmanager_project.urls'
 
 LOGIN_URL = '/login/'
@@ -79,10 +95,12 @@ WSGI_APPLICATION = 'taskmanager_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# SQLite tuned for concurrent readers and writers (perftools/sqlite.py)
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': SQLITE_OPTIONS,
     }
 }
 
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import threading
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Server-sent events for task changes (GET /api/tasks/events/, ASGI only)
+# - Task signals publish created/updated/deleted events once the write commits
+# - The broker is in-process: every subscriber is an asyncio.Queue on the event
+#   loop serving its connection, fed with call_soon_threadsafe() so sync views
+#   (running in a worker thread) can publish; idle connections cost a queue and
+#   a suspended coroutine, no thread
+# - Queues are bounded: a client that falls QUEUE_SIZE events behind loses its
+#   backlog and gets a `resync` event telling it to catch up with /sync/
+# - A comment line every HEARTBEAT_INTERVAL seconds keeps proxies from closing
+#   idle connections and lets the server notice clients that went away
+# - Event ids are change log ids (TaskChange), usable as the /sync/ token
+# - One broker per process: with several worker processes, clients only hear
+#   about changes made in their own process and rely on resync for the rest
+
+QUEUE_SIZE = 100
+HEARTBEAT_INTERVAL = 15
+RETRY_MS = 3000
+
+RESYNC = 'event: resync\ndata: {}\n\n'
+HEARTBEAT = ': ping\n\n'
+
+
+def format_event(event_id, event, data):
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+class Subscription:
+    def __init__(self, size):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=size)
+
+    def put(self, message):
+        """Runs on the subscriber's event loop"""
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+
+class Broker:
+    def __init__(self, queue_size=QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def subscribe(self):
+        """Call from the event loop that will read the subscription"""
+        subscription = Subscription(self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, message):
+        """Thread-safe; `message` is an already formatted SSE event"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, message)
+            except RuntimeError:
+                # The subscriber's loop is closed
+                self.unsubscribe(subscription)
+
+    async def stream(self):
+        """SSE body for one client: events as they come, heartbeats in between"""
+        subscription = self.subscribe()
+        try:
+            yield f'retry: {RETRY_MS}\n\n'
+            while True:
+                try:
+                    yield await asyncio.wait_for(subscription.queue.get(), HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT
+        finally:
+            self.unsubscribe(subscription)
+
+
+broker = Broker()
+
+
+def publish_task_change(change_id, event, task_id, task=None):
+    if not len(broker):
+        return
+    data = {'id': task_id, 'task': task} if task is not None else {'id': task_id}
+    broker.publish(format_event(change_id, event, data))
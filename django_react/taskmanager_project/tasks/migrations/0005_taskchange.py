@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:43
+
+from django.db import migrations, models
+
+
+def log_existing_tasks(apps, schema_editor):
+    # Tasks created before the change log existed are synced as changes too
+    Task = apps.get_model('tasks', 'Task')
+    TaskChange = apps.get_model('tasks', 'TaskChange')
+    task_ids = Task.objects.order_by('created_at', 'id').values_list('id', flat=True)
+    TaskChange.objects.bulk_create(TaskChange(task_id=task_id) for task_id in task_ids.iterator())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0004_task_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_id', models.IntegerField(unique=True)),
+                ('deleted', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.RunPython(log_existing_tasks, migrations.RunPython.noop),
+    ]
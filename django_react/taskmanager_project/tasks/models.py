@@ -1,10 +1,45 @@
-from django.db import models
+from django.db import models, transaction
 
 class Task(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     completed = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    class Meta:
+        # Back the task list: keyset pages on (created_at, id), optionally
+        # filtered by completed, and title prefix search
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='task_created_idx'),
+            models.Index(fields=['completed', 'created_at', 'id'], name='task_completed_created_idx'),
+            models.Index(fields=['title'], name='task_title_idx'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+    def save(self, *args, **kwargs):
+        # A new version on every change; it is the ETag of the task detail view (perftools/conditional.py)
+        if not self._state.adding:
+            self.version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version', 'updated_at'}
+        # Atomic, so the change log row written by the post_save signal commits with the task
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+class TaskChange(models.Model):
+    """
+    Change log behind the delta-sync endpoint (GET /api/tasks/sync/?since=<id>).
+    - One row per task: a change replaces the task's previous row, so the new
+      row's id is the task's latest change sequence and the log never grows
+      beyond one row per task ever created
+    - Deleted tasks keep their row as a tombstone (deleted=True)
+    """
+    task_id = models.IntegerField(unique=True)
+    deleted = models.BooleanField(default=False)
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return f"{self.id}: task {self.task_id}{' deleted' if self.deleted else ''}"
@@ -0,0 +1,33 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .events import broker, publish_task_change
+from .models import Task, TaskChange
+from .serializers import TaskSerializer
+
+
+# ==================== DELTA SYNC CHANGE LOG ====================
+
+def record_change(task_id, deleted=False):
+    """Move the task to the end of the change log; runs in the same transaction as the write (Task.save/delete)"""
+    TaskChange.objects.filter(task_id=task_id).delete()
+    return TaskChange.objects.create(task_id=task_id, deleted=deleted)
+
+
+@receiver(post_save, sender=Task)
+def log_task_saved(sender, instance, created, **kwargs):
+    change = record_change(instance.id)
+    # Pushed to SSE clients once committed (tasks/events.py); no serializing without listeners
+    if len(broker):
+        event = 'created' if created else 'updated'
+        task = TaskSerializer(instance).data
+        transaction.on_commit(partial(publish_task_change, change.id, event, instance.id, task))
+
+
+@receiver(post_delete, sender=Task)
+def log_task_deleted(sender, instance, **kwargs):
+    change = record_change(instance.id, deleted=True)
+    transaction.on_commit(partial(publish_task_change, change.id, 'deleted', instance.id))
@@ -1,3 +1,263 @@
-from django.test import TestCase
+import asyncio
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from django.utils import timezone
+
+from . import events
+from perftools.compiled import CompiledSerializer
+from .events import Broker, broker
+from .models import Task, TaskChange
+from .pagination import TaskCursorPagination
+from perftools.profiling import query_budget
+from .serializers import TaskSerializer
+from .views import TaskListCreateView
+
+
+class TaskQueryBudgetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Task.objects.bulk_create(Task(title=f'Task {i}') for i in range(20))
+
+    def test_task_list_runs_one_query(self):
+        with query_budget(1):
+            response = self.client.get('/api/tasks/')
+        self.assertEqual(len(response.json()['results']), 20)
+
+    @override_settings(QUERY_PROFILING={'ENABLED': True})
+    def test_server_timing_header(self):
+        response = self.client.get('/api/tasks/')
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+
+class TaskListPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Task.objects.bulk_create(
+            Task(title=f'{"Buy" if i % 3 == 0 else "Read"} {i}', completed=i % 2 == 0) for i in range(25)
+        )
+        # Identical timestamps: the id breaks the tie
+        Task.objects.filter(id__lte=10).update(created_at=timezone.now())
+
+    def walk(self, url):
+        ids = []
+        while url:
+            with query_budget(1):
+                data = self.client.get(url).json()
+            ids += [task['id'] for task in data['results']]
+            url = data['next']
+        return ids
+
+    def test_pages_cover_every_task_once_in_order(self):
+        ids = self.walk('/api/tasks/?page_size=4')
+        expected = list(Task.objects.order_by('created_at', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_filters(self):
+        ids = self.walk('/api/tasks/?completed=false&title=Buy&page_size=2')
+        expected = Task.objects.filter(completed=False, title__startswith='Buy')
+        self.assertEqual(set(ids), set(expected.values_list('id', flat=True)))
+        self.assertEqual(self.walk('/api/tasks/?title=buy'), [])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/tasks/?cursor=nope').status_code, 404)
+
+    def test_pages_use_an_index(self):
+        task = Task.objects.order_by('created_at', 'id')[5]
+        cursor = TaskCursorPagination().encode_cursor(task.created_at, task.id)
+        cases = [
+            ({}, 'task_created_idx'),
+            ({'cursor': cursor}, 'task_created_idx (created_at>?)'),
+            ({'completed': 'false', 'cursor': cursor}, 'task_completed_created_idx (completed=? AND created_at>?)'),
+            ({'title': 'Buy'}, 'task_title_idx (title>? AND title<?)'),
+        ]
+        view = TaskListCreateView()
+        for params, index in cases:
+            view.request = Request(RequestFactory().get('/api/tasks/', params))
+            with CaptureQueriesContext(connection) as queries:
+                TaskCursorPagination().paginate_queryset(view.filter_queryset(Task.objects.all()), view.request)
+            with connection.cursor() as db:
+                db.execute(f"EXPLAIN QUERY PLAN {queries[0]['sql']}")
+                plan = ' '.join(row[-1] for row in db.fetchall())
+            self.assertIn(f'USING INDEX {index}', plan)
+
+
+class TaskSyncTests(TestCase):
+
+    def sync(self, since=None, **params):
+        if since is not None:
+            params['since'] = since
+        response = self.client.get('/api/tasks/sync/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_returns_only_changes_since_the_token(self):
+        kept = Task.objects.create(title='Kept')
+        edited = Task.objects.create(title='Edited')
+        removed = Task.objects.create(title='Removed')
+        token = self.sync()['since']
+
+        edited.title = 'Edited again'
+        edited.save()
+        added = Task.objects.create(title='Added')
+        removed_id = removed.id
+        removed.delete()
+
+        with query_budget(3):
+            data = self.sync(token)
+        self.assertEqual([task['id'] for task in data['tasks']], [edited.id, added.id])
+        self.assertEqual(data['tasks'][0]['title'], 'Edited again')
+        self.assertEqual(data['deleted'], [removed_id])
+        self.assertNotIn(kept.id, [task['id'] for task in data['tasks']])
+
+        self.assertEqual(self.sync(data['since']), {'since': data['since'], 'tasks': [], 'deleted': [], 'more': False})
+
+    def test_log_keeps_one_row_per_task(self):
+        task = Task.objects.create(title='Task')
+        for i in range(5):
+            task.save()
+        self.assertEqual(TaskChange.objects.filter(task_id=task.id).count(), 1)
+
+    def test_task_is_not_saved_without_its_change(self):
+        task = Task.objects.create(title='Task')
+        task.title = 'Renamed'
+        with mock.patch('tasks.signals.record_change', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            task.save()
+        self.assertEqual(Task.objects.get(id=task.id).title, 'Task')
+
+    def test_limit_and_more(self):
+        for i in range(5):
+            Task.objects.create(title=f'Task {i}')
+        since, seen = 0, []
+        while True:
+            data = self.sync(since, limit=2)
+            seen += [task['id'] for task in data['tasks']]
+            since = data['since']
+            if not data['more']:
+                break
+        self.assertEqual(seen, list(Task.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_invalid_token(self):
+        self.assertEqual(self.client.get('/api/tasks/sync/?since=abc').status_code, 400)
+        self.assertEqual(self.client.get('/api/tasks/sync/?since=999').status_code, 400)
+
+
+class TaskEventTests(TestCase):
+
+    async def open_stream(self):
+        response = await self.async_client.get('/api/tasks/events/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        return stream
+
+    async def disconnect(self, stream):
+        # The ASGI handler cancels the response task when the client goes away
+        reader = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        reader.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await reader
+
+    def save_task(self, title):
+        with self.captureOnCommitCallbacks(execute=True):
+            task = Task.objects.create(title=title)
+            task.completed = True
+            task.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            task.delete()
+
+    async def test_streams_task_changes(self):
+        stream = await self.open_stream()
+        self.assertEqual(len(broker), 1)
+        await sync_to_async(self.save_task)('Write docs')
+
+        created, updated, deleted = [(await anext(stream)).decode() for _ in range(3)]
+        self.assertIn('event: created', created)
+        self.assertIn('"title": "Write docs"', created)
+        self.assertIn('event: updated', updated)
+        self.assertIn('"completed": true', updated)
+        self.assertIn('event: deleted', deleted)
+        change_id = int(deleted.split('\n')[0].removeprefix('id: '))
+        self.assertEqual(change_id, await TaskChange.objects.values_list('id', flat=True).alast())
+
+        await self.disconnect(stream)
+        self.assertEqual(len(broker), 0)
+
+    async def test_heartbeat(self):
+        with mock.patch.object(events, 'HEARTBEAT_INTERVAL', 0.01):
+            stream = await self.open_stream()
+            self.assertEqual(await anext(stream), b': ping\n\n')
+            await self.disconnect(stream)
+
+    async def test_slow_client_is_told_to_resync(self):
+        small = Broker(queue_size=2)
+        subscription = small.subscribe()
+        for i in range(3):
+            small.publish(events.format_event(i, 'updated', {'id': i}))
+        await asyncio.sleep(0)
+        self.assertEqual(subscription.queue.get_nowait(), events.RESYNC)
+        self.assertTrue(subscription.queue.empty())
+
+    def test_needs_asgi(self):
+        self.assertEqual(self.client.get('/api/tasks/events/').status_code, 501)
+
+
+class CompiledSerializerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Task.objects.create(title='Write docs', description='', completed=True)
+        Task.objects.create(title='Ship it', description='Before Friday')
+
+    def test_matches_model_serializer(self):
+        queryset = Task.objects.order_by('id')
+        self.assertEqual(
+            CompiledSerializer(TaskSerializer).serialize(queryset),
+            TaskSerializer(queryset, many=True).data,
+        )
+
+    def test_json_rows_match_json_renderer(self):
+        Task.objects.create(title='Quote " and \\ émoji \u2603', description='line\nbreak')
+        queryset = Task.objects.order_by('id')
+        compiled = CompiledSerializer(TaskSerializer)
+        rows = list(queryset.values_list(*compiled.sources))
+        expected = [JSONRenderer().render(row).decode() for row in TaskSerializer(queryset, many=True).data]
+        self.assertEqual(compiled.json_rows(rows), expected)
+
+    def test_follows_active_timezone(self):
+        queryset = Task.objects.order_by('id')
+        with timezone.override('Asia/Kathmandu'):
+            compiled = CompiledSerializer(TaskSerializer).serialize(queryset)
+            self.assertEqual(compiled, TaskSerializer(queryset, many=True).data)
+        self.assertTrue(compiled[0]['created_at'].endswith('+05:45'))
+
+
+class TaskConditionalTests(TestCase):
+
+    def setUp(self):
+        self.task = Task.objects.create(title='Review PR')
+        self.url = f'/api/tasks/{self.task.id}/'
+
+    def test_304_without_loading_the_task(self):
+        etag = self.client.get(self.url)['ETag']
+        with query_budget(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_if_match(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.patch(self.url, {'completed': True}, content_type='application/json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], f'"{self.task.id}-2"')
+
+        response = self.client.patch(self.url, {'title': 'Late edit'}, content_type='application/json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(Task.objects.get(id=self.task.id).title, 'Review PR')
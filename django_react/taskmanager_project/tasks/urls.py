@@ -1,8 +1,10 @@
 from django.urls import path
-from .views import TaskListCreateView, TaskRetrieveUpdateDestroyView
+from .views import TaskListCreateView, TaskRetrieveUpdateDestroyView, task_events, task_sync
 
 urlpatterns = [
  
     path("", TaskListCreateView.as_view(), name="task_list_create"),
+    path("sync/", task_sync, name="task_sync"),
+    path("events/", task_events, name="task_events"),
     path("<int:id>/", TaskRetrieveUpdateDestroyView.as_view(), name="task_detail"),
 ]
\ No newline at end of file
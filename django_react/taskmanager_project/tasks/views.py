@@ -1,14 +1,121 @@
-from rest_framework import generics
-from .models import Task
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework import generics, status
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from perftools.compiled import CompiledSerializer
+from perftools.conditional import conditional_detail, claim_version, make_etag
+from .events import broker
+from .models import Task, TaskChange
+from .pagination import TaskCursorPagination
 from .serializers import TaskSerializer
 
+TASK_ROWS = CompiledSerializer(TaskSerializer)
+
 
 class TaskListCreateView(generics.ListCreateAPIView):
+    # Cursor pages ordered by (created_at, id) (tasks/pagination.py)
+    # Filters: ?completed=true|false, ?title=<prefix> (case-sensitive)
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
+    pagination_class = TaskCursorPagination
+
+    def filter_queryset(self, queryset):
+        params = self.request.query_params
+        completed = params.get('completed', '').lower()
+        if completed in ('true', '1', 'false', '0'):
+            # completed=True compiles to a bare WHERE "completed", which can't seek the
+            # (completed, created_at, id) index; IN (?) is an equality SQLite can use
+            queryset = queryset.filter(completed__in=[completed in ('true', '1')])
+
+        title = params.get('title')
+        if title:
+            # A range instead of LIKE 'x%' (case-insensitive on SQLite), so the title index is used
+            queryset = queryset.filter(title__gte=title, title__lt=title + '\U0010ffff')
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        # Read-only list: rows go through the compiled serializer (perftools/compiled.py)
+        rows = self.filter_queryset(self.get_queryset()).values_list(*TASK_ROWS.sources)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(TASK_ROWS.serialize_rows(page))
+        return Response(TASK_ROWS.serialize_rows(rows))
 
 
+@conditional_detail(Task)
 class TaskRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+    # ETag / Last-Modified come from the version and updated_at columns (perftools/conditional.py):
+    # GET answers 304 without loading the task, PUT/PATCH honour If-Match
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
-    lookup_field = 'id'
\ No newline at end of file
+    lookup_field = 'id'
+
+    def update(self, request, *args, **kwargs):
+        with transaction.atomic():
+            if not claim_version(request, self.get_queryset(), kwargs['id']):
+                return Response({'detail': 'Task was changed by someone else.'}, status=status.HTTP_412_PRECONDITION_FAILED)
+            response = super().update(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = make_etag(self.saved.id, self.saved.version)
+        return response
+
+    def perform_update(self, serializer):
+        self.saved = serializer.save()
+
+
+SYNC_LIMIT = 500
+
+
+@api_view(['GET'])
+def task_sync(request):
+    """
+    Delta sync: the tasks created, updated or deleted since a change token.
+    - Without ?since, returns the current token only (take it with the first full load)
+    - ?since=<token> -> {since, tasks, deleted, more}; pass `since` back next time,
+      and call again straight away while `more` is true
+    - Cost follows the number of changes, not the number of tasks
+    """
+    latest = TaskChange.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    if 'since' not in request.query_params:
+        return Response({'since': latest, 'tasks': [], 'deleted': [], 'more': False})
+
+    try:
+        since = int(request.query_params['since'])
+        limit = min(int(request.query_params.get('limit', SYNC_LIMIT)), SYNC_LIMIT)
+    except ValueError:
+        return Response({'detail': 'since and limit must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+    if since < 0 or since > latest or limit < 1:
+        return Response({'detail': 'Invalid since or limit.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    changes = list(
+        TaskChange.objects.filter(id__gt=since).order_by('id').values_list('id', 'task_id', 'deleted')[:limit + 1]
+    )
+    more = len(changes) > limit
+    changes = changes[:limit]
+    changed = [task_id for _, task_id, deleted in changes if not deleted]
+    tasks = TASK_ROWS.serialize(Task.objects.filter(id__in=changed).order_by('id')) if changed else []
+
+    return Response({
+        'since': changes[-1][0] if changes else since,
+        'tasks': tasks,
+        'deleted': [task_id for _, task_id, deleted in changes if deleted],
+        'more': more,
+    })
+
+
+@require_GET
+async def task_events(request):
+    """Server-sent events for task changes (tasks/events.py); needs the ASGI server"""
+    if not isinstance(request, ASGIRequest):
+        # Under WSGI the endless stream would hold a worker thread for good
+        return JsonResponse(
+            {'detail': 'Task events are served over ASGI only (taskmanager_project.asgi).'},
+            status=status.HTTP_501_NOT_IMPLEMENTED,
+        )
+    response = StreamingHttpResponse(broker.stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
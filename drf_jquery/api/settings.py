@@ -10,11 +10,18 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Repository root, where the perftools package shared by the projects lives
+REPO_DIR = BASE_DIR.parent
+sys.path.append(str(REPO_DIR))
+
+from perftools.sqlite import SQLITE_OPTIONS
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/6.0/howto/deployment/checklist/
@@ -39,18 +46,38 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'app',   # your app
+    'perftools',
 ]
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'app.middlewares.CustomHeadersMiddleware',     # first, so everything below sees the request ID
+    'app.middlewares.QueryProfilingMiddleware',    # removes itself unless QUERY_PROFILING is enabled
+    'app.middlewares.SessionHandlingMiddleware',   # before SessionMiddleware, see its docstring
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'app.middlewares.UserRoleMiddleware',          # request.role, after AuthenticationMiddleware
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'app.middlewares.UserActivityLogging'
+    'app.middlewares.UserActivityLoggingMiddleware'
 ]
 
+# Database sessions with load/save counters and lazy defaults (app/sessions.py)
+SESSION_ENGINE = 'app.sessions'
+
+# Request log sink used by UserActivityLoggingMiddleware (see app/logsinks.py)
+REQUEST_LOG = {
+    'SINK': 'app.logsinks.BufferedFileLogSink',
+    'PATH': BASE_DIR / 'request_log.txt',
+    'OPTIONS': {
+        'capacity': 10000,        # lines kept in memory before the overflow policy kicks in
+        'batch_size': 256,        # lines per writelines() call
+        'flush_interval': 1.0,    # seconds between flushes when traffic is low
+        'overflow': 'drop_oldest',
+    },
+}
+
 
 ROOT_URLCONF = 'api.urls'
 
@@ -75,13 +102,93 @@ WSGI_APPLICATION = 'api.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# SQLite tuned for concurrent readers and writers (perftools/sqlite.py)
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': SQLITE_OPTIONS,
     }
 }
 
+# Logging - every record carries the current request ID (app/request_id.py)
+# - The filter sits on the console handler, so it covers every logger routed
+#   there: the app's own and django.db.backends
+# - django.db.backends logs each query at DEBUG (only when DEBUG = True);
+#   set its level to DEBUG to see the queries of each request
+# - Test runs only print warnings; assertLogs() still sees everything
+TESTING = sys.argv[1:2] == ['test']
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_id': {'()': 'app.request_id.RequestIDLogFilter'},
+    },
+    'formatters': {
+        'default': {'format': '[%(asctime)s] %(levelname)s [%(request_id)s] %(name)s: %(message)s'},
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'filters': ['request_id'],
+            'formatter': 'default',
+            'level': 'WARNING' if TESTING else 'DEBUG',
+        },
+    },
+    'loggers': {
+        'app': {'handlers': ['console'], 'level': 'INFO'},
+        'django.db.backends': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+# Cache (dashboard stats, ...). LocMemCache is per process; point this at
+# Redis/Memcached when running several worker processes.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'drf-jquery',
+    },
+    # CacheCartStore's lines and totals: the only copy of those carts, so they
+    # must not share the default cache's culling with expendable page
+    # fragments. LocMemCache culls past MAX_ENTRIES; in production use a
+    # Redis instance with maxmemory-policy noeviction.
+    'carts': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'drf-jquery-carts',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 10_000_000},
+    },
+}
+
+# Cart storage used by the cart views (see app/cart.py):
+# 'app.cart.DatabaseCartStore' (CartItem rows) or 'app.cart.CacheCartStore' (the 'carts' cache)
+CART_STORE = 'app.cart.DatabaseCartStore'
+
+# Per-request SQL profiling (perftools/profiling.py): Server-Timing header and N+1 warnings
+QUERY_PROFILING = {
+    'ENABLED': DEBUG,
+    'SAMPLE_RATE': 1.0,          # e.g. 0.01 to profile 1% of requests
+    'N_PLUS_ONE_THRESHOLD': 5,
+    'SERVER_TIMING': True,
+}
+
+# Cached catalogue pages (app/pagecache.py): products list/detail and categories,
+# invalidated when products/categories change; stale copies are served while
+# one request re-renders. Hit rates: `python manage.py benchmark_page_cache`
+PAGE_CACHE = {
+    'ENABLED': True,
+    'TIMEOUT': 300,
+    'STALE_TIMEOUT': 3600,
+}
+
+# Product full-text search (SQLite FTS5, see app/search.py)
+# TOKENIZER: 'unicode61' (words), 'porter' (English stemming) or 'trigram' (substrings).
+# Changing it needs `python manage.py rebuild_product_search --tokenizer <name>`.
+PRODUCT_SEARCH = {
+    'TOKENIZER': 'unicode61',
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -0,0 +1,411 @@
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum, Count
+from django.utils.module_loading import import_string
+
+from .models import CartItem, CartSummary
+
+# Server-side cart storage
+# - Replaces request.session['cart'], so touching the cart no longer rewrites
+#   the whole session row
+# - Prices are stored as integer cents; nothing is parsed into Decimal per line
+# - Every operation works on a single line; totals come from a small summary
+#   (subtotal in cents, number of lines, number of units) that each write
+#   adjusts by its own change, never recomputed from the lines.
+#   DatabaseCartStore keeps it in a CartSummary row updated with F() in the
+#   same transaction as the line, and caches that row; CacheCartStore
+#   changes it under a per-cart lock
+# - Views use the Cart class below rather than a store directly
+# - Reads have async counterparts (aitems/asummary, Cart.alines/aload_summary)
+#   for async views; writes stay sync
+
+
+def to_cents(price):
+    """Decimal('12.34') -> 1234"""
+    return int(price.scaleb(2))
+
+
+def format_cents(cents):
+    """1234 -> '12.34'"""
+    sign = '-' if cents < 0 else ''
+    cents = abs(cents)
+    return f'{sign}{cents // 100}.{cents % 100:02d}'
+
+
+def line_data(product_name, price_cents, qty, image_url):
+    return {'name': product_name, 'price_cents': price_cents, 'qty': qty, 'image_url': image_url or ''}
+
+
+class DatabaseCartStore:
+    """Cart lines stored as CartItem rows, totals in a CartSummary row, cached"""
+
+    # Bounds how long a cached summary read just before a commit can live
+    SUMMARY_TIMEOUT = 60 * 60
+
+    SUMMARY_FIELDS = ('subtotal_cents', 'lines', 'quantity')
+
+    SUMMARY_AGGREGATES = {
+        'subtotal_cents': Sum(F('unit_price_cents') * F('quantity')),
+        'lines': Count('id'),
+        'quantity': Sum('quantity'),
+    }
+
+    def _summary_key(self, user_id):
+        return f'cart_summary:{user_id}'
+
+    def _item_rows(self, user_id):
+        return (
+            CartItem.objects.filter(user_id=user_id)
+            .order_by('added_at', 'id')
+            .values_list('product_id', 'product__name', 'unit_price_cents', 'quantity', 'product__image_url')
+        )
+
+    def items(self, user_id):
+        rows = self._item_rows(user_id)
+        return {pid: line_data(name, cents, qty, image) for pid, name, cents, qty, image in rows}
+
+    async def aitems(self, user_id):
+        rows = self._item_rows(user_id)
+        return {pid: line_data(name, cents, qty, image) async for pid, name, cents, qty, image in rows}
+
+    def add(self, user_id, product, qty):
+        """Add qty of product; returns the updated line"""
+        with transaction.atomic():
+            updated = (
+                CartItem.objects.filter(user_id=user_id, product_id=product.id)
+                .update(quantity=F('quantity') + qty)
+            )
+            if updated:
+                line = CartItem.objects.get(user_id=user_id, product_id=product.id)
+            else:
+                line = CartItem.objects.create(
+                    user_id=user_id, product_id=product.id, quantity=qty,
+                    unit_price_cents=to_cents(product.price),
+                )
+            self.summary_changed(user_id, line.unit_price_cents * qty, 0 if updated else 1, qty)
+        return line_data(product.name, line.unit_price_cents, line.quantity, product.image_url)
+
+    def remove(self, user_id, product_id):
+        """Remove a line; returns the removed line or None if it wasn't there"""
+        with transaction.atomic():
+            lines = CartItem.objects.filter(user_id=user_id, product_id=product_id)
+            # Locked, so the quantity subtracted is the quantity deleted
+            line = lines.select_for_update(of=('self',)).select_related('product').first()
+            if line is None:
+                return None
+            lines.delete()
+            self.summary_changed(user_id, -line.unit_price_cents * line.quantity, -1, -line.quantity)
+        return line_data(line.product.name, line.unit_price_cents, line.quantity, line.product.image_url)
+
+    def clear(self, user_id):
+        with transaction.atomic():
+            CartItem.objects.filter(user_id=user_id).delete()
+            CartSummary.objects.filter(user_id=user_id).update(**dict.fromkeys(self.SUMMARY_FIELDS, 0))
+            transaction.on_commit(partial(self.invalidate_summary, user_id))
+
+    def summary(self, user_id):
+        summary = cache.get(self._summary_key(user_id))
+        if summary is None:
+            summary = CartSummary.objects.filter(user_id=user_id).values(*self.SUMMARY_FIELDS).first()
+            if summary is None:
+                # No row until the first write (users who never had a cart)
+                summary = self._aggregate(CartItem.objects.filter(user_id=user_id).aggregate(**self.SUMMARY_AGGREGATES))
+            cache.set(self._summary_key(user_id), summary, self.SUMMARY_TIMEOUT)
+        return summary
+
+    async def asummary(self, user_id):
+        summary = await cache.aget(self._summary_key(user_id))
+        if summary is None:
+            summary = await CartSummary.objects.filter(user_id=user_id).values(*self.SUMMARY_FIELDS).afirst()
+            if summary is None:
+                summary = self._aggregate(
+                    await CartItem.objects.filter(user_id=user_id).aaggregate(**self.SUMMARY_AGGREGATES)
+                )
+            await cache.aset(self._summary_key(user_id), summary, self.SUMMARY_TIMEOUT)
+        return summary
+
+    @staticmethod
+    def _aggregate(totals):
+        return {key: value or 0 for key, value in totals.items()}
+
+    def invalidate_summary(self, user_id):
+        cache.delete(self._summary_key(user_id))
+
+    def summary_changed(self, user_id, subtotal_cents, lines, quantity):
+        """
+        Add a write's change to the user's CartSummary row, inside the write's
+        transaction, and drop the cached copy once it commits
+        """
+        changes = {'subtotal_cents': subtotal_cents, 'lines': lines, 'quantity': quantity}
+        updates = {field: F(field) + change for field, change in changes.items() if change}
+        summaries = CartSummary.objects.filter(user_id=user_id)
+        if not summaries.update(**updates):
+            try:
+                # First write for this user: start the row from the lines,
+                # which already include this write
+                with transaction.atomic():
+                    CartSummary.objects.create(user_id=user_id, **self._aggregate(
+                        CartItem.objects.filter(user_id=user_id).aggregate(**self.SUMMARY_AGGREGATES)
+                    ))
+            except IntegrityError:
+                # Created meanwhile by a concurrent first write, which can't have seen this one
+                summaries.update(**updates)
+        transaction.on_commit(partial(self.invalidate_summary, user_id))
+
+
+class CacheCartStore:
+    """
+    Cart kept only in the 'carts' cache (Redis in production, no eviction).
+    - One key per line; the product ids live in numbered slot keys, so adding
+      a line writes one slot instead of rewriting an index of every line.
+      Removed lines leave empty slots behind until the cart is cleared
+    - Writes to a cart hold a short lock (cache.add), so concurrent adds and
+      removes can't lose each other's changes to a line or the totals
+    - The totals are rebuilt from the lines if their key is ever lost
+    - Nothing expires: a cart lives until it is cleared
+    """
+
+    cache_alias = 'carts'
+    # Seconds a lock is held at most, should its holder die
+    LOCK_TIMEOUT = 5
+    LOCK_WAIT = 0.005
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _slots_key(self, user_id):
+        return f'cart:{user_id}:slots'
+
+    def _slot_key(self, user_id, slot):
+        return f'cart:{user_id}:slot:{slot}'
+
+    def _line_key(self, user_id, product_id):
+        return f'cart:{user_id}:line:{product_id}'
+
+    def _summary_key(self, user_id):
+        return f'cart:{user_id}:summary'
+
+    def _lock_key(self, user_id):
+        return f'cart:{user_id}:lock'
+
+    @contextmanager
+    def _locked(self, user_id):
+        # An abandoned lock expires after LOCK_TIMEOUT, so this always ends
+        while not self.cache.add(self._lock_key(user_id), 1, self.LOCK_TIMEOUT):
+            time.sleep(self.LOCK_WAIT)
+        try:
+            yield
+        finally:
+            self.cache.delete(self._lock_key(user_id))
+
+    def _slot_keys(self, user_id, slots):
+        return [self._slot_key(user_id, slot) for slot in range(1, slots + 1)]
+
+    def _lines(self, user_id, slots, product_ids):
+        """product_ids: what get_many returned for the slot keys"""
+        product_ids = [product_ids[key] for key in self._slot_keys(user_id, slots) if key in product_ids]
+        lines = self.cache.get_many([self._line_key(user_id, pid) for pid in product_ids])
+        return {
+            pid: lines[self._line_key(user_id, pid)]
+            for pid in product_ids
+            if self._line_key(user_id, pid) in lines
+        }
+
+    def items(self, user_id):
+        slots = self.cache.get(self._slots_key(user_id), 0)
+        return self._lines(user_id, slots, self.cache.get_many(self._slot_keys(user_id, slots)))
+
+    async def aitems(self, user_id):
+        slots = await self.cache.aget(self._slots_key(user_id), 0)
+        return self._lines(user_id, slots, await self.cache.aget_many(self._slot_keys(user_id, slots)))
+
+    @staticmethod
+    def _summary_of(lines):
+        return {
+            'subtotal_cents': sum(line['price_cents'] * line['qty'] for line in lines.values()),
+            'lines': len(lines),
+            'quantity': sum(line['qty'] for line in lines.values()),
+        }
+
+    def _locked_summary(self, user_id):
+        """The stored totals, rebuilt from the lines if lost; call with the cart locked"""
+        summary = self.cache.get(self._summary_key(user_id))
+        return summary if summary is not None else self._summary_of(self.items(user_id))
+
+    def add(self, user_id, product, qty):
+        key = self._line_key(user_id, product.id)
+        with self._locked(user_id):
+            summary = self._locked_summary(user_id)
+            line = self.cache.get(key)
+            if line is None:
+                line = line_data(product.name, to_cents(product.price), qty, product.image_url)
+                line['slot'] = self.cache.get(self._slots_key(user_id), 0) + 1
+                self.cache.set_many({
+                    self._slots_key(user_id): line['slot'],
+                    self._slot_key(user_id, line['slot']): product.id,
+                })
+                summary['lines'] += 1
+            else:
+                line['qty'] += qty
+            summary['subtotal_cents'] += line['price_cents'] * qty
+            summary['quantity'] += qty
+            self.cache.set_many({key: line, self._summary_key(user_id): summary})
+        return line
+
+    def remove(self, user_id, product_id):
+        key = self._line_key(user_id, product_id)
+        with self._locked(user_id):
+            line = self.cache.get(key)
+            if line is None:
+                return None
+            summary = self._locked_summary(user_id)
+            self.cache.delete_many([key, self._slot_key(user_id, line['slot'])])
+            summary['subtotal_cents'] -= line['price_cents'] * line['qty']
+            summary['lines'] -= 1
+            summary['quantity'] -= line['qty']
+            self.cache.set(self._summary_key(user_id), summary)
+        return line
+
+    def clear(self, user_id):
+        with self._locked(user_id):
+            slots = self.cache.get(self._slots_key(user_id), 0)
+            product_ids = self.cache.get_many(self._slot_keys(user_id, slots)).values()
+            self.cache.delete_many(
+                [self._line_key(user_id, pid) for pid in product_ids]
+                + self._slot_keys(user_id, slots)
+                + [self._slots_key(user_id), self._summary_key(user_id)]
+            )
+
+    def summary(self, user_id):
+        summary = self.cache.get(self._summary_key(user_id))
+        if summary is None:
+            # Lost (or an empty cart): rebuilt from the lines and stored under the lock
+            with self._locked(user_id):
+                summary = self._locked_summary(user_id)
+                self.cache.set(self._summary_key(user_id), summary)
+        return summary
+
+    async def asummary(self, user_id):
+        summary = await self.cache.aget(self._summary_key(user_id))
+        if summary is None:
+            # Not stored from here (no async lock); the next write stores it
+            summary = self._summary_of(await self.aitems(user_id))
+        return summary
+
+
+_store = None
+
+
+def get_cart_store():
+    """Return the store configured in settings.CART_STORE (a dotted class path)"""
+    global _store
+    if _store is None:
+        _store = import_string(getattr(settings, 'CART_STORE', 'app.cart.DatabaseCartStore'))()
+    return _store
+
+
+def product_deleted(product_id):
+    """
+    CartItem rows go with their product (on_delete=CASCADE) without passing
+    through the store; take them out of the summaries of the carts that held them
+    """
+    store = get_cart_store()
+    if isinstance(store, DatabaseCartStore):
+        lines = CartItem.objects.filter(product_id=product_id).values_list('user_id', 'unit_price_cents', 'quantity')
+        for user_id, price_cents, qty in lines:
+            # Update only: a missing row would be started from lines that are still there
+            CartSummary.objects.filter(user_id=user_id).update(
+                subtotal_cents=F('subtotal_cents') - price_cents * qty,
+                lines=F('lines') - 1,
+                quantity=F('quantity') - qty,
+            )
+            transaction.on_commit(partial(store.invalidate_summary, user_id))
+
+
+class Cart:
+    """
+    Cart API used by the views.
+    - add()/remove() change one line and return it in display form
+    - subtotal / count / quantity come from the precomputed summary
+    - lines() gives the whole cart keyed by product id string, the same shape
+      the session cart used: {'12': {'name', 'price', 'qty', 'image_url'}}
+    """
+
+    def __init__(self, user, store=None):
+        self.user_id = user.id
+        self.store = store or get_cart_store()
+        self._summary = None
+
+    @staticmethod
+    def display_line(line):
+        return {
+            'name': line['name'],
+            'price': format_cents(line['price_cents']),
+            'qty': line['qty'],
+            'image_url': line['image_url'],
+        }
+
+    def lines(self):
+        return {str(pid): self.display_line(line) for pid, line in self.store.items(self.user_id).items()}
+
+    async def alines(self):
+        items = await self.store.aitems(self.user_id)
+        return {str(pid): self.display_line(line) for pid, line in items.items()}
+
+    def add(self, product, qty=1):
+        self._summary = None
+        return self.display_line(self.store.add(self.user_id, product, qty))
+
+    def remove(self, product_id):
+        self._summary = None
+        line = self.store.remove(self.user_id, int(product_id))
+        return self.display_line(line) if line is not None else None
+
+    def clear(self):
+        self._summary = None
+        self.store.clear(self.user_id)
+
+    async def aload_summary(self):
+        """Fetch the summary in async code; the properties below then need no I/O"""
+        if self._summary is None:
+            self._summary = await self.store.asummary(self.user_id)
+        return self._summary
+
+    @property
+    def summary(self):
+        if self._summary is None:
+            self._summary = self.store.summary(self.user_id)
+        return self._summary
+
+    @property
+    def subtotal_cents(self):
+        return self.summary['subtotal_cents']
+
+    @property
+    def subtotal(self):
+        return Decimal(self.subtotal_cents).scaleb(-2)
+
+    @property
+    def count(self):
+        """Number of distinct products (lines)"""
+        return self.summary['lines']
+
+    @property
+    def quantity(self):
+        """Number of units across all lines"""
+        return self.summary['quantity']
+
+    def totals(self):
+        """Totals for JSON responses"""
+        return {
+            'total': format_cents(self.subtotal_cents),
+            'cart_count': self.count,
+            'item_quantity': self.quantity,
+        }
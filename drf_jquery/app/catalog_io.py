@@ -0,0 +1,194 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+
+from . import search
+from .models import Category, Product
+
+# Bulk catalogue import/export (manage.py import_products / export_products)
+# - Files are CSV (header row) or NDJSON (one JSON object per line) with the
+#   columns in FIELDS; `category` is the category name
+# - Both directions stream: at most one batch of rows is held in memory
+# - Rows with an `id` update that product (bulk_create(update_conflicts=True)),
+#   rows without one are inserted
+# - Categories are resolved through a name -> id map loaded once; unknown
+#   names are created as they appear
+# - One transaction per batch; the category counters and page cache are kept
+#   in step by ProductQuerySet.bulk_create, the search index here
+
+FIELDS = ['id', 'name', 'description', 'price', 'category', 'stock', 'status', 'image_url']
+FORMATS = ('csv', 'ndjson')
+EXTENSIONS = {'csv': 'csv', 'ndjson': 'ndjson', 'jsonl': 'ndjson'}
+UPDATE_FIELDS = ['name', 'description', 'price', 'category', 'stock', 'status', 'image_url', 'updated_at']
+NAME_LENGTH = Product._meta.get_field('name').max_length
+MAX_PRICE = Decimal('1000000')      # Product.price is max_digits=8, decimal_places=2
+STATUSES = {value for value, _ in Product.AVAILABILITY_CHOICES}
+
+
+class RowError(ValueError):
+    """A row that can't be imported; `line` is its line number in the file"""
+
+    def __init__(self, line, message):
+        super().__init__(f"line {line}: {message}")
+        self.line = line
+
+
+def format_for(path, default='csv'):
+    """'products.ndjson' -> 'ndjson'; stdin/stdout and unknown extensions get the default"""
+    extension = str(path).rsplit('.', 1)[-1].lower()
+    return EXTENSIONS.get(extension, default)
+
+
+# ==================== READING ====================
+
+def read_rows(stream, fmt):
+    """Yield (line number, row dict) from a CSV or NDJSON text stream"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line, text in enumerate(stream, start=1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except json.JSONDecodeError as e:
+                raise RowError(line, f"invalid JSON ({e.msg})")
+            if not isinstance(row, dict):
+                raise RowError(line, "expected a JSON object")
+            yield line, row
+
+
+def _text(row, field):
+    value = row.get(field)
+    return '' if value is None else str(value).strip()
+
+
+def parse_row(line, row):
+    """Validate one row; returns (product field values, category name)"""
+    name = _text(row, 'name')
+    category = _text(row, 'category')
+    if not name:
+        raise RowError(line, "name is required")
+    if len(name) > NAME_LENGTH:
+        raise RowError(line, f"name is longer than {NAME_LENGTH} characters")
+    if not category:
+        raise RowError(line, "category is required")
+    try:
+        price = Decimal(_text(row, 'price'))
+    except InvalidOperation:
+        raise RowError(line, f"invalid price {row.get('price')!r}")
+    if not price.is_finite() or not 0 <= price < MAX_PRICE or price.as_tuple().exponent < -2:
+        raise RowError(line, f"invalid price {row.get('price')!r}")
+    try:
+        product_id = int(_text(row, 'id')) if _text(row, 'id') else None
+        stock = int(_text(row, 'stock') or 0)
+    except ValueError:
+        raise RowError(line, "id and stock must be whole numbers")
+    status = _text(row, 'status') or 'in_stock'
+    if status not in STATUSES:
+        raise RowError(line, f"unknown status {status!r}")
+
+    values = {
+        'id': product_id,
+        'name': name,
+        'description': _text(row, 'description'),
+        'price': price,
+        'stock': stock,
+        'status': status,
+        'image_url': _text(row, 'image_url'),
+    }
+    return values, category
+
+
+# ==================== IMPORT ====================
+
+class CategoryMap:
+    """Category name -> id, loaded once; missing categories are created in bulk"""
+
+    def __init__(self):
+        self.ids = dict(Category.objects.values_list('name', 'id'))
+
+    def resolve(self, names):
+        missing = set(names) - self.ids.keys()
+        if missing:
+            # ignore_conflicts: another import may have created some meanwhile
+            Category.objects.bulk_create([Category(name=name) for name in missing], ignore_conflicts=True)
+            self.ids.update(Category.objects.filter(name__in=missing).values_list('name', 'id'))
+        return self.ids
+
+
+def import_products(rows, batch_size=5000, skip_invalid=False, on_batch=None):
+    """
+    Upsert products from (line, row) pairs, batch by batch.
+    Returns (rows imported, rows skipped). Invalid rows raise RowError unless
+    skip_invalid; batches already imported stay committed.
+    on_batch(imported so far) is called after each batch.
+    """
+    categories = CategoryMap()
+    imported = skipped = 0
+    rows = iter(rows)
+    while chunk := list(islice(rows, batch_size)):
+        batch = []
+        for line, row in chunk:
+            try:
+                batch.append(parse_row(line, row))
+            except RowError:
+                if not skip_invalid:
+                    raise
+                skipped += 1
+        if not batch:
+            continue
+        with transaction.atomic():
+            ids = categories.resolve(name for _, name in batch)
+            products = Product.objects.bulk_create(
+                [Product(category_id=ids[name], **values) for values, name in batch],
+                update_conflicts=True,
+                unique_fields=['id'],
+                update_fields=UPDATE_FIELDS,
+            )
+            search.index_products(products)
+        imported += len(products)
+        if on_batch:
+            on_batch(imported)
+    return imported, skipped
+
+
+# ==================== EXPORT ====================
+
+def export_rows(batch_size=5000):
+    """Every product as a row dict, in id order, one batch query at a time"""
+    last_id = 0
+    while True:
+        batch = list(
+            Product.objects.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', 'name', 'description', 'price', 'category__name', 'stock', 'status', 'image_url')
+            [:batch_size]
+        )
+        if not batch:
+            return
+        for values in batch:
+            yield dict(zip(FIELDS, values))
+        last_id = batch[-1][0]
+
+
+def write_rows(stream, fmt, rows):
+    """Write row dicts to a text stream; returns the number written"""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            stream.write(json.dumps({**row, 'price': str(row['price'])}, ensure_ascii=False))
+            stream.write('\n')
+            count += 1
+    return count
@@ -0,0 +1,192 @@
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .models import Category, Product
+
+# Denormalized product counts on Category
+# - Category.product_count plus one column per product status, so the
+#   categories page reads one row per category instead of a GROUP BY join
+#   over every product
+# - Kept up to date in the same transaction as the product write:
+#     save()/delete()              -> signals (app/signals.py) -> product_saved/deleted
+#   The old category/status comes from the row itself, read under a row lock
+#   in that transaction, never from the (possibly stale) instance
+#     bulk_create/update/delete    -> ProductQuerySet (app/models.py)
+# - Writes that bypass both (raw SQL, another app on the same database) can
+#   leave drift behind; `manage.py reconcile_category_counts` repairs it.
+#   Until then decrements are clamped at zero rather than failing the write
+
+STATUS_FIELDS = {
+    'in_stock': 'in_stock_count',
+    'out_of_stock': 'out_of_stock_count',
+    'coming_soon': 'coming_soon_count',
+}
+
+# Set while a queryset operation does the counting for all its rows, so the
+# per-object signals it triggers don't count them again
+_suspended = ContextVar('category_counters_suspended', default=False)
+
+
+@contextmanager
+def suspended():
+    token = _suspended.set(True)
+    try:
+        yield
+    finally:
+        _suspended.reset(token)
+
+
+def apply(deltas):
+    """deltas: {(category_id, status): change}; one UPDATE per category"""
+    per_category = {}
+    for (category_id, status), change in deltas.items():
+        if not change or category_id is None:
+            continue
+        fields = per_category.setdefault(category_id, Counter())
+        fields['product_count'] += change
+        if status in STATUS_FIELDS:
+            fields[STATUS_FIELDS[status]] += change
+
+    for category_id, fields in per_category.items():
+        # Decrements stop at zero: a counter that has drifted low must not fail
+        # the product write on the PositiveIntegerField CHECK constraint
+        updates = {
+            field: F(field) + change if change > 0 else Greatest(F(field) + change, 0)
+            for field, change in fields.items() if change
+        }
+        if updates:
+            Category.objects.filter(id=category_id).update(**updates)
+
+
+def affects_counts(update_fields):
+    return update_fields is None or bool({'category', 'category_id', 'status'} & set(update_fields))
+
+
+def counted_row(product):
+    """
+    The (category_id, status) the counters hold for this product's row, or None
+    if there is no row. Read with the row locked, inside the write's
+    transaction: the instance's own fields may be stale (loaded before another
+    writer moved the row), and deltas from them would drift the counters.
+    """
+    return (
+        Product.objects.select_for_update().filter(pk=product.pk)
+        .values_list('category_id', 'status').first()
+    )
+
+
+def product_saving(product, update_fields=None):
+    """Before a save (pre_save, inside Product.save()'s transaction): lock and read the old row"""
+    if _suspended.get() or product.pk is None or not affects_counts(update_fields):
+        return
+    product._counted_as = counted_row(product)
+
+
+def product_saved(product, created, update_fields=None):
+    if _suspended.get() or not affects_counts(update_fields):
+        return
+    new = (product.category_id, product.status)
+    old = product.__dict__.pop('_counted_as', None)
+    if created or old is None:
+        apply({new: 1})
+    elif old != new:
+        apply({old: -1, new: 1})
+
+
+def product_deleting(product):
+    """Before a delete (pre_delete, inside the deletion's transaction): lock and read the row"""
+    if _suspended.get():
+        return
+    product._counted_as = counted_row(product)
+
+
+def product_deleted(product):
+    if _suspended.get():
+        return
+    old = product.__dict__.pop('_counted_as', None)
+    # No row: a concurrent delete got there first and already counted it
+    if old is not None:
+        apply({old: -1})
+
+
+def count_created(products):
+    apply(Counter((product.category_id, product.status) for product in products))
+
+
+def categories_of_conflicts(queryset, products, unique_fields=None, chunk_size=500):
+    """
+    Current categories of the rows an upsert could overwrite. Matching on the
+    first unique field only can return extra categories; recounting those is
+    harmless.
+    """
+    name = unique_fields[0] if unique_fields else 'pk'
+    attname = 'pk' if name == 'pk' else Product._meta.get_field(name).attname
+    values = [value for value in (getattr(product, attname) for product in products) if value is not None]
+    categories = set()
+    for start in range(0, len(values), chunk_size):
+        rows = queryset.filter(**{f'{name}__in': values[start:start + chunk_size]})
+        categories.update(rows.order_by().values_list('category_id', flat=True).distinct())
+    return categories
+
+
+def categories_of(pks, chunk_size=500):
+    """Current categories of the given products"""
+    categories = set()
+    for start in range(0, len(pks), chunk_size):
+        rows = Product.objects.filter(pk__in=pks[start:start + chunk_size])
+        categories.update(rows.order_by().values_list('category_id', flat=True).distinct())
+    return categories
+
+
+def count_deleted(queryset):
+    """Group the rows about to be deleted; apply() the negated result afterwards"""
+    rows = queryset.order_by().values_list('category_id', 'status').annotate(n=Count('pk'))
+    return {(category_id, status): -n for category_id, status, n in rows}
+
+
+def recount(category_ids):
+    """Recompute the counters of the given categories from the product table"""
+    category_ids = sorted({pk for pk in category_ids if pk is not None})
+    if not category_ids:
+        return 0
+    actual = {pk: dict.fromkeys(['product_count', *STATUS_FIELDS.values()], 0) for pk in category_ids}
+    rows = (
+        Product.objects.filter(category_id__in=category_ids)
+        .order_by().values_list('category_id', 'status').annotate(n=Count('pk'))
+    )
+    for category_id, status, n in rows:
+        actual[category_id]['product_count'] += n
+        if status in STATUS_FIELDS:
+            actual[category_id][STATUS_FIELDS[status]] += n
+
+    fields = ['product_count', *STATUS_FIELDS.values()]
+    drifted = []
+    for category in Category.objects.filter(id__in=category_ids).only('id', *fields):
+        counts = actual[category.id]
+        if any(getattr(category, field) != counts[field] for field in fields):
+            for field in fields:
+                setattr(category, field, counts[field])
+            drifted.append(category)
+    Category.objects.bulk_update(drifted, fields)
+    return len(drifted)
+
+
+def reconcile(batch_size=500):
+    """Recount every category, batch by batch; returns (categories checked, categories fixed)"""
+    checked = fixed = 0
+    last_id = 0
+    while True:
+        batch = list(
+            Category.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not batch:
+            return checked, fixed
+        with transaction.atomic():
+            fixed += recount(batch)
+        checked += len(batch)
+        last_id = batch[-1]
@@ -0,0 +1,215 @@
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class FileLogSink:
+    """
+    Simplest sink - opens the file, appends one line and closes it again.
+    Kept for development and for comparison with the buffered sink.
+    """
+
+    def __init__(self, path="request_log.txt", **options):
+        self.path = path
+
+    def write(self, line):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+        return True
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class BufferedFileLogSink:
+    """
+    Log sink backed by an in-memory ring buffer.
+    - write() only appends to the buffer, no disk I/O in the request path
+    - A background thread drains the buffer with one writelines() call per batch
+    - A batch is flushed when `batch_size` lines are waiting or every `flush_interval` seconds
+    - When the buffer is full the `overflow` policy decides what happens:
+        'drop_oldest' - discard the oldest buffered line (default)
+        'drop_newest' - discard the incoming line
+        'block'       - wait for the writer to make room
+    """
+
+    OVERFLOW_POLICIES = ('drop_oldest', 'drop_newest', 'block')
+
+    def __init__(self, path="request_log.txt", capacity=10000, batch_size=256,
+                 flush_interval=1.0, overflow='drop_oldest'):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+
+        self.path = path
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+
+        self.buffer = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.flush_requested = False
+
+        # Counters (read them through stats())
+        self.accepted = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        # Accepted lines that have left the buffer (written, failed or evicted)
+        self.settled = 0
+
+        self.writer = threading.Thread(target=self._run, name="request-log-writer", daemon=True)
+        self.writer.start()
+        atexit.register(self.close)
+
+    def write(self, line):
+        """Queue a line for writing. Returns False if the line was dropped."""
+        with self.condition:
+            if self.closed:
+                self.dropped += 1
+                return False
+
+            if len(self.buffer) >= self.capacity:
+                if self.overflow == 'drop_newest':
+                    self.dropped += 1
+                    return False
+                if self.overflow == 'drop_oldest':
+                    self.buffer.popleft()
+                    self.dropped += 1
+                    self.settled += 1
+                else:
+                    while len(self.buffer) >= self.capacity and not self.closed:
+                        self.condition.wait()
+
+            self.buffer.append(line)
+            self.accepted += 1
+            if len(self.buffer) >= self.batch_size:
+                self.condition.notify_all()
+        return True
+
+    def flush(self):
+        """Block until everything buffered so far has been written."""
+        with self.condition:
+            target = self.accepted
+            self.flush_requested = True
+            self.condition.notify_all()
+            while self.settled < target and self.writer.is_alive():
+                self.condition.wait()
+
+    def close(self):
+        with self.condition:
+            if self.closed:
+                return
+            self.closed = True
+            self.condition.notify_all()
+        self.writer.join()
+
+    def stats(self):
+        with self.condition:
+            return {
+                'buffered': len(self.buffer),
+                'accepted': self.accepted,
+                'dropped': self.dropped,
+                'written': self.written,
+                'batches': self.batches,
+            }
+
+    def _take_batch(self):
+        with self.condition:
+            deadline = time.monotonic() + self.flush_interval
+            while (not self.closed and not self.flush_requested
+                   and len(self.buffer) < self.batch_size):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+
+            count = min(len(self.buffer), self.batch_size)
+            batch = [self.buffer.popleft() for _ in range(count)]
+            if not self.buffer:
+                self.flush_requested = False
+            # Wake up writers blocked by the 'block' policy
+            self.condition.notify_all()
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch:
+                try:
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.writelines(batch)
+                except OSError as e:
+                    logger.error(f"Could not write request log batch: {str(e)}")
+                    with self.condition:
+                        self.dropped += len(batch)
+                        self.settled += len(batch)
+                        self.condition.notify_all()
+                else:
+                    with self.condition:
+                        self.written += len(batch)
+                        self.settled += len(batch)
+                        self.batches += 1
+                        self.condition.notify_all()
+
+            with self.condition:
+                if self.closed and not self.buffer:
+                    self.condition.notify_all()
+                    return
+
+
+DEFAULT_SINK = 'app.logsinks.BufferedFileLogSink'
+DEFAULT_PATH = 'request_log.txt'
+
+# path -> (configuration, sink); see get_log_sink()
+_sinks = {}
+_sinks_lock = threading.Lock()
+
+
+def build_log_sink(config=None):
+    """
+    Create the sink described by settings.REQUEST_LOG, e.g.
+
+        REQUEST_LOG = {
+            'SINK': 'app.logsinks.BufferedFileLogSink',
+            'PATH': BASE_DIR / 'request_log.txt',
+            'OPTIONS': {'batch_size': 256, 'flush_interval': 1.0},
+        }
+    """
+    if config is None:
+        config = getattr(settings, 'REQUEST_LOG', {})
+    sink_class = import_string(config.get('SINK', DEFAULT_SINK))
+    return sink_class(path=config.get('PATH', DEFAULT_PATH), **config.get('OPTIONS', {}))
+
+
+def get_log_sink(config=None):
+    """
+    The sink for settings.REQUEST_LOG, shared by everyone logging to the same
+    file: the middleware is instantiated once per handler (and per test
+    Client), but there is only one writer thread per path.
+    A different configuration for the path replaces (and closes) the old sink.
+    """
+    if config is None:
+        config = getattr(settings, 'REQUEST_LOG', {})
+    path = str(config.get('PATH', DEFAULT_PATH))
+    signature = (config.get('SINK', DEFAULT_SINK), sorted(config.get('OPTIONS', {}).items()))
+    with _sinks_lock:
+        current = _sinks.get(path)
+        if current is not None and current[0] == signature and not getattr(current[1], 'closed', False):
+            return current[1]
+        if current is not None:
+            current[1].close()
+        sink = build_log_sink(config)
+        _sinks[path] = (signature, sink)
+        return sink
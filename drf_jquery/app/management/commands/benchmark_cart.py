@@ -0,0 +1,111 @@
+import os
+import statistics
+import tempfile
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from app.cart import Cart, DatabaseCartStore, format_cents
+from app.models import CartItem, Category, Product
+
+
+def session_total(cart):
+    """How the views computed the total from request.session['cart'] before app/cart.py"""
+    return sum(Decimal(item['price']) * item['qty'] for item in cart.values())
+
+
+class Command(BaseCommand):
+    help = (
+        "Cart totals on a 500-line cart (--lines): the old session-dict recomputation, a "
+        "SUM/COUNT over the CartItem rows, and the Cart API reading the CartSummary row "
+        "(cache miss) or its cached copy; then a write (add one unit) followed by reading "
+        "the totals. Runs against a throwaway SQLite file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        handle, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        connection.settings_dict['TEST']['NAME'] = path
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            for suffix in ('-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+    def run(self, options):
+        user = User.objects.create_user('benchmark')
+        category = Category.objects.create(name='Benchmark')
+        products = Product.objects.bulk_create(
+            Product(name=f'Product {i}', description='', price=Decimal(i % 50) + Decimal('0.99'), category=category)
+            for i in range(options['lines'])
+        )
+        store = DatabaseCartStore()
+        cart = Cart(user, store=store)
+        for product in products:
+            cart.add(product, 2)
+        session_cart = {
+            str(product.id): {'name': product.name, 'price': str(product.price), 'qty': 2, 'image_url': ''}
+            for product in products
+        }
+
+        def aggregate():
+            totals = CartItem.objects.filter(user_id=user.id).aggregate(**store.SUMMARY_AGGREGATES)
+            return format_cents(totals['subtotal_cents'])
+
+        def row():
+            store.invalidate_summary(user.id)
+            return Cart(user, store=store).totals()
+
+        def cached():
+            return Cart(user, store=store).totals()
+
+        def session_write():
+            session_cart[str(products[0].id)]['qty'] += 1
+            return session_total(session_cart)
+
+        def summary_write():
+            Cart(user, store=store).add(products[0], 1)
+            return Cart(user, store=store).totals()
+
+        cached()
+        self.stdout.write(
+            f"{options['lines']}-line cart, median of {options['repeat']} (us)\n"
+            f"{'totals read':<34} {'us':>9}"
+        )
+        for name, read in (
+            ('session dict, Decimal sum (old)', lambda: session_total(session_cart)),
+            ('CartItem SUM/COUNT', aggregate),
+            ('CartSummary row (cache miss)', row),
+            ('Cart API, cached summary', cached),
+        ):
+            self.stdout.write(f"{name:<34} {self.timed(read, options['repeat']):9.1f}")
+
+        self.stdout.write(f"\n{'add one unit, then read totals':<34} {'us':>9}")
+        for name, write in (
+            ('session dict (old, no DB write)', session_write),
+            ('Cart API', summary_write),
+        ):
+            self.stdout.write(f"{name:<34} {self.timed(write, options['repeat']):9.1f}")
+        cache.clear()
+
+    @staticmethod
+    def timed(fetch, repeat):
+        fetch()
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fetch()
+            samples.append((time.perf_counter() - started) * 1e6)
+        return statistics.median(samples)
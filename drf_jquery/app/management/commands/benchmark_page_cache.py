@@ -0,0 +1,110 @@
+import os
+import statistics
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+
+from app import pagecache
+from app.models import Category, Product, UserProfile
+from app.tests_performance import TEST_TEMPLATES
+
+VIEWS = ['products_list', 'product_detail', 'categories_list']
+NO_REQUEST_LOG = {'SINK': 'app.logsinks.FileLogSink', 'PATH': os.devnull}
+HOST = '127.0.0.1'
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare cold (just invalidated) and warm render latency of the cached catalogue "
+        "pages, then invalidate under N concurrent clients to show how many of them "
+        "re-render. Runs in-process against a throwaway SQLite file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=50, help="Requests per page and mode")
+        parser.add_argument('--concurrency', type=int, default=20)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        handle, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        connection.settings_dict['TEST']['NAME'] = path
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        # The page templates are not part of this repo; use the stand-ins the
+        # performance suite renders
+        try:
+            with override_settings(TEMPLATES=TEST_TEMPLATES, REQUEST_LOG=NO_REQUEST_LOG):
+                self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run(self, options):
+        client, urls = self.setup_data(options['products'])
+        pagecache.reset_stats(VIEWS)
+
+        self.stdout.write(f"{'page':<22} {'cold ms':>9} {'warm ms':>9} {'speedup':>8}")
+        for url in urls:
+            cold = self.timed(client, url, options['repeat'], invalidate=True)
+            warm = self.timed(client, url, options['repeat'], invalidate=False)
+            self.stdout.write(f"{url:<22} {cold:9.2f} {warm:9.2f} {cold / warm:7.1f}x")
+
+        url = urls[0]
+        outcomes = self.stampede(client, url, options['concurrency'])
+        self.stdout.write(
+            f"\n{options['concurrency']} concurrent requests after invalidating {url}: "
+            + ', '.join(f"{outcomes[name]} {name}" for name in ('MISS', 'STALE', 'HIT'))
+        )
+
+        self.stdout.write('')
+        for view, counts in pagecache.stats(VIEWS).items():
+            self.stdout.write(
+                f"{view:<22} hit {counts['hit']:>5}  stale {counts['stale']:>5}  "
+                f"miss {counts['miss']:>5}  hit rate {counts['hit_rate']:.0%}"
+            )
+
+    def setup_data(self, count):
+        user = User.objects.create_user('benchmark', password='x')
+        UserProfile.objects.create(user=user, role='customer')
+        categories = Category.objects.bulk_create(Category(name=f'Category {i}') for i in range(20))
+        products = Product.objects.bulk_create(
+            Product(name=f'Product {i}', description='Benchmark product', price=Decimal('9.99'),
+                    category=categories[i % len(categories)], stock=10)
+            for i in range(count)
+        )
+        client = Client(HTTP_HOST=HOST)
+        client.force_login(user)
+        return client, ['/products/', f'/products/{products[0].id}/', '/categories/']
+
+    def timed(self, client, url, repeat, invalidate):
+        """Median latency in ms"""
+        client.get(url)
+        samples = []
+        for _ in range(repeat):
+            if invalidate:
+                pagecache.bump('products', 'categories', 'products:bulk')
+            started = time.perf_counter()
+            response = client.get(url)
+            samples.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, f"{url} -> {response.status_code}"
+        return statistics.median(samples)
+
+    def stampede(self, client, url, concurrency):
+        cookie = client.cookies['sessionid'].value
+        client.get(url)
+        pagecache.bump('products')
+
+        def request(_):
+            thread_client = Client(HTTP_HOST=HOST)
+            thread_client.cookies['sessionid'] = cookie
+            return thread_client.get(url)['X-Cache']
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            return Counter(pool.map(request, range(concurrency)))
@@ -0,0 +1,105 @@
+import os
+import statistics
+import tempfile
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from app.models import Category, Product
+from app.pagination import KeysetPaginator
+from app.sorting import PRODUCT_SORTS, UnknownSort
+
+BATCH_SIZE = 10000
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare OFFSET pagination with KeysetPaginator on the product list at growing "
+        "table sizes (10k, 100k, 1M rows by default): median time to fetch the first, a "
+        "middle and the last page. Runs against a throwaway SQLite file that is grown "
+        "from one size to the next."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+        parser.add_argument('--sort', default='-created_at', help="A PRODUCT_SORTS key")
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            ordering = PRODUCT_SORTS.get(options['sort']).ordering
+        except UnknownSort as e:
+            raise CommandError(str(e))
+
+        old_name = connection.settings_dict['NAME']
+        handle, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        connection.settings_dict['TEST']['NAME'] = path
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.run(ordering, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            for suffix in ('-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+    def run(self, ordering, options):
+        page_size = options['page_size']
+        categories = Category.objects.bulk_create(Category(name=f'Category {i}') for i in range(20))
+        self.stdout.write(
+            f"ordering {ordering}, {page_size} per page, median of {options['repeat']} (ms)\n"
+            f"{'rows':>9} {'page':>8} {'offset':>9} {'keyset':>9} {'speedup':>8}"
+        )
+        count = 0
+        for size in sorted(options['sizes']):
+            count = self.grow(categories, count, size)
+            connection.cursor().execute('ANALYZE')
+            paginator = KeysetPaginator(Product.objects.all(), ordering, page_size=page_size)
+            last = (size - 1) // page_size
+            for label, page in (('first', 0), ('middle', last // 2), ('last', last)):
+                offset = self.timed(lambda: self.offset_page(ordering, page, page_size), options['repeat'])
+                cursor = self.cursor_for(paginator, ordering, page, page_size)
+                keyset = self.timed(lambda: list(paginator.get_page(cursor)), options['repeat'])
+                self.stdout.write(
+                    f"{size:>9} {label:>8} {offset:9.2f} {keyset:9.2f} {offset / keyset:7.1f}x"
+                )
+
+    def grow(self, categories, count, size):
+        """Insert products until there are `size`; prices repeat, so sorts have ties"""
+        while count < size:
+            batch = min(BATCH_SIZE, size - count)
+            Product.objects.bulk_create(
+                Product(name=f'Product {i:07d}', description='Benchmark product',
+                        price=Decimal(i % 500) + Decimal('0.99'), stock=10,
+                        category=categories[i % len(categories)])
+                for i in range(count, count + batch)
+            )
+            count += batch
+        return count
+
+    @staticmethod
+    def offset_page(ordering, page, page_size):
+        start = page * page_size
+        return list(Product.objects.order_by(*ordering)[start:start + page_size])
+
+    @staticmethod
+    def cursor_for(paginator, ordering, page, page_size):
+        """The cursor a client would hold after walking to `page` (not timed)"""
+        if page == 0:
+            return None
+        previous = Product.objects.order_by(*ordering)[page * page_size - 1]
+        return paginator.encode_cursor(previous, 'next')
+
+    @staticmethod
+    def timed(fetch, repeat):
+        fetch()
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fetch()
+            samples.append((time.perf_counter() - started) * 1000)
+        return statistics.median(samples)
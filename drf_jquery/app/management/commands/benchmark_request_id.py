@@ -0,0 +1,47 @@
+import timeit
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from app.request_id import generate_request_id
+
+GENERATORS = {
+    'generate_request_id': generate_request_id,
+    'uuid4().hex': lambda: uuid.uuid4().hex,
+    'str(uuid4())': lambda: str(uuid.uuid4()),
+    'uuid1().hex': lambda: uuid.uuid1().hex,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Time request ID generation (app/request_id.py) against uuid4/uuid1, then generate "
+        "IDs from several threads at once and check they are unique and, per thread, in order."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=200_000, help="IDs per timing run")
+        parser.add_argument('--threads', type=int, default=8)
+
+    def handle(self, *args, **options):
+        number = options['number']
+        self.stdout.write(f"{'generator':<22} {'ns/id':>8}")
+        for name, generate in GENERATORS.items():
+            # Best of 5 runs: the least disturbed by the rest of the machine
+            best = min(timeit.repeat(generate, number=number, repeat=5))
+            self.stdout.write(f"{name:<22} {best / number * 1e9:8.0f}")
+
+        def worker(_):
+            return [generate_request_id() for _ in range(number // options['threads'])]
+
+        with ThreadPoolExecutor(options['threads']) as pool:
+            batches = list(pool.map(worker, range(options['threads'])))
+        ids = [request_id for batch in batches for request_id in batch]
+        ordered = all(batch == sorted(batch) for batch in batches)
+        unique = len(set(ids)) == len(ids)
+        style = self.style.SUCCESS if unique and ordered else self.style.ERROR
+        self.stdout.write(style(
+            f"\n{len(ids)} IDs from {options['threads']} threads: "
+            f"{'unique' if unique else 'DUPLICATES'}, {'sorted' if ordered else 'NOT sorted'} within each thread"
+        ))
@@ -0,0 +1,115 @@
+import logging
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+
+from app.middlewares import UserActivityLoggingMiddleware
+
+
+class UnbufferedActivityLoggingMiddleware(UserActivityLoggingMiddleware):
+    """
+    The request log as it was before the sinks: a REQUEST and a RESPONSE line,
+    each one an open/append/close of the file in the request path
+    """
+
+    def __init__(self, get_response, path):
+        self.get_response = get_response
+        self.async_mode = False
+        self.log_file = path
+
+    def __call__(self, request):
+        self.write_line(request, f"REQUEST | User: {self.user(request)} | Method: {request.method} | "
+                                 f"Path: {request.path} | IP: {self.get_client_ip(request)}")
+        response = self.get_response(request)
+        self.write_line(request, f"RESPONSE | User: {self.user(request)} | "
+                                 f"Status: {response.status_code} | Path: {request.path}")
+        return response
+
+    @staticmethod
+    def user(request):
+        return request.user.username if request.user.is_authenticated else "Anonymous"
+
+    def write_line(self, request, text):
+        with open(self.log_file, "a", encoding="utf-8") as f:
+            f.write(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {text}\n")
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmark of the request logging middleware: the old unbuffered middleware "
+        "against UserActivityLoggingMiddleware with FileLogSink and BufferedFileLogSink. "
+        "Each request goes through the middleware alone (a no-op view), writing to a "
+        "temporary file; the console logger is silenced for all of them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000, help="Requests per thread")
+        parser.add_argument('--threads', type=int, default=1)
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        requests = []
+        for i in range(100):
+            request = factory.get(f'/products/{i}/')
+            request.user = AnonymousUser()
+            requests.append(request)
+
+        def view(request):
+            return HttpResponse()
+
+        self.stdout.write(
+            f"{options['requests']} requests x {options['threads']} thread(s)\n"
+            f"{'middleware':<24} {'us/request':>11} {'p99 us':>9} {'total s':>9} {'lines':>8}"
+        )
+        logging.disable(logging.INFO)
+        try:
+            for name in ('unbuffered (old)', 'FileLogSink', 'BufferedFileLogSink'):
+                handle, path = tempfile.mkstemp(suffix='.log')
+                os.close(handle)
+                try:
+                    self.run(name, path, view, requests, options)
+                finally:
+                    os.remove(path)
+        finally:
+            logging.disable(logging.NOTSET)
+
+    def build(self, name, path, view):
+        if name == 'unbuffered (old)':
+            return UnbufferedActivityLoggingMiddleware(view, path), None
+        with override_settings(REQUEST_LOG={'SINK': f'app.logsinks.{name}', 'PATH': path}):
+            middleware = UserActivityLoggingMiddleware(view)
+        return middleware, middleware.sink
+
+    def run(self, name, path, view, requests, options):
+        middleware, sink = self.build(name, path, view)
+
+        def worker(_):
+            samples = []
+            for i in range(options['requests']):
+                started = time.perf_counter()
+                middleware(requests[i % len(requests)])
+                samples.append(time.perf_counter() - started)
+            return samples
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['threads']) as pool:
+            samples = [sample for batch in pool.map(worker, range(options['threads'])) for sample in batch]
+        # Total time includes the buffered sink catching up with its backlog
+        if sink is not None:
+            sink.flush()
+            sink.close()
+        elapsed = time.perf_counter() - started
+
+        with open(path, encoding='utf-8') as f:
+            lines = sum(1 for _ in f)
+        mean = statistics.fmean(samples) * 1e6
+        p99 = statistics.quantiles(samples, n=100)[-1] * 1e6
+        self.stdout.write(f"{name:<24} {mean:11.1f} {p99:9.1f} {elapsed:9.2f} {lines:8}")
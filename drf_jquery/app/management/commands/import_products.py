@@ -0,0 +1,55 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app import catalog_io
+
+PROGRESS_EVERY = 100_000
+
+
+class Command(BaseCommand):
+    help = (
+        "Import products from a CSV or NDJSON file ('-' for stdin), streaming it in "
+        "batches. Rows with an id update that product, others are inserted; categories "
+        "are matched by name and created when missing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=catalog_io.FORMATS, help="Default: from the file extension, else csv")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--skip-invalid', action='store_true', help="Skip invalid rows instead of stopping")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or catalog_io.format_for(path)
+        started = time.perf_counter()
+        reported = 0
+
+        def progress(imported):
+            nonlocal reported
+            if imported - reported >= PROGRESS_EVERY:
+                reported = imported
+                self.stdout.write(f"  {imported} rows, {imported / (time.perf_counter() - started):.0f} rows/s")
+
+        stream = sys.stdin if path == '-' else open(path, encoding='utf-8', newline='')
+        try:
+            imported, skipped = catalog_io.import_products(
+                catalog_io.read_rows(stream, fmt),
+                batch_size=options['batch_size'],
+                skip_invalid=options['skip_invalid'],
+                on_batch=progress,
+            )
+        except catalog_io.RowError as e:
+            raise CommandError(f"{e} (batches before this row were imported)")
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = time.perf_counter() - started
+        rate = imported / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} products in {elapsed:.1f}s ({rate:.0f} rows/s)"
+            + (f", skipped {skipped} invalid rows" if skipped else "")
+        ))
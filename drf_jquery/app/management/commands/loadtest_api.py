@@ -0,0 +1,139 @@
+import asyncio
+import io
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test import Client
+
+from app.cart import Cart
+from app.models import Category, Product, UserProfile
+
+ENDPOINTS = ['/api/cart/', '/api/user/']
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the JSON endpoints: requests/sec with N concurrent clients served "
+        "by the ASGI application on one event loop (as uvicorn runs it) and by the WSGI "
+        "application on N threads (as a threaded WSGI server runs it). Both are driven "
+        "in-process against a throwaway SQLite file, so no server or network is involved."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=2000, help="Requests per endpoint and server")
+        parser.add_argument('--path', action='append', dest='paths', help="Endpoint to test (repeatable)")
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        handle, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        connection.settings_dict['TEST']['NAME'] = path
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            cookie = self.setup_data()
+            for endpoint in options['paths'] or ENDPOINTS:
+                for name, run in (('asgi', self.run_asgi), ('wsgi', self.run_wsgi)):
+                    started = time.perf_counter()
+                    statuses = run(endpoint, cookie, options['concurrency'], options['requests'])
+                    elapsed = time.perf_counter() - started
+                    failed = sum(status != 200 for status in statuses)
+                    self.stdout.write(
+                        f"{endpoint:<14} {name}  {len(statuses) / elapsed:8.0f} req/s"
+                        + (self.style.ERROR(f"  {failed} failed") if failed else "")
+                    )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def setup_data(self):
+        user = User.objects.create_user('loadtest', password='x')
+        UserProfile.objects.create(user=user, city='Kathmandu')
+        category = Category.objects.create(name='Load test')
+        cart = Cart(user)
+        for i in range(10):
+            cart.add(Product.objects.create(name=f'Product {i}', price=Decimal('9.99'), stock=10, category=category), qty=2)
+
+        client = Client()
+        client.force_login(user)
+        return f"sessionid={client.cookies['sessionid'].value}"
+
+    def run_asgi(self, endpoint, cookie, concurrency, total):
+        application = get_asgi_application()
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': 'GET', 'scheme': 'http', 'path': endpoint, 'raw_path': endpoint.encode(),
+            'query_string': b'', 'root_path': '', 'server': ('127.0.0.1', 8000), 'client': ('127.0.0.1', 5000),
+            'headers': [(b'host', b'127.0.0.1'), (b'cookie', cookie.encode())],
+        }
+
+        async def request():
+            body_sent = False
+            finished = asyncio.Event()
+            status = []
+
+            async def receive():
+                nonlocal body_sent
+                if not body_sent:
+                    body_sent = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                await finished.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+                elif not message.get('more_body'):
+                    finished.set()
+
+            await application(dict(scope), receive, send)
+            return status[0]
+
+        async def client(count, statuses):
+            for _ in range(count):
+                statuses.append(await request())
+
+        async def main():
+            statuses = []
+            await asyncio.gather(*(client(count, statuses) for count in split(total, concurrency)))
+            return statuses
+
+        return asyncio.run(main())
+
+    def run_wsgi(self, endpoint, cookie, concurrency, total):
+        application = get_wsgi_application()
+        statuses = []
+        lock = threading.Lock()
+
+        def client(count):
+            for _ in range(count):
+                environ = {
+                    'REQUEST_METHOD': 'GET', 'PATH_INFO': endpoint, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+                    'SERVER_NAME': '127.0.0.1', 'SERVER_PORT': '8000', 'SERVER_PROTOCOL': 'HTTP/1.1',
+                    'REMOTE_ADDR': '127.0.0.1', 'HTTP_HOST': '127.0.0.1', 'HTTP_COOKIE': cookie,
+                    'wsgi.input': io.BytesIO(), 'wsgi.errors': io.StringIO(), 'wsgi.url_scheme': 'http',
+                    'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+                    'wsgi.version': (1, 0),
+                }
+                status = []
+                response = application(environ, lambda s, headers: status.append(int(s[:3])))
+                b''.join(response)
+                response.close()
+                with lock:
+                    statuses.append(status[0])
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(client, split(total, concurrency)))
+        return statuses
+
+
+def split(total, parts):
+    return [total // parts + (i < total % parts) for i in range(parts)]
@@ -0,0 +1,139 @@
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, transaction
+from django.db.models import F
+
+from app.models import Category, Product
+
+PRODUCTS = 2000
+
+
+class Command(BaseCommand):
+    help = (
+        "Concurrent read/write load test of the SQLite settings: reader threads page "
+        "through products while writer threads run read-then-write transactions (like "
+        "placing an order). Runs once with SQLite's defaults and once with the OPTIONS "
+        "in settings.DATABASES, each against a throwaway database file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=10)
+
+    def handle(self, *args, **options):
+        tuned = settings.DATABASES['default'].get('OPTIONS', {})
+        if connection.vendor != 'sqlite' or not tuned:
+            self.stderr.write("Needs an SQLite default database with OPTIONS to compare against")
+            return
+
+        # Defaults, except that both profiles wait as long for a lock
+        profiles = [('default', {'timeout': tuned.get('timeout', 5)}), ('tuned', tuned)]
+        results = {}
+        for name, profile_options in profiles:
+            results[name] = self.run_profile(profile_options, options)
+            self.report(name, results[name], options['seconds'])
+
+        default, tuned = (results[name] for name, _ in profiles)
+        for kind in ('read', 'write'):
+            if default[kind]:
+                self.stdout.write(f"{kind}s: {tuned[kind] / default[kind]:.1f}x")
+
+    def run_profile(self, profile_options, options):
+        old_name = connection.settings_dict['NAME']
+        old_options = connection.settings_dict['OPTIONS']
+        handle, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        # Threads open their own connections from this (shared) settings dict
+        connection.settings_dict['OPTIONS'] = profile_options
+        connection.settings_dict['TEST']['NAME'] = path
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.setup_data()
+            return self.run_threads(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            connection.settings_dict['OPTIONS'] = old_options
+            for suffix in ('-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+    def setup_data(self):
+        categories = Category.objects.bulk_create(Category(name=f'Category {i}') for i in range(10))
+        Product.objects.bulk_create(
+            Product(name=f'Product {i}', description='Load test product', price=Decimal('9.99'),
+                    category=categories[i % len(categories)], stock=1_000_000)
+            for i in range(PRODUCTS)
+        )
+        # Each profile starts from a fresh file; nothing left over from setup
+        connection.close()
+
+    def run_threads(self, options):
+        counts = Counter()
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['seconds']
+        product_ids = list(Product.objects.values_list('id', flat=True))
+        category_ids = list(Category.objects.values_list('id', flat=True))
+        connection.close()
+
+        def reader():
+            done = errors = 0
+            while time.monotonic() < deadline:
+                try:
+                    list(
+                        Product.objects.filter(category_id=random.choice(category_ids))
+                        .select_related('category').order_by('-created_at', '-id')[:20]
+                    )
+                    done += 1
+                except OperationalError:
+                    errors += 1
+            finish('read', done, errors)
+
+        def writer():
+            done = errors = 0
+            while time.monotonic() < deadline:
+                ids = random.sample(product_ids, 3)
+                try:
+                    with transaction.atomic():
+                        # Read first, then write: a deferred transaction has to
+                        # upgrade its lock here
+                        stock = dict(Product.objects.filter(id__in=ids).values_list('id', 'stock'))
+                        Product.objects.filter(id__in=[pk for pk in ids if stock[pk] > 0]).update(stock=F('stock') - 1)
+                    done += 1
+                except OperationalError:
+                    errors += 1
+            finish('write', done, errors)
+
+        def finish(kind, done, errors):
+            connection.close()
+            with lock:
+                counts[kind] += done
+                counts[f'{kind}_errors'] += errors
+
+        threads = (
+            [threading.Thread(target=reader) for _ in range(options['readers'])]
+            + [threading.Thread(target=writer) for _ in range(options['writers'])]
+        )
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return counts
+
+    def report(self, name, counts, seconds):
+        line = (
+            f"{name:<8} reads {counts['read'] / seconds:8.0f}/s   "
+            f"writes {counts['write'] / seconds:7.0f}/s"
+        )
+        errors = counts['read_errors'] + counts['write_errors']
+        if errors:
+            line += self.style.ERROR(f"   {errors} 'database is locked' errors")
+        self.stdout.write(line)
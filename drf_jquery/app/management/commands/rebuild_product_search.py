@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product full-text search index (run after bulk imports/updates)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--tokenizer',
+            choices=sorted(search.TOKENIZE_OPTIONS),
+            help="Recreate the index with this tokenizer (default: keep the current one)",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            total = search.rebuild_index(
+                batch_size=options['batch_size'],
+                tokenizer=options['tokenizer'],
+            )
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} products in {elapsed:.1f}s"))
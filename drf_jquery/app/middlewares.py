@@ -1,8 +1,16 @@
 from datetime import datetime
 import logging
 import os
+import time
+from django.conf import settings
 from django.http import JsonResponse
 from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import SimpleLazyObject
+from perftools import profiling
+
+from .logsinks import get_log_sink
+from .request_id import request_id_from, request_id_var, get_request_id
+from .roles import get_role, aget_role
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -12,51 +20,55 @@ class UserActivityLoggingMiddleware(MiddlewareMixin):
     """
     Middleware for comprehensive user activity logging.
     Logs all requests with timestamp, user, method, path, and response status.
+    - One record per request/response pair
+    - Records go to a log sink (see app/logsinks.py), by default a buffered
+      sink whose background thread does the file writes; middleware instances
+      logging to the same file share one sink
+    - Runs natively under ASGI too (no thread hop); the buffered sink never
+      blocks the event loop
     """
 
     def __init__(self, get_response):
-        self.get_response = get_response
-        self.log_file = "request_log.txt"
+        super().__init__(get_response)
+        self.sink = get_log_sink()
 
     def __call__(self, request):
-        # Log request details
-        self.log_request(request)
+        if self.async_mode:
+            return self.__acall__(request)
+        started = time.perf_counter()
         response = self.get_response(request)
-        # Log response details
-        self.log_response(request, response)
+        self.log_request(request, response, time.perf_counter() - started)
         return response
 
-    def log_request(self, request):
-        """Log incoming request details"""
-        user = request.user.username if request.user.is_authenticated else "Anonymous"
-        
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.log_request(request, response, time.perf_counter() - started)
+        return response
+
+    def log_request(self, request, response, duration):
+        """Log request and response details as a single record"""
+        # Only use the user if the request already looked it up (request.user
+        # or, in async views, request.auser()); resolving it here would load
+        # the session for requests that never needed it
+        cached_user = getattr(request, '_cached_user', None) or getattr(request, '_acached_user', None)
+        if cached_user is None:
+            user = "-"
+        else:
+            user = cached_user.username if cached_user.is_authenticated else "Anonymous"
+
         log_message = (
             f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] "
-            f"REQUEST | User: {user} | "
+            f"Request: {get_request_id()} | "
+            f"User: {user} | "
             f"Method: {request.method} | "
             f"Path: {request.path} | "
-            f"IP: {self.get_client_ip(request)}\n"
-        )
-        
-        with open(self.log_file, "a", encoding="utf-8") as f:
-            f.write(log_message)
-        
-        logger.info(log_message.strip())
-
-    def log_response(self, request, response):
-        """Log outgoing response details"""
-        user = request.user.username if request.user.is_authenticated else "Anonymous"
-        
-        log_message = (
-            f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] "
-            f"RESPONSE | User: {user} | "
+            f"IP: {self.get_client_ip(request)} | "
             f"Status: {response.status_code} | "
-            f"Path: {request.path}\n"
+            f"Duration: {duration * 1000:.1f}ms\n"
         )
-        
-        with open(self.log_file, "a", encoding="utf-8") as f:
-            f.write(log_message)
-        
+
+        self.sink.write(log_message)
         logger.info(log_message.strip())
 
     @staticmethod
@@ -77,8 +89,15 @@ class SecurityHeadersMiddleware(MiddlewareMixin):
     """
 
     def __call__(self, request):
-        response = self.get_response(request)
-        
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.add_headers(self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.add_headers(await self.get_response(request))
+
+    @staticmethod
+    def add_headers(response):
         # Add security headers
         response['X-Content-Type-Options'] = 'nosniff'
         response['X-Frame-Options'] = 'DENY'
@@ -96,64 +115,149 @@ class ErrorHandlingMiddleware(MiddlewareMixin):
     """
 
     def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
         try:
-            response = self.get_response(request)
+            return self.get_response(request)
         except Exception as e:
-            logger.error(f"Error handling request {request.path}: {str(e)}", exc_info=True)
-            
-            error_log = (
-                f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] "
-                f"ERROR | Path: {request.path} | "
-                f"Error: {str(e)}\n"
-            )
-            
-            with open("error_log.txt", "a", encoding="utf-8") as f:
-                f.write(error_log)
-            
-            # Return JSON error response for AJAX requests
-            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                return JsonResponse({
-                    'status': 'error',
-                    'message': 'An error occurred processing your request.'
-                }, status=500)
-            
-            # For regular requests, raise the exception (Django will handle it)
-            raise
+            return self.handle_error(request, e)
 
-        return response
+    async def __acall__(self, request):
+        try:
+            return await self.get_response(request)
+        except Exception as e:
+            return self.handle_error(request, e)
+
+    def handle_error(self, request, e):
+        """Called from the except block, so the bare raise re-raises the original error"""
+        request_id = get_request_id()
+        logger.error(f"Error handling request {request.path} [{request_id}]: {str(e)}", exc_info=True)
+        
+        error_log = (
+            f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] "
+            f"ERROR | Request: {request_id} | Path: {request.path} | "
+            f"Error: {str(e)}\n"
+        )
+        
+        with open("error_log.txt", "a", encoding="utf-8") as f:
+            f.write(error_log)
+        
+        # Return JSON error response for AJAX requests
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return JsonResponse({
+                'status': 'error',
+                'message': 'An error occurred processing your request.',
+                'request_id': request_id
+            }, status=500)
+        
+        # For regular requests, raise the exception (Django will handle it)
+        raise
 
 
 class SessionHandlingMiddleware(MiddlewareMixin):
     """
     Middleware for enhanced session handling.
-    Manages session data and handles session expiration.
+    - Never reads or writes the session itself; defaults such as
+      `user_login_time` are filled in lazily by the session engine (app/sessions.py)
+    - Reports how many times the session was loaded/saved for each request
+      (X-Session-Loads / X-Session-Saves headers in DEBUG, debug log otherwise)
+    - Must come *before* SessionMiddleware in settings.MIDDLEWARE so the
+      counts include the save done when the response goes out
     """
 
     def __call__(self, request):
-        # Initialize session data if not present
-        if request.user.is_authenticated:
-            if 'user_login_time' not in request.session:
-                request.session['user_login_time'] = datetime.now().isoformat()
-            
-            if 'cart' not in request.session:
-                request.session['cart'] = {}
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.report(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.report(request, await self.get_response(request))
+
+    @staticmethod
+    def report(request, response):
+        session = getattr(request, 'session', None)
+        loads = getattr(session, 'load_count', None)
+        if loads is not None:
+            saves = session.save_count
+            logger.debug(f"Session I/O for {request.path}: {loads} load(s), {saves} save(s)")
+            if settings.DEBUG:
+                response['X-Session-Loads'] = str(loads)
+                response['X-Session-Saves'] = str(saves)
         
-        response = self.get_response(request)
         return response
 
 
+class UserRoleMiddleware(MiddlewareMixin):
+    """
+    Middleware attaching the user's role next to request.user (see app/roles.py).
+    - request.role is lazy like request.user: requests that never check it
+      don't load the session or the role
+    - Looked up at most once per request, from the per-user role cache
+    - Async views use `await request.arole()`
+    - Must come after AuthenticationMiddleware
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        self.attach_role(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        self.attach_role(request)
+        return await self.get_response(request)
+
+    @staticmethod
+    def attach_role(request):
+        async def arole():
+            return await aget_role(await request.auser())
+
+        request.role = SimpleLazyObject(lambda: get_role(request.user))
+        request.arole = arole
+
+
 class CustomHeadersMiddleware(MiddlewareMixin):
     """
     Middleware for adding custom headers to track request/response flow.
     Useful for debugging and monitoring.
+    - Gives every request an ID (an incoming X-Request-ID is kept, so calls
+      can be followed across services) and echoes it in the response
+    - The ID is also put in a contextvar for log records (see app/request_id.py)
     """
 
     def __call__(self, request):
-        request.request_id = datetime.now().timestamp()
-        response = self.get_response(request)
-        
-        response['X-Request-ID'] = str(request.request_id)
+        if self.async_mode:
+            return self.__acall__(request)
+        request.request_id = request_id_from(request)
+        token = request_id_var.set(request.request_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_id_var.reset(token)
+        return self.add_headers(request, response)
+
+    async def __acall__(self, request):
+        request.request_id = request_id_from(request)
+        token = request_id_var.set(request.request_id)
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_id_var.reset(token)
+        return self.add_headers(request, response)
+
+    @staticmethod
+    def add_headers(request, response):
+        response['X-Request-ID'] = request.request_id
         response['X-Processed-By'] = 'CustomHeadersMiddleware'
         
         return response
 
+
+class QueryProfilingMiddleware(profiling.QueryProfilingMiddleware):
+    """
+    Per-request SQL profiling (see perftools/profiling.py); the N+1 warning
+    carries the request ID
+    """
+
+    def describe(self, request):
+        return f"{super().describe(request)} [{get_request_id()}]"
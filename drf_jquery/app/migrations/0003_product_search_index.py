@@ -0,0 +1,33 @@
+from django.db import migrations
+
+
+def create_search_table(apps, schema_editor):
+    # FTS5 is SQLite only; other databases use the icontains fallback in app/search.py
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    from app.search import create_table_sql, FTS_TABLE
+
+    schema_editor.execute(create_table_sql())
+    schema_editor.execute(
+        f"INSERT INTO {FTS_TABLE} (rowid, name, description) "
+        f"SELECT id, name, description FROM app_product"
+    )
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    from app.search import FTS_TABLE
+
+    schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_category_order_product_orderitem_userprofile'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
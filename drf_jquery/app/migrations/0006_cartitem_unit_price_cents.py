@@ -0,0 +1,38 @@
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def prices_to_cents(apps, schema_editor):
+    CartItem = apps.get_model('app', 'CartItem')
+    for item in CartItem.objects.all():
+        item.unit_price_cents = int(item.unit_price.scaleb(2))
+        item.save(update_fields=['unit_price_cents'])
+
+
+def cents_to_prices(apps, schema_editor):
+    CartItem = apps.get_model('app', 'CartItem')
+    for item in CartItem.objects.all():
+        item.unit_price = Decimal(item.unit_price_cents).scaleb(-2)
+        item.save(update_fields=['unit_price'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_cartitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cartitem',
+            name='unit_price_cents',
+            field=models.PositiveIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.RunPython(prices_to_cents, cents_to_prices),
+        migrations.RemoveField(
+            model_name='cartitem',
+            name='unit_price',
+        ),
+    ]
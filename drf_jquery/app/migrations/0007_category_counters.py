@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:53
+
+from django.db import migrations, models
+from django.db.models import Count
+
+STATUS_FIELDS = {
+    'in_stock': 'in_stock_count',
+    'out_of_stock': 'out_of_stock_count',
+    'coming_soon': 'coming_soon_count',
+}
+
+
+def count_existing_products(apps, schema_editor):
+    Category = apps.get_model('app', 'Category')
+    Product = apps.get_model('app', 'Product')
+    counts = {}
+    rows = Product.objects.order_by().values_list('category_id', 'status').annotate(n=Count('pk'))
+    for category_id, status, n in rows:
+        fields = counts.setdefault(category_id, {'product_count': 0})
+        fields['product_count'] += n
+        if status in STATUS_FIELDS:
+            fields[STATUS_FIELDS[status]] = fields.get(STATUS_FIELDS[status], 0) + n
+    for category_id, fields in counts.items():
+        Category.objects.filter(id=category_id).update(**fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_cartitem_unit_price_cents'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='coming_soon_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='in_stock_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='out_of_stock_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_existing_products, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+
+
+def summarize_existing_carts(apps, schema_editor):
+    CartItem = apps.get_model('app', 'CartItem')
+    CartSummary = apps.get_model('app', 'CartSummary')
+    rows = (
+        CartItem.objects.order_by().values('user_id')
+        .annotate(subtotal_cents=Sum(F('unit_price_cents') * F('quantity')), lines=Count('id'), quantity=Sum('quantity'))
+    )
+    CartSummary.objects.bulk_create(CartSummary(**row) for row in rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_category_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CartSummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('subtotal_cents', models.BigIntegerField(default=0)),
+                ('lines', models.PositiveIntegerField(default=0)),
+                ('quantity', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Cart summaries',
+            },
+        ),
+        migrations.RunPython(summarize_existing_carts, migrations.RunPython.noop),
+    ]
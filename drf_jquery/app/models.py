@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 
@@ -8,6 +8,13 @@ class Category(models.Model):
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Denormalized counts, maintained by app/counters.py
+    product_count = models.PositiveIntegerField(default=0, editable=False)
+    in_stock_count = models.PositiveIntegerField(default=0, editable=False)
+    out_of_stock_count = models.PositiveIntegerField(default=0, editable=False)
+    coming_soon_count = models.PositiveIntegerField(default=0, editable=False)
+
+    COUNTER_FIELDS = ('product_count', 'in_stock_count', 'out_of_stock_count', 'coming_soon_count')
 
     class Meta:
         verbose_name_plural = "Categories"
@@ -16,6 +23,78 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # Saving a loaded category must not write back counters that products
+        # may have changed since it was read
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
+class ProductQuerySet(models.QuerySet):
+    """
+    Bulk operations that keep the Category counters in step (app/counters.py)
+    and mark the cached catalogue pages stale (app/pagecache.py)
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from . import counters, pagecache
+
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            if kwargs.get('update_conflicts') or kwargs.get('ignore_conflicts'):
+                # Which rows were inserted and which updated isn't reported: recount
+                # the categories involved, before and after
+                touched = counters.categories_of_conflicts(self, objs, kwargs.get('unique_fields'))
+                objs = super().bulk_create(objs, *args, **kwargs)
+                counters.recount(touched | {obj.category_id for obj in objs})
+            else:
+                objs = super().bulk_create(objs, *args, **kwargs)
+                counters.count_created(objs)
+            pagecache.products_changed()
+        return objs
+
+    def update(self, **kwargs):
+        from . import counters, pagecache
+
+        if not {'category', 'category_id', 'status'} & set(kwargs):
+            rows = super().update(**kwargs)
+        else:
+            with transaction.atomic(using=self.db):
+                touched = set(self.order_by().values_list('category_id', flat=True).distinct())
+                new_category = kwargs.get('category', kwargs.get('category_id'))
+                if hasattr(new_category, 'resolve_expression'):
+                    # Case() from bulk_update, F(), ...: the new categories are only
+                    # known once the rows are written; re-read them by pk
+                    pks = list(self.order_by().values_list('pk', flat=True))
+                    rows = super().update(**kwargs)
+                    touched |= counters.categories_of(pks)
+                else:
+                    rows = super().update(**kwargs)
+                    touched.add(getattr(new_category, 'pk', new_category))
+                counters.recount(touched)
+        pagecache.products_changed()
+        return rows
+
+    update.alters_data = True
+
+    def delete(self):
+        from . import counters, pagecache
+
+        with transaction.atomic(using=self.db):
+            deltas = counters.count_deleted(self)
+            with counters.suspended():
+                result = super().delete()
+            counters.apply(deltas)
+            pagecache.products_changed()
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
 
 # Product Model - Many-to-One relationship with Category
 class Product(models.Model):
@@ -36,12 +115,26 @@ class Product(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='products_created')
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        # Composite indexes backing the product list sorts (see app/sorting.py)
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='product_created_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_idx'),
+            models.Index(fields=['name', 'id'], name='product_name_idx'),
+            models.Index(fields=['category', 'status', '-created_at', '-id'], name='product_cat_status_new_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # Atomic, so the Category counters updated by the signals commit with the row
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
 
 # Keep Item for backward compatibility
 class Item(models.Model):
@@ -88,6 +181,37 @@ class OrderItem(models.Model):
         return f"{self.product.name} x {self.quantity}"
 
 
+# CartItem Model - server-side shopping cart, one row per (user, product)
+class CartItem(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='cart_items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    quantity = models.PositiveIntegerField(default=1)
+    unit_price_cents = models.PositiveIntegerField()  # price when added, in cents (see app/cart.py)
+    added_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='unique_cart_line'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}: {self.product.name} x {self.quantity}"
+
+
+class CartSummary(models.Model):
+    """Running totals of a user's CartItem rows, changed in the same transaction as them (app/cart.py)"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    subtotal_cents = models.BigIntegerField(default=0)
+    lines = models.PositiveIntegerField(default=0)
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Cart summaries"
+
+    def __str__(self):
+        return f"{self.user_id}: {self.lines} lines, {self.quantity} units"
+
+
 # UserProfile Model - One-to-One relationship with User
 class UserProfile(models.Model):
     ROLE_CHOICES = [
@@ -0,0 +1,236 @@
+import hashlib
+import time
+from functools import partial, wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+
+from .roles import get_role
+
+# Response caching for the catalogue pages
+# - Entries are keyed on the view, its URL arguments, the query string
+#   (filters, sort, cursor) and the user's role
+# - Dependencies: every page names the tags it depends on; each tag has a
+#   generation in the cache, bumped on commit when the data changes, and an
+#   entry built under older generations is stale
+#     'products'       any product change (signals and ProductQuerySet)
+#     'product:<id>'   Product.save()/delete() of that product
+#     'products:bulk'  queryset update/delete/bulk_create, rows unknown
+#     'categories'     Category.save()/delete()
+# - Stampede protection: one request per key recomputes and stores the page
+#   (a cache.add() lock); meanwhile the others get the stale entry
+#   (stale-while-revalidate) or, with nothing to serve yet, render it
+#   themselves without storing it - never wait on another request
+# - Only plain 200 pages are stored: nothing that set cookies, used a CSRF
+#   token or showed flash messages; pages with pending messages bypass the cache
+# - Every response says X-Cache: HIT / STALE / MISS; counts per view are kept
+#   in the cache (stats())
+
+DEFAULTS = {
+    'ENABLED': True,
+    'TIMEOUT': 300,             # seconds an entry is fresh
+    'STALE_TIMEOUT': 3600,      # seconds a stale entry may still be served during a refresh
+    'LOCK_TIMEOUT': 10,         # longest a recomputation may hold the lock
+}
+
+KEY_PREFIX = 'pagecache'
+OUTCOMES = ('hit', 'stale', 'miss')
+
+
+def get_pagecache_settings():
+    return {**DEFAULTS, **getattr(settings, 'PAGE_CACHE', {})}
+
+
+# ==================== DEPENDENCY GENERATIONS ====================
+
+def _tag_key(tag):
+    return f'{KEY_PREFIX}:tag:{tag}'
+
+
+def generations(tags):
+    """Current generation of each tag; tags never bumped start at 0"""
+    keys = [_tag_key(tag) for tag in tags]
+    found = cache.get_many(keys)
+    return tuple(found.get(key, 0) for key in keys)
+
+
+def bump(*tags):
+    """Make every entry depending on one of the tags stale"""
+    now = time.time_ns()
+    cache.set_many({_tag_key(tag): now for tag in tags}, None)
+
+
+def invalidate_on_commit(*tags):
+    transaction.on_commit(partial(bump, *tags))
+
+
+def products_changed(product_id=None):
+    """One product saved/deleted, or (no id) a bulk operation on unknown rows"""
+    if product_id is None:
+        invalidate_on_commit('products', 'products:bulk')
+    else:
+        invalidate_on_commit('products', f'product:{product_id}')
+
+
+def categories_changed():
+    # Product pages show category names, so they depend on 'categories' too
+    invalidate_on_commit('categories')
+
+
+# ==================== METRICS ====================
+
+def _stat_key(view_name, outcome):
+    return f'{KEY_PREFIX}:stats:{view_name}:{outcome}'
+
+
+def record(view_name, outcome):
+    key = _stat_key(view_name, outcome)
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Evicted between add() and incr()
+            cache.add(key, 1, None)
+
+
+def stats(view_names):
+    """{view: {'hit': n, 'stale': n, 'miss': n, 'hit_rate': 0..1}}"""
+    keys = {(view, outcome): _stat_key(view, outcome) for view in view_names for outcome in OUTCOMES}
+    found = cache.get_many(list(keys.values()))
+    result = {}
+    for view in view_names:
+        counts = {outcome: found.get(keys[view, outcome], 0) for outcome in OUTCOMES}
+        served = sum(counts.values())
+        counts['hit_rate'] = (counts['hit'] + counts['stale']) / served if served else 0.0
+        result[view] = counts
+    return result
+
+
+def reset_stats(view_names):
+    cache.delete_many([_stat_key(view, outcome) for view in view_names for outcome in OUTCOMES])
+
+
+# ==================== VIEW CACHE ====================
+
+def user_role(request):
+    """Role the page is rendered for (app/roles.py)"""
+    return get_role(request.user)
+
+
+def cache_key(view_name, request, kwargs):
+    query = sorted(request.GET.lists())
+    digest = hashlib.md5(repr((sorted(kwargs.items()), query)).encode()).hexdigest()
+    return f'{KEY_PREFIX}:page:{view_name}:{user_role(request)}:{digest}'
+
+
+def _cacheable(request, response):
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return False
+    if request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+        # The page carries this user's CSRF token
+        return False
+    storage = getattr(request, '_messages', None)
+    return not (storage is not None and storage.used)
+
+
+def _respond(entry, outcome):
+    response = HttpResponse(entry['content'], content_type=entry['content_type'])
+    response['X-Cache'] = outcome.upper()
+    return response
+
+
+def cached_view(depends_on):
+    """
+    Cache a GET view's response.
+
+        @cached_view(lambda request, product_id: [f'product:{product_id}', 'categories'])
+        def product_detail(request, product_id): ...
+
+    `depends_on(request, **kwargs)` returns the dependency tags of the page.
+    """
+    def decorator(view):
+        view_name = view.__name__
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            config = get_pagecache_settings()
+            if not config['ENABLED'] or request.method not in ('GET', 'HEAD') or len(get_messages(request)):
+                return view(request, *args, **kwargs)
+
+            key = cache_key(view_name, request, kwargs)
+            current = generations(depends_on(request, **kwargs))
+            entry = cache.get(key)
+            fresh = entry is not None and entry['generations'] == current and entry['fresh_until'] > time.time()
+            if fresh:
+                record(view_name, 'hit')
+                return _respond(entry, 'hit')
+
+            lock = f'{key}:lock'
+            if not cache.add(lock, 1, config['LOCK_TIMEOUT']):
+                # Somebody else is recomputing this page
+                if entry is not None:
+                    record(view_name, 'stale')
+                    return _respond(entry, 'stale')
+                # Nothing to serve yet (a cold key): render it here too, but
+                # leave storing it to the lock holder
+                response = view(request, *args, **kwargs)
+                record(view_name, 'miss')
+                response['X-Cache'] = 'MISS'
+                return response
+
+            try:
+                response = view(request, *args, **kwargs)
+                if _cacheable(request, response):
+                    cache.set(key, {
+                        'content': response.content,
+                        'content_type': response['Content-Type'],
+                        'generations': current,
+                        'fresh_until': time.time() + config['TIMEOUT'],
+                    }, config['TIMEOUT'] + config['STALE_TIMEOUT'])
+            finally:
+                cache.delete(lock)
+            record(view_name, 'miss')
+            response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+# ==================== FRAGMENT CACHE ====================
+
+# Everything a product card shows; a card is re-rendered when any of it changes,
+# so card entries never need invalidating (old ones just expire)
+CARD_FIELDS = ('name', 'price', 'stock', 'status', 'image_url', 'category_id', 'updated_at')
+CARD_TEMPLATE = 'product_card.html'
+
+
+def _card_key(product, role, categories_generation):
+    state = [getattr(product, field) for field in CARD_FIELDS]
+    # Search results carry a highlighted name and snippet
+    state += [getattr(product, 'search_name', ''), getattr(product, 'search_snippet', '')]
+    digest = hashlib.md5(repr((state, categories_generation)).encode()).hexdigest()
+    return f'{KEY_PREFIX}:card:{role}:{product.id}:{digest}'
+
+
+def render_product_cards(products, request):
+    """Rendered card HTML for each product, in order; one cache round trip for the page"""
+    role = user_role(request)
+    categories_generation = generations(['categories'])
+    keys = [_card_key(product, role, categories_generation) for product in products]
+    found = cache.get_many(keys)
+    missing = {}
+    cards = []
+    for product, key in zip(products, keys):
+        if key not in found:
+            found[key] = missing[key] = render_to_string(
+                CARD_TEMPLATE, {'product': product, 'role': role}, request=request,
+            )
+        cards.append(found[key])
+    if missing:
+        config = get_pagecache_settings()
+        cache.set_many(missing, config['TIMEOUT'] + config['STALE_TIMEOUT'])
+    return cards
@@ -0,0 +1,135 @@
+from django.core import signing
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor cannot be decoded or belongs to another ordering"""
+
+
+class KeysetPage:
+    """One page of results plus the opaque cursors needed to move around"""
+
+    def __init__(self, items, next_cursor=None, previous_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+class KeysetPaginator:
+    """
+    Keyset (cursor) pagination.
+    - Instead of OFFSET, each page continues from the sort values of the last
+      row seen, e.g. WHERE (created_at, id) < (:created_at, :id)
+    - Cost is O(page size) no matter how deep the user has paged
+    - `id` is always added as a tiebreaker so the ordering is total
+    - Cursors are signed, so clients can't forge or edit them
+    """
+
+    salt = 'app.pagination.cursor'
+
+    def __init__(self, queryset, ordering, page_size=20):
+        self.queryset = queryset
+        self.page_size = page_size
+
+        ordering = [ordering] if isinstance(ordering, str) else list(ordering)
+        primary_desc = ordering[0].startswith('-')
+        if not any(f.lstrip('-') in ('id', 'pk') for f in ordering):
+            ordering.append('-id' if primary_desc else 'id')
+        self.ordering = ordering
+
+        opts = queryset.model._meta
+        self.fields = [opts.get_field(f.lstrip('-')) for f in ordering]
+
+    # ---------- cursor encoding ----------
+
+    def encode_cursor(self, obj, direction):
+        values = [field.value_to_string(obj) for field in self.fields]
+        return signing.dumps({'o': self.ordering, 'v': values, 'd': direction}, salt=self.salt)
+
+    def decode_cursor(self, cursor):
+        try:
+            data = signing.loads(cursor, salt=self.salt)
+        except signing.BadSignature:
+            raise InvalidCursor('Cursor is invalid')
+
+        if data.get('o') != self.ordering or data.get('d') not in ('next', 'prev'):
+            raise InvalidCursor('Cursor does not match the current ordering')
+
+        try:
+            values = [field.to_python(value) for field, value in zip(self.fields, data['v'])]
+        except Exception:
+            raise InvalidCursor('Cursor values are invalid')
+        return values, data['d']
+
+    # ---------- querying ----------
+
+    def _seek_filter(self, values, forward):
+        """
+        Build a >= x AND ((a > x) OR (a = x AND b > y) ...) for the given sort values.
+        `forward` False flips every comparison to walk backwards.
+        """
+        condition = Q()
+        equal_so_far = Q()
+        for field_name, value in zip(self.ordering, values):
+            name = field_name.lstrip('-')
+            descending = field_name.startswith('-')
+            lookup = 'lt' if descending == forward else 'gt'
+            condition |= equal_so_far & Q(**{f'{name}__{lookup}': value})
+            equal_so_far &= Q(**{name: value})
+
+        # Repeat the first column as a plain range so the database can seek
+        # into the index instead of evaluating the OR for every row
+        first = self.ordering[0]
+        lookup = 'lte' if first.startswith('-') == forward else 'gte'
+        return Q(**{f'{first.lstrip("-")}__{lookup}': values[0]}) & condition
+
+    def _reversed_ordering(self):
+        return [f[1:] if f.startswith('-') else f'-{f}' for f in self.ordering]
+
+    def get_page(self, cursor=None):
+        """Return the page that follows (or precedes) the given cursor"""
+        if not cursor:
+            rows = list(self.queryset.order_by(*self.ordering)[:self.page_size + 1])
+            has_more = len(rows) > self.page_size
+            rows = rows[:self.page_size]
+            return KeysetPage(
+                rows,
+                next_cursor=self.encode_cursor(rows[-1], 'next') if has_more else None,
+            )
+
+        values, direction = self.decode_cursor(cursor)
+
+        if direction == 'next':
+            qs = self.queryset.filter(self._seek_filter(values, forward=True)).order_by(*self.ordering)
+            rows = list(qs[:self.page_size + 1])
+            has_more = len(rows) > self.page_size
+            rows = rows[:self.page_size]
+            return KeysetPage(
+                rows,
+                next_cursor=self.encode_cursor(rows[-1], 'next') if has_more else None,
+                previous_cursor=self.encode_cursor(rows[0], 'prev') if rows else None,
+            )
+
+        qs = self.queryset.filter(self._seek_filter(values, forward=False)).order_by(*self._reversed_ordering())
+        rows = list(qs[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size][::-1]
+        return KeysetPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1], 'next') if rows else None,
+            previous_cursor=self.encode_cursor(rows[0], 'prev') if has_more else None,
+        )
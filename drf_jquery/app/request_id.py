@@ -0,0 +1,62 @@
+import base64
+import itertools
+import logging
+import os
+import re
+import time
+from contextvars import ContextVar
+
+# Request IDs
+# - 26 character, Crockford base32, ULID-style: 48 bit millisecond timestamp,
+#   32 bit process id, 48 bit per-process counter
+# - Sorting the strings sorts by time; within a process IDs are strictly
+#   increasing, and the process part keeps workers from colliding
+# - No lock: next() on itertools.count is atomic under the GIL
+# - The current ID lives in a contextvar; RequestIDLogFilter stamps it on the
+#   records of every logger routed to the console handler in LOGGING, which
+#   includes the django.db.backends query log
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+_TO_CROCKFORD = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ234567', ALPHABET)
+INCOMING_ID_RE = re.compile(r'^[A-Za-z0-9._:-]{1,64}$')
+
+request_id_var = ContextVar('request_id', default='-')
+
+_counter = itertools.count()
+_process = 0
+
+
+def _new_process_bits():
+    """Random 32 bit id for this process, re-rolled in forked workers"""
+    global _process
+    _process = int.from_bytes(os.urandom(4), 'big') << 48
+
+
+_new_process_bits()
+os.register_at_fork(after_in_child=_new_process_bits)
+
+
+def generate_request_id():
+    value = (time.time_ns() // 1_000_000) << 80 | _process | (next(_counter) & 0xFFFFFFFFFFFF)
+    # 20 bytes encode to exactly 32 base32 chars; the last 26 hold the 128 bit value
+    return base64.b32encode(value.to_bytes(20, 'big'))[-26:].decode().translate(_TO_CROCKFORD)
+
+
+def request_id_from(request):
+    """Reuse a well-formed incoming X-Request-ID, otherwise make a new one"""
+    incoming = request.headers.get('X-Request-ID', '')
+    if incoming and INCOMING_ID_RE.match(incoming):
+        return incoming
+    return generate_request_id()
+
+
+def get_request_id():
+    return request_id_var.get()
+
+
+class RequestIDLogFilter(logging.Filter):
+    """Adds %(request_id)s to every log record"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
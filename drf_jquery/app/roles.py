@@ -0,0 +1,103 @@
+from functools import wraps
+from urllib.parse import urlparse
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.core.cache import cache
+from django.shortcuts import resolve_url
+
+from .models import UserProfile
+
+# UserProfile.role lookups for authorization checks
+# - Cached per user (no expiry); the UserProfile signals drop the entry on commit
+# - Memoized on the user object, so a request looks it up at most once;
+#   UserRoleMiddleware exposes it as request.role (lazy, like request.user)
+#   and request.arole() for async views
+# - Users without a profile count as customers, as in the dashboard view
+
+# Bump when the cached value changes meaning so old entries are ignored
+ROLE_CACHE_VERSION = 1
+
+ANONYMOUS = 'anonymous'
+DEFAULT_ROLE = 'customer'
+STAFF_ROLES = ('staff', 'admin')
+
+
+def role_key(user_id):
+    return f'user_role:{user_id}'
+
+
+def get_role(user):
+    if not user.is_authenticated:
+        return ANONYMOUS
+    if not hasattr(user, '_role'):
+        role = cache.get(role_key(user.id), version=ROLE_CACHE_VERSION)
+        if role is None:
+            role = (
+                UserProfile.objects.filter(user_id=user.id).values_list('role', flat=True).first()
+                or DEFAULT_ROLE
+            )
+            cache.set(role_key(user.id), role, None, version=ROLE_CACHE_VERSION)
+        user._role = role
+    return user._role
+
+
+async def aget_role(user):
+    if not user.is_authenticated:
+        return ANONYMOUS
+    if not hasattr(user, '_role'):
+        role = await cache.aget(role_key(user.id), version=ROLE_CACHE_VERSION)
+        if role is None:
+            role = (
+                await UserProfile.objects.filter(user_id=user.id).values_list('role', flat=True).afirst()
+                or DEFAULT_ROLE
+            )
+            await cache.aset(role_key(user.id), role, None, version=ROLE_CACHE_VERSION)
+        user._role = role
+    return user._role
+
+
+def invalidate_role(user_id):
+    cache.delete(role_key(user_id), version=ROLE_CACHE_VERSION)
+
+
+def role_required(*roles, login_url=None):
+    """
+    Let only users with one of the roles through; others are redirected to
+    login_url (settings.LOGIN_URL by default) like user_passes_test does.
+
+        @login_required(login_url='login')
+        @role_required('staff', 'admin', login_url='dashboard')
+        def product_create(request): ...
+
+    Works on sync and async views.
+    """
+    def redirect(request):
+        path = request.build_absolute_uri()
+        resolved_login_url = resolve_url(login_url or settings.LOGIN_URL)
+        # Same-origin login URLs get a relative ?next=, as in user_passes_test
+        login_scheme, login_netloc = urlparse(resolved_login_url)[:2]
+        current_scheme, current_netloc = urlparse(path)[:2]
+        if (not login_scheme or login_scheme == current_scheme) and (
+            not login_netloc or login_netloc == current_netloc
+        ):
+            path = request.get_full_path()
+        return redirect_to_login(path, resolved_login_url)
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            async def wrapper(request, *args, **kwargs):
+                if await aget_role(await request.auser()) in roles:
+                    return await view(request, *args, **kwargs)
+                return redirect(request)
+        else:
+            def wrapper(request, *args, **kwargs):
+                if get_role(request.user) in roles:
+                    return view(request, *args, **kwargs)
+                return redirect(request)
+        return wraps(view)(wrapper)
+    return decorator
+
+
+staff_required = role_required(*STAFF_ROLES, login_url='dashboard')
@@ -0,0 +1,234 @@
+import logging
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+logger = logging.getLogger(__name__)
+
+# Product full-text search
+# - On SQLite, product name/description are indexed in an FTS5 virtual table
+#   whose rowid is the product id
+# - The index is kept in sync by the Product signals in app/signals.py;
+#   `manage.py rebuild_product_search` rebuilds it after bulk changes
+# - Other databases fall back to icontains filtering
+
+FTS_TABLE = 'app_product_fts'
+
+# Private-use markers for highlight()/snippet(); swapped for <mark> after escaping
+MARK_START = '\ue000'
+MARK_END = '\ue001'
+
+TOKENIZE_OPTIONS = {
+    'unicode61': 'unicode61 remove_diacritics 1',
+    'porter': 'porter unicode61 remove_diacritics 1',
+    'trigram': 'trigram',
+}
+
+# Tokenizer of the existing FTS table, False if there is none, None if not checked yet
+_fts_tokenizer = None
+
+
+def get_tokenizer():
+    tokenizer = getattr(settings, 'PRODUCT_SEARCH', {}).get('TOKENIZER', 'unicode61')
+    if tokenizer not in TOKENIZE_OPTIONS:
+        raise ValueError(f"Unknown product search tokenizer: {tokenizer}")
+    return tokenizer
+
+
+def create_table_sql(tokenizer=None):
+    tokenize = TOKENIZE_OPTIONS[tokenizer or get_tokenizer()]
+    return (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+        f"USING fts5(name, description, tokenize='{tokenize}')"
+    )
+
+
+def current_tokenizer():
+    """Tokenizer of the existing FTS table, or None when search is not indexed"""
+    global _fts_tokenizer
+    if connection.vendor != 'sqlite':
+        return None
+    if _fts_tokenizer is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT sql FROM sqlite_master WHERE name = %s", [FTS_TABLE])
+            row = cursor.fetchone()
+        if row is None:
+            _fts_tokenizer = False
+        else:
+            _fts_tokenizer = next(
+                (name for name in ('trigram', 'porter') if name in row[0]), 'unicode61'
+            )
+    return _fts_tokenizer or None
+
+
+def fts_available():
+    """True when the database is SQLite and the FTS5 table exists"""
+    return current_tokenizer() is not None
+
+
+def reset_fts_state():
+    """Forget the cached table check (after migrations or a rebuild)"""
+    global _fts_tokenizer
+    _fts_tokenizer = None
+
+
+def build_match_query(query, tokenizer='unicode61'):
+    """
+    Turn user input into an FTS5 MATCH expression.
+    Every word must match; the last word is matched as a prefix so results
+    show up while the user is still typing. Returns None if nothing usable is left.
+    """
+    words = re.findall(r'\w+', query)
+    if not words:
+        return None
+
+    if tokenizer == 'trigram':
+        # trigram matches substrings of 3+ characters, no prefix operator needed
+        if any(len(word) < 3 for word in words):
+            return None
+        return ' AND '.join(f'"{word}"' for word in words)
+
+    terms = [f'"{word}"' for word in words[:-1]]
+    terms.append(f'"{words[-1]}"*')
+    return ' AND '.join(terms)
+
+
+def search_products(queryset, query):
+    """Filter a Product queryset down to the rows matching `query`"""
+    match = build_match_query(query, current_tokenizer()) if fts_available() else None
+    if match is None:
+        return queryset.filter(Q(name__icontains=query) | Q(description__icontains=query))
+
+    return queryset.filter(
+        id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+    )
+
+
+def ranked_search(query, limit=20):
+    """
+    Return [(product_id, score)] for the best matches, best first.
+    Uses FTS5 bm25(); name matches weigh more than description matches.
+    """
+    match = build_match_query(query, current_tokenizer()) if fts_available() else None
+    if match is None:
+        return []
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, bm25({FTS_TABLE}, 10.0, 1.0) AS score FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s ORDER BY score LIMIT %s",
+            [match, limit],
+        )
+        return cursor.fetchall()
+
+
+def _to_html(text):
+    return mark_safe(escape(text).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+
+def attach_snippets(products, query):
+    """
+    Set `search_name` (highlighted name) and `search_snippet` (highlighted
+    excerpt of the description) on each product. Only the given products
+    are looked up, so call it with one page of results.
+    """
+    match = build_match_query(query, current_tokenizer()) if fts_available() else None
+    products = list(products)
+    if match is None or not products:
+        return products
+
+    ids = [p.id for p in products]
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, highlight({FTS_TABLE}, 0, %s, %s), "
+            f"snippet({FTS_TABLE}, 1, %s, %s, '...', 16) "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid IN ({placeholders})",
+            [MARK_START, MARK_END, MARK_START, MARK_END, match, *ids],
+        )
+        highlights = {row[0]: row[1:] for row in cursor.fetchall()}
+
+    for product in products:
+        if product.id in highlights:
+            name, snippet = highlights[product.id]
+            product.search_name = _to_html(name)
+            product.search_snippet = _to_html(snippet)
+    return products
+
+
+# ---------- index maintenance ----------
+
+def index_product(product):
+    """Insert or refresh one product in the FTS table"""
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product.id])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)",
+            [product.id, product.name, product.description],
+        )
+
+
+def index_products(products):
+    """index_product() for a batch, e.g. after bulk_create()"""
+    if not fts_available() or not products:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [[p.id] for p in products])
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)",
+            [[p.id, p.name, p.description] for p in products],
+        )
+
+
+def unindex_product(product_id):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product_id])
+
+
+def rebuild_index(batch_size=5000, tokenizer=None):
+    """
+    Drop and refill the FTS table from app_product.
+    Passing a tokenizer recreates the table with that tokenizer.
+    Returns the number of products indexed.
+    """
+    from .models import Product
+
+    if connection.vendor != 'sqlite':
+        raise RuntimeError("Product full-text search needs SQLite with FTS5")
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if tokenizer:
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        cursor.execute(create_table_sql(tokenizer))
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+
+        total = 0
+        last_id = 0
+        while True:
+            rows = list(
+                Product.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', 'name', 'description')[:batch_size]
+            )
+            if not rows:
+                break
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)", rows
+            )
+            total += len(rows)
+            last_id = rows[-1][0]
+
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+
+    reset_fts_state()
+    logger.info(f"Product search index rebuilt: {total} products")
+    return total
@@ -0,0 +1,140 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, When, F, Value, IntegerField, Count, Sum
+
+from .models import Product, Order, OrderItem
+
+
+class OrderError(Exception):
+    """Order could not be placed (unknown product, not enough stock, ...)"""
+
+
+# ==================== ORDER PLACEMENT ====================
+
+def place_order(user, cart):
+    """
+    Turn a session cart ({product_id: {'qty': n, ...}}) into an Order.
+    - Runs in one transaction: either the whole order is written or nothing is
+    - Query count does not depend on cart size:
+        1 SELECT for all products (in_bulk)
+        1 UPDATE decrementing stock for every line at once
+        1 INSERT for the order, 1 INSERT for all order items (bulk_create)
+    - Prices come from the database, not from the prices stored in the cart
+    """
+    quantities = {}
+    for item_id, item_data in cart.items():
+        qty = int(item_data['qty'])
+        if qty < 1:
+            raise OrderError('Quantities must be at least 1')
+        quantities[int(item_id)] = qty
+
+    if not quantities:
+        raise OrderError('Cart is empty')
+
+    with transaction.atomic():
+        products = Product.objects.in_bulk(list(quantities))
+        missing = set(quantities) - set(products)
+        if missing:
+            raise OrderError('Some products in your cart no longer exist')
+
+        # Decrement all stock in one statement; a line only matches when there
+        # is enough stock left, so a short row count means something sold out
+        needed = Case(
+            *[When(id=product_id, then=Value(qty)) for product_id, qty in quantities.items()],
+            output_field=IntegerField(),
+        )
+        updated = (
+            Product.objects
+            .filter(id__in=list(quantities), stock__gte=needed)
+            .update(stock=F('stock') - needed)
+        )
+        if updated != len(quantities):
+            # The failed UPDATE is rolled back with the transaction; name the
+            # lines that were already short when the products were loaded
+            short = [
+                products[product_id].name
+                for product_id, qty in quantities.items()
+                if products[product_id].stock < qty
+            ]
+            raise OrderError(f"Not enough stock for: {', '.join(short) or 'some products'}")
+
+        total_amount = sum(products[product_id].price * qty for product_id, qty in quantities.items())
+        order = Order.objects.create(user=user, total_amount=total_amount)
+
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=products[product_id],
+                quantity=qty,
+                price_at_purchase=products[product_id].price,
+            )
+            for product_id, qty in quantities.items()
+        ])
+
+    return order
+
+
+# ==================== DASHBOARD STATS ====================
+
+# Bump when the cached structure changes so old entries are ignored
+DASHBOARD_STATS_VERSION = 1
+DASHBOARD_STATS_TIMEOUT = 24 * 60 * 60
+RECENT_ORDERS = 5
+
+
+def dashboard_stats_key(user_id):
+    return f'dashboard_stats:{user_id}'
+
+
+def order_summary(order):
+    """Small dict kept in the cache instead of a full Order instance"""
+    return {
+        'id': order.id,
+        'status': order.status,
+        'total_amount': str(order.total_amount),
+        'created_at': order.created_at,
+    }
+
+
+def compute_dashboard_stats(user_id):
+    """Build the stats from the database: one aggregate plus the recent orders"""
+    orders = Order.objects.filter(user_id=user_id)
+    totals = orders.aggregate(total_orders=Count('id'), total_spent=Sum('total_amount'))
+    recent = orders.order_by('-created_at', '-id').only('id', 'status', 'total_amount', 'created_at')[:RECENT_ORDERS]
+    return {
+        'total_orders': totals['total_orders'],
+        'total_spent': str(totals['total_spent'] or Decimal('0')),
+        'recent_orders': [order_summary(order) for order in recent],
+    }
+
+
+def get_dashboard_stats(user_id):
+    """
+    Order count, lifetime spend and last five orders for the dashboard.
+    Served from the cache; rebuilt from the database on a miss.
+    """
+    key = dashboard_stats_key(user_id)
+    stats = cache.get(key, version=DASHBOARD_STATS_VERSION)
+    if stats is None:
+        stats = compute_dashboard_stats(user_id)
+        cache.set(key, stats, DASHBOARD_STATS_TIMEOUT, version=DASHBOARD_STATS_VERSION)
+    return stats
+
+
+def record_new_order(order):
+    """Fold a newly created order into the cached stats (if they are cached)"""
+    key = dashboard_stats_key(order.user_id)
+    stats = cache.get(key, version=DASHBOARD_STATS_VERSION)
+    if stats is None or any(o['id'] == order.id for o in stats['recent_orders']):
+        # Not cached, or the stats were rebuilt after this order was committed
+        return
+    stats['total_orders'] += 1
+    stats['total_spent'] = str(Decimal(stats['total_spent']) + Decimal(order.total_amount))
+    stats['recent_orders'] = [order_summary(order)] + stats['recent_orders'][:RECENT_ORDERS - 1]
+    cache.set(key, stats, DASHBOARD_STATS_TIMEOUT, version=DASHBOARD_STATS_VERSION)
+
+
+def invalidate_dashboard_stats(user_id):
+    cache.delete(dashboard_stats_key(user_id), version=DASHBOARD_STATS_VERSION)
@@ -0,0 +1,69 @@
+from datetime import datetime
+
+from django.contrib.sessions.backends.db import SessionStore as DBSessionStore
+
+# Session engine for this project (settings.SESSION_ENGINE = 'app.sessions')
+# - Same database storage as django.contrib.sessions.backends.db
+# - Counts how often the session row is loaded and saved during a request
+#   (reported by SessionHandlingMiddleware)
+# - Supports lazy defaults: a default is only computed and stored the first
+#   time somebody reads the key, so requests that never look at it don't
+#   load or write the session
+
+
+def default_login_time(session):
+    return session.get('login_time') or datetime.now().isoformat()
+
+
+class SessionStore(DBSessionStore):
+    lazy_defaults = {
+        'user_login_time': default_login_time,
+    }
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self.load_count = 0
+        self.save_count = 0
+
+    # ---------- counters ----------
+
+    def load(self):
+        self.load_count += 1
+        return super().load()
+
+    async def aload(self):
+        self.load_count += 1
+        return await super().aload()
+
+    def save(self, must_create=False):
+        self.save_count += 1
+        return super().save(must_create)
+
+    async def asave(self, must_create=False):
+        self.save_count += 1
+        return await super().asave(must_create)
+
+    # ---------- lazy defaults ----------
+
+    def _materialise(self, key):
+        value = self.lazy_defaults[key](self)
+        self[key] = value
+        return value
+
+    def __getitem__(self, key):
+        try:
+            return super().__getitem__(key)
+        except KeyError:
+            if key not in self.lazy_defaults:
+                raise
+            return self._materialise(key)
+
+    def get(self, key, default=None):
+        if key in self.lazy_defaults and key not in self._session:
+            return self._materialise(key)
+        return super().get(key, default)
+
+    async def aget(self, key, default=None):
+        # Load asynchronously; get() then only touches the in-memory cache
+        await self._aget_session()
+        return self.get(key, default)
@@ -0,0 +1,93 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from .models import Category, Product, Order, UserProfile
+from . import cart, counters, pagecache, roles, search, services
+
+
+# ==================== PRODUCT SEARCH INDEX ====================
+
+@receiver(post_save, sender=Product)
+def index_product_on_save(sender, instance, update_fields=None, **kwargs):
+    """Keep the full-text index in step with the product's name/description"""
+    if update_fields is not None and not {'name', 'description'} & set(update_fields):
+        return
+    search.index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product_on_delete(sender, instance, **kwargs):
+    search.unindex_product(instance.id)
+
+
+# ==================== DASHBOARD STATS CACHE ====================
+
+@receiver(post_save, sender=Order)
+def update_dashboard_stats_on_save(sender, instance, created, **kwargs):
+    """New orders are added to the cached stats; any other change drops them"""
+    if created:
+        transaction.on_commit(partial(services.record_new_order, instance))
+    else:
+        transaction.on_commit(partial(services.invalidate_dashboard_stats, instance.user_id))
+
+
+@receiver(post_delete, sender=Order)
+def update_dashboard_stats_on_delete(sender, instance, **kwargs):
+    transaction.on_commit(partial(services.invalidate_dashboard_stats, instance.user_id))
+
+
+# ==================== CATEGORY PRODUCT COUNTS ====================
+
+@receiver(pre_save, sender=Product)
+def look_up_counted_row(sender, instance, update_fields=None, **kwargs):
+    counters.product_saving(instance, update_fields)
+
+
+@receiver(post_save, sender=Product)
+def count_product_on_save(sender, instance, created, update_fields=None, **kwargs):
+    """Runs inside Product.save()'s transaction"""
+    counters.product_saved(instance, created, update_fields)
+
+
+@receiver(pre_delete, sender=Product)
+def look_up_counted_row_on_delete(sender, instance, **kwargs):
+    """Runs inside the deletion's transaction, before the DELETE"""
+    counters.product_deleting(instance)
+
+
+@receiver(post_delete, sender=Product)
+def count_product_on_delete(sender, instance, **kwargs):
+    counters.product_deleted(instance)
+
+
+# ==================== CATALOGUE PAGE CACHE ====================
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_pages(sender, instance, **kwargs):
+    pagecache.products_changed(instance.id)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_pages(sender, instance, **kwargs):
+    pagecache.categories_changed()
+
+
+# ==================== USER ROLE CACHE ====================
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_cached_role(sender, instance, **kwargs):
+    transaction.on_commit(partial(roles.invalidate_role, instance.user_id))
+
+
+# ==================== CART SUMMARIES ====================
+
+@receiver(pre_delete, sender=Product)
+def remove_product_from_cart_summaries(sender, instance, **kwargs):
+    # pre_delete: the cascaded cart lines are gone by post_delete
+    cart.product_deleted(instance.id)
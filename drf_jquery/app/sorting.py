@@ -0,0 +1,59 @@
+from django.core.exceptions import ImproperlyConfigured
+
+from .models import Product
+
+
+class UnknownSort(ValueError):
+    """Raised when a client asks for a sort key that is not registered"""
+
+
+class SortOption:
+    def __init__(self, key, label, ordering, index):
+        self.key = key
+        self.label = label
+        self.ordering = list(ordering)
+        self.index = index
+
+
+class SortRegistry:
+    """
+    Whitelist of sort keys for a model.
+    - Each key maps to a full ordering (ending in `id` so keyset pagination works)
+    - Each key must name the Meta.indexes entry that serves it, so a sort can
+      only be added together with its index
+    """
+
+    def __init__(self, model, default):
+        self.model = model
+        self.default = default
+        self.options = {}
+
+    def register(self, key, label, ordering, index):
+        index_names = {i.name for i in self.model._meta.indexes}
+        if index not in index_names:
+            raise ImproperlyConfigured(
+                f"Sort '{key}' on {self.model.__name__} needs index '{index}' in Meta.indexes"
+            )
+        self.options[key] = SortOption(key, label, ordering, index)
+
+    def get(self, key=None):
+        """Return the SortOption for `key` (the default when empty)"""
+        key = key or self.default
+        try:
+            return self.options[key]
+        except KeyError:
+            raise UnknownSort(f"Unknown sort option: {key}")
+
+    def choices(self):
+        return [(option.key, option.label) for option in self.options.values()]
+
+
+# ==================== PRODUCT SORTS ====================
+
+PRODUCT_SORTS = SortRegistry(Product, default='-created_at')
+PRODUCT_SORTS.register('-created_at', 'Newest First', ['-created_at', '-id'], index='product_created_idx')
+PRODUCT_SORTS.register('created_at', 'Oldest First', ['created_at', 'id'], index='product_created_idx')
+PRODUCT_SORTS.register('price', 'Price (Low to High)', ['price', 'id'], index='product_price_idx')
+PRODUCT_SORTS.register('-price', 'Price (High to Low)', ['-price', '-id'], index='product_price_idx')
+PRODUCT_SORTS.register('name', 'Name (A-Z)', ['name', 'id'], index='product_name_idx')
+PRODUCT_SORTS.register('-name', 'Name (Z-A)', ['-name', '-id'], index='product_name_idx')
@@ -0,0 +1,18 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from app.pagecache import render_product_cards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def product_cards(context, products):
+    """
+    Cached product card fragments (app/pagecache.py)
+
+        {% load catalog %}
+        {% product_cards products as cards %}
+        {% for card in cards %}{{ card }}{% endfor %}
+    """
+    return [mark_safe(card) for card in render_product_cards(products, context['request'])]
@@ -1,3 +1,1082 @@
-from django.test import TestCase
+import io
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from perftools.profiling import QueryProfile, fingerprint, query_budget
+
+from . import catalog_io, counters, pagecache
+from .cart import Cart, DatabaseCartStore, CacheCartStore
+from .logsinks import BufferedFileLogSink, get_log_sink
+from .middlewares import UserActivityLoggingMiddleware
+from .models import CartItem, CartSummary, Category, Product, Order, UserProfile
+from .roles import get_role, role_required
+from .search import ranked_search, rebuild_index
+from .pagination import InvalidCursor, KeysetPaginator
+from .request_id import generate_request_id, request_id_var
+from .services import place_order, OrderError, get_dashboard_stats
+from .sorting import PRODUCT_SORTS, UnknownSort
+from .tests_performance import TEST_TEMPLATES
+
+# Keep test requests out of the real request_log.txt
+NO_REQUEST_LOG = {'SINK': 'app.logsinks.FileLogSink', 'PATH': os.devnull}
+
+
+class ProductSortIndexTests(TestCase):
+    """Every whitelisted product sort must be served by an index, not a temp B-tree sort"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Books')
+        Product.objects.bulk_create([
+            Product(name=f'Product {i}', description='', price=Decimal(i), category=cls.category)
+            for i in range(50)
+        ])
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertNotIn('TEMP B-TREE', plan, plan)
+        self.assertIn(index, plan, plan)
+
+    def test_every_sort_uses_its_index(self):
+        for key, option in PRODUCT_SORTS.options.items():
+            with self.subTest(sort=key):
+                self.assertUsesIndex(Product.objects.order_by(*option.ordering)[:21], option.index)
+
+    def test_next_page_query_uses_index(self):
+        for key, option in PRODUCT_SORTS.options.items():
+            with self.subTest(sort=key):
+                paginator = KeysetPaginator(Product.objects.all(), option.ordering)
+                last = Product.objects.order_by(*option.ordering)[10]
+                values = [getattr(last, f.lstrip('-')) for f in paginator.ordering]
+                queryset = Product.objects.filter(paginator._seek_filter(values, forward=True))
+                self.assertUsesIndex(queryset.order_by(*option.ordering)[:21], option.index)
+
+    def test_category_and_status_filter_with_default_sort(self):
+        option = PRODUCT_SORTS.get()
+        queryset = Product.objects.filter(category=self.category, status='in_stock').order_by(*option.ordering)
+        self.assertUsesIndex(queryset[:21], 'product_cat_status_new_idx')
+
+    def test_unknown_sort_is_rejected(self):
+        with self.assertRaises(UnknownSort):
+            PRODUCT_SORTS.get('description')
+
+    @override_settings(REQUEST_LOG=NO_REQUEST_LOG)
+    def test_unknown_sort_is_not_reflected(self):
+        self.client.force_login(User.objects.create_user('browser', password='pw'))
+        response = self.client.get('/products/', {'sort': '<script>alert(1)</script>'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response['Content-Type'], 'text/plain')
+        self.assertNotIn(b'<script>', response.content)
+        self.assertEqual(
+            response.content.decode(),
+            'Unknown sort option. Allowed: ' + ', '.join(PRODUCT_SORTS.options),
+        )
+
+
+class KeysetPaginatorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Books')
+        # Three prices for eleven products: most pages start and end inside a tie
+        Product.objects.bulk_create([
+            Product(name=f'Product {i}', description='', price=Decimal(i % 3), category=category)
+            for i in range(11)
+        ])
+
+    def walk(self, paginator):
+        """Follow next cursors to the end, then previous cursors back; pages as id lists"""
+        forward = [paginator.get_page()]
+        while forward[-1].has_next:
+            forward.append(paginator.get_page(forward[-1].next_cursor))
+        backward = [forward[-1]]
+        while backward[-1].has_previous:
+            backward.append(paginator.get_page(backward[-1].previous_cursor))
+        ids = lambda pages: [[product.id for product in page] for page in pages]
+        return ids(forward), ids(backward[::-1])
+
+    def test_cursors_round_trip_in_both_directions(self):
+        for key, option in PRODUCT_SORTS.options.items():
+            with self.subTest(sort=key):
+                expected = list(Product.objects.order_by(*option.ordering).values_list('id', flat=True))
+                forward, backward = self.walk(KeysetPaginator(Product.objects.all(), option.ordering, page_size=4))
+                self.assertEqual([len(page) for page in forward], [4, 4, 3])
+                self.assertEqual(sum(forward, []), expected)
+                self.assertEqual(backward, forward)
+
+    def test_ties_are_broken_by_id(self):
+        paginator = KeysetPaginator(Product.objects.all(), 'price', page_size=2)
+        self.assertEqual(paginator.ordering, ['price', 'id'])
+        forward, _ = self.walk(paginator)
+        ids = sum(forward, [])
+        # Every product exactly once, equal prices in id order
+        self.assertEqual(ids, list(Product.objects.order_by('price', 'id').values_list('id', flat=True)))
+        self.assertEqual(len(set(ids)), 11)
+
+    def test_descending_ties_are_broken_by_descending_id(self):
+        paginator = KeysetPaginator(Product.objects.all(), '-price', page_size=2)
+        self.assertEqual(paginator.ordering, ['-price', '-id'])
+        forward, _ = self.walk(paginator)
+        self.assertEqual(sum(forward, []), list(Product.objects.order_by('-price', '-id').values_list('id', flat=True)))
+
+    def test_tampered_cursor_is_rejected(self):
+        paginator = KeysetPaginator(Product.objects.all(), ['price', 'id'], page_size=4)
+        cursor = paginator.get_page().next_cursor
+        tampered = cursor[:-1] + ('A' if cursor[-1] != 'A' else 'B')
+        for bad in (tampered, 'not-a-cursor', cursor.replace(':', '', 1)):
+            with self.subTest(cursor=bad), self.assertRaises(InvalidCursor):
+                paginator.get_page(bad)
+
+    def test_cursor_from_another_ordering_is_rejected(self):
+        cursor = KeysetPaginator(Product.objects.all(), ['price', 'id'], page_size=4).get_page().next_cursor
+        with self.assertRaises(InvalidCursor):
+            KeysetPaginator(Product.objects.all(), ['name', 'id'], page_size=4).get_page(cursor)
+
+
+class PlaceOrderTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', password='secret')
+        category = Category.objects.create(name='Books')
+        cls.products = Product.objects.bulk_create([
+            Product(name=f'Product {i}', description='', price=Decimal('2.50'), stock=10, category=category)
+            for i in range(60)
+        ])
+
+    def cart_for(self, products, qty=2):
+        # Cart prices are deliberately wrong: the order must use database prices
+        return {str(p.id): {'name': p.name, 'price': '0.01', 'qty': qty} for p in products}
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        for size in (1, 10, 60):
+            with self.subTest(cart_size=size):
+                # savepoint + SELECT + UPDATE + INSERT order + INSERT items + release
+                with self.assertNumQueries(6):
+                    place_order(self.user, self.cart_for(self.products[:size], qty=1))
+
+    def test_totals_use_database_prices_and_stock_is_decremented(self):
+        order = place_order(self.user, self.cart_for(self.products[:3]))
+        self.assertEqual(order.total_amount, Decimal('15.00'))
+        self.assertEqual(order.items.count(), 3)
+        self.assertEqual(Product.objects.get(id=self.products[0].id).stock, 8)
+
+    def test_insufficient_stock_rolls_back_everything(self):
+        cart = self.cart_for(self.products[:3])
+        cart[str(self.products[2].id)]['qty'] = 11
+        with self.assertRaisesMessage(OrderError, 'Product 2'):
+            place_order(self.user, cart)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Product.objects.get(id=self.products[0].id).stock, 10)
+
+
+class DashboardStatsCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', password='secret')
+        Order.objects.create(user=cls.user, total_amount=Decimal('10.00'))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_stats_need_no_queries(self):
+        get_dashboard_stats(self.user.id)
+        with self.assertNumQueries(0):
+            stats = get_dashboard_stats(self.user.id)
+        self.assertEqual(stats['total_orders'], 1)
+
+    def test_new_order_updates_cached_stats(self):
+        get_dashboard_stats(self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(user=self.user, total_amount=Decimal('5.50'))
+        with self.assertNumQueries(0):
+            stats = get_dashboard_stats(self.user.id)
+        self.assertEqual(stats['total_orders'], 2)
+        self.assertEqual(stats['total_spent'], '15.50')
+        self.assertEqual(stats['recent_orders'][0]['id'], order.id)
+
+    def test_deleting_an_order_invalidates_stats(self):
+        get_dashboard_stats(self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.filter(user=self.user).delete()
+        self.assertEqual(get_dashboard_stats(self.user.id)['total_orders'], 0)
+
+
+class CartStoreTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', password='secret')
+        category = Category.objects.create(name='Books')
+        cls.book = Product.objects.create(name='Book', description='', price=Decimal('4.25'), category=category)
+        cls.pen = Product.objects.create(name='Pen', description='', price=Decimal('1.10'), category=category)
+
+    def setUp(self):
+        cache.clear()
+        caches['carts'].clear()
+
+    def check_store(self, store):
+        cart = Cart(self.user, store=store)
+        with self.captureOnCommitCallbacks(execute=True):
+            cart.add(self.book, 2)
+            cart.add(self.pen, 1)
+            line = cart.add(self.book, 1)
+        self.assertEqual(line, {'name': 'Book', 'price': '4.25', 'qty': 3, 'image_url': ''})
+        self.assertEqual(cart.totals(), {'total': '13.85', 'cart_count': 2, 'item_quantity': 4})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            removed = cart.remove(self.pen.id)
+            self.assertEqual(removed['name'], 'Pen')
+            self.assertIsNone(cart.remove(self.pen.id))
+        self.assertEqual(list(cart.lines()), [str(self.book.id)])
+        self.assertEqual(cart.subtotal, Decimal('12.75'))
+        self.assertEqual(cart.count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cart.clear()
+        self.assertEqual(cart.lines(), {})
+        self.assertEqual(cart.totals(), {'total': '0.00', 'cart_count': 0, 'item_quantity': 0})
+
+    def test_database_store(self):
+        self.check_store(DatabaseCartStore())
+
+    def test_cache_store(self):
+        self.check_store(CacheCartStore())
+
+    def test_cache_store_concurrent_adds_are_all_counted(self):
+        class SlowReads:
+            """The carts cache, with a thread switch between each read and the write after it"""
+            def __getattr__(self, name):
+                return getattr(caches['carts'], name)
+
+            def get(self, *args, **kwargs):
+                time.sleep(0.0001)
+                return caches['carts'].get(*args, **kwargs)
+
+        class SlowCacheCartStore(CacheCartStore):
+            cache = SlowReads()
+
+        store = SlowCacheCartStore()
+
+        def add(_):
+            for _ in range(20):
+                store.add(self.user.id, self.book, 1)
+                store.add(self.user.id, self.pen, 2)
+
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(add, range(8)))
+        lines = store.items(self.user.id)
+        self.assertEqual([line['qty'] for line in lines.values()], [160, 320])
+        self.assertEqual(store.summary(self.user.id), {'subtotal_cents': 160 * 425 + 320 * 110, 'lines': 2, 'quantity': 480})
+
+    def test_cache_store_rebuilds_lost_totals_from_the_lines(self):
+        store = CacheCartStore()
+        store.add(self.user.id, self.book, 2)
+        store.add(self.user.id, self.pen, 1)
+        store.remove(self.user.id, self.book.id)
+        caches['carts'].delete(f'cart:{self.user.id}:summary')
+        store.add(self.user.id, self.pen, 1)
+        self.assertEqual(store.summary(self.user.id), {'subtotal_cents': 220, 'lines': 1, 'quantity': 2})
+        self.assertEqual(list(store.items(self.user.id)), [self.pen.id])
+
+    def test_database_store_summary_survives_cache_loss(self):
+        Cart(self.user, store=DatabaseCartStore()).add(self.book, 2)
+        cache.clear()
+        cart = Cart(self.user, store=DatabaseCartStore())
+        self.assertEqual(cart.summary, {'subtotal_cents': 850, 'lines': 1, 'quantity': 2})
+
+    def test_totals_need_no_queries_once_cached(self):
+        cart = Cart(self.user, store=DatabaseCartStore())
+        cart.add(self.book, 2)
+        cart.summary
+        with self.assertNumQueries(0):
+            self.assertEqual(Cart(self.user, store=DatabaseCartStore()).totals()['total'], '8.50')
+
+    def test_database_store_summary_is_not_recomputed(self):
+        store = DatabaseCartStore()
+        cart = Cart(self.user, store=store)
+        with self.captureOnCommitCallbacks(execute=True):
+            for product in (self.book, self.pen, self.book):
+                cart.add(product, 2)
+        self.assertEqual(
+            CartSummary.objects.filter(user=self.user).values('subtotal_cents', 'lines', 'quantity').get(),
+            {'subtotal_cents': 1920, 'lines': 2, 'quantity': 6},
+        )
+        # A cache miss reads the summary row, not the lines
+        with self.assertNumQueries(1) as queries:
+            self.assertEqual(store.summary(self.user.id)['subtotal_cents'], 1920)
+        self.assertNotIn('app_cartitem', queries.captured_queries[0]['sql'])
+
+    def test_first_write_starts_the_summary_from_existing_lines(self):
+        CartItem.objects.create(user=self.user, product=self.pen, quantity=3, unit_price_cents=110)
+        store = DatabaseCartStore()
+        with self.captureOnCommitCallbacks(execute=True):
+            Cart(self.user, store=store).add(self.book, 1)
+        self.assertEqual(store.summary(self.user.id), {'subtotal_cents': 755, 'lines': 2, 'quantity': 4})
+
+    def test_database_store_summary_is_kept_until_commit(self):
+        store = DatabaseCartStore()
+        Cart(self.user, store=store).summary
+        with self.captureOnCommitCallbacks() as callbacks:
+            Cart(self.user, store=store).add(self.book, 2)
+        # Not dropped before the commit, where a reader could re-cache the old state
+        self.assertEqual(store.summary(self.user.id)['lines'], 0)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(store.summary(self.user.id)['lines'], 1)
+
+    def test_database_store_remove_of_a_removed_line(self):
+        store = DatabaseCartStore()
+        cart = Cart(self.user, store=store)
+        with self.captureOnCommitCallbacks(execute=True):
+            cart.add(self.book, 2)
+            Cart(self.user, store=DatabaseCartStore()).remove(self.book.id)
+            # Removed elsewhere meanwhile: nothing to report, nothing subtracted twice
+            self.assertIsNone(cart.remove(self.book.id))
+        self.assertEqual(Cart(self.user, store=store).summary, {'subtotal_cents': 0, 'lines': 0, 'quantity': 0})
+
+    def test_deleting_a_product_drops_it_from_cached_totals(self):
+        store = DatabaseCartStore()
+        with self.captureOnCommitCallbacks(execute=True):
+            Cart(self.user, store=store).add(self.book, 2)
+            Cart(self.user, store=store).add(self.pen, 1)
+        self.assertEqual(store.summary(self.user.id)['lines'], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pen.delete()
+        self.assertEqual(store.summary(self.user.id), {'subtotal_cents': 850, 'lines': 1, 'quantity': 2})
+
+
+@override_settings(DEBUG=True, REQUEST_LOG=NO_REQUEST_LOG)
+class LazySessionTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', password='secret')
+        self.client.force_login(self.user)
+
+    def test_requests_that_skip_the_session_do_not_load_it(self):
+        response = self.client.get('/static/missing.css')
+        self.assertEqual(response['X-Session-Loads'], '0')
+        self.assertEqual(response['X-Session-Saves'], '0')
+
+    def test_reading_the_session_does_not_write_it(self):
+        response = self.client.get('/api/cart/')
+        self.assertEqual(response['X-Session-Loads'], '1')
+        self.assertEqual(response['X-Session-Saves'], '0')
+
+    def test_default_is_stored_on_first_read(self):
+        session = self.client.session
+        self.assertNotIn('user_login_time', session.keys())
+        self.assertTrue(session.get('user_login_time'))
+        self.assertTrue(session.modified)
+
+
+class LogSinkTests(TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.log')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+
+    def sink(self, **options):
+        # Nothing is written until batch_size lines wait or flush() is called
+        options = {'batch_size': 100, 'flush_interval': 60, **options}
+        sink = BufferedFileLogSink(self.path, **options)
+        self.addCleanup(sink.close)
+        return sink
+
+    def lines(self):
+        with open(self.path, encoding='utf-8') as f:
+            return f.read().splitlines()
+
+    def test_lines_are_written_in_batches(self):
+        sink = self.sink(batch_size=3)
+        for i in range(7):
+            sink.write(f'{i}\n')
+        sink.flush()
+        self.assertEqual(self.lines(), [str(i) for i in range(7)])
+        stats = sink.stats()
+        self.assertEqual((stats['written'], stats['buffered'], stats['dropped']), (7, 0, 0))
+        # Two full batches and the flushed remainder
+        self.assertEqual(stats['batches'], 3)
+
+    def test_drop_oldest_keeps_the_newest_lines(self):
+        sink = self.sink(capacity=2)
+        results = [sink.write(f'{i}\n') for i in range(5)]
+        self.assertEqual(results, [True] * 5)
+        sink.flush()
+        self.assertEqual(self.lines(), ['3', '4'])
+        self.assertEqual(sink.stats()['dropped'], 3)
+
+    def test_drop_newest_rejects_incoming_lines(self):
+        sink = self.sink(capacity=2, overflow='drop_newest')
+        results = [sink.write(f'{i}\n') for i in range(5)]
+        self.assertEqual(results, [True, True, False, False, False])
+        sink.flush()
+        self.assertEqual(self.lines(), ['0', '1'])
+        self.assertEqual(sink.stats()['dropped'], 3)
+
+    def test_close_writes_what_is_buffered(self):
+        sink = self.sink()
+        sink.write('last\n')
+        sink.close()
+        self.assertEqual(self.lines(), ['last'])
+        self.assertFalse(sink.writer.is_alive())
+        self.assertFalse(sink.write('too late\n'))
+        self.assertEqual(sink.stats()['dropped'], 1)
+
+    def test_failed_writes_are_counted_as_dropped(self):
+        sink = BufferedFileLogSink(os.path.dirname(self.path), batch_size=100, flush_interval=60)
+        self.addCleanup(sink.close)
+        with self.assertLogs('app.logsinks', 'ERROR'):
+            sink.write('lost\n')
+            sink.flush()
+        self.assertEqual(sink.stats()['dropped'], 1)
+
+    def test_middleware_instances_share_one_sink_per_path(self):
+        config = {'SINK': 'app.logsinks.BufferedFileLogSink', 'PATH': self.path}
+        with override_settings(REQUEST_LOG=config):
+            first = UserActivityLoggingMiddleware(lambda request: HttpResponse())
+            second = UserActivityLoggingMiddleware(lambda request: HttpResponse())
+        self.addCleanup(first.sink.close)
+        self.assertIs(first.sink, second.sink)
+        # A different configuration for the path replaces the sink
+        replaced = get_log_sink({**config, 'OPTIONS': {'batch_size': 10}})
+        self.addCleanup(replaced.close)
+        self.assertIsNot(replaced, first.sink)
+        self.assertTrue(first.sink.closed)
+
+
+@override_settings(REQUEST_LOG=NO_REQUEST_LOG)
+class RequestIDTests(TestCase):
+
+    def test_ids_are_unique_and_sortable(self):
+        ids = [generate_request_id() for _ in range(1000)]
+        self.assertEqual(len(set(ids)), 1000)
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(ids[0]), 26)
+
+    def test_incoming_id_is_propagated(self):
+        response = self.client.get('/login/', HTTP_X_REQUEST_ID='upstream-1234')
+        self.assertEqual(response['X-Request-ID'], 'upstream-1234')
+
+    def test_malformed_incoming_id_is_replaced(self):
+        response = self.client.get('/login/', HTTP_X_REQUEST_ID='bad id\n')
+        self.assertEqual(len(response['X-Request-ID']), 26)
+
+    def test_query_log_carries_the_request_id(self):
+        db_logger = logging.getLogger('django.db.backends')
+        handler = db_logger.handlers[0]
+        stream = io.StringIO()
+        old_stream, old_level = handler.setStream(stream), handler.level
+        handler.setLevel(logging.DEBUG)
+        db_logger.setLevel(logging.DEBUG)
+        token = request_id_var.set('query-log-test')
+        try:
+            connection.force_debug_cursor = True
+            Product.objects.count()
+        finally:
+            connection.force_debug_cursor = False
+            request_id_var.reset(token)
+            db_logger.setLevel(logging.INFO)
+            handler.setLevel(old_level)
+            handler.setStream(old_stream)
+        self.assertIn('[query-log-test] django.db.backends:', stream.getvalue())
+
+
+@override_settings(REQUEST_LOG=NO_REQUEST_LOG)
+class QueryProfilingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', password='pw')
+        category = Category.objects.create(name='Books')
+        cls.products = [
+            Product.objects.create(name=f'Book {i}', description='', price=Decimal('5.00'),
+                                   category=category, stock=10)
+            for i in range(6)
+        ]
+
+    def test_fingerprint_ignores_values(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x'"),
+            fingerprint("SELECT * FROM t WHERE id IN (%s) AND name = 'y'"),
+        )
+
+    def test_detects_n_plus_one_and_duplicates(self):
+        profile = QueryProfile(n_plus_one_threshold=5)
+        with profile.capture():
+            for product in self.products:
+                Product.objects.get(id=product.id)
+            Product.objects.get(id=self.products[0].id)
+        self.assertEqual(profile.count, 7)
+        self.assertEqual(profile.n_plus_one()[0][1], 7)
+        self.assertEqual(len(profile.duplicates()), 1)
+
+    def test_query_budget(self):
+        with query_budget(1):
+            list(Product.objects.all())
+        with self.assertRaisesMessage(AssertionError, 'N+1 x6'):
+            with query_budget(3):
+                for product in self.products:
+                    Product.objects.get(id=product.id)
+
+    @override_settings(QUERY_PROFILING={'ENABLED': True})
+    def test_server_timing_header(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/api/cart/')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", app;dur=')
+
+    @override_settings(QUERY_PROFILING={'ENABLED': False})
+    def test_disabled_adds_nothing(self):
+        response = self.client.get('/login/')
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+@override_settings(DEBUG=True, REQUEST_LOG=NO_REQUEST_LOG)
+class AsgiEndpointTests(TestCase):
+    """The whole middleware chain runs in async mode under ASGI (AsyncClient)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', password='pw', email='buyer@example.com')
+        UserProfile.objects.create(user=cls.user, city='Pokhara')
+        category = Category.objects.create(name='Books')
+        book = Product.objects.create(name='Book', description='', price=Decimal('4.25'), category=category, stock=5)
+        Cart(cls.user, store=DatabaseCartStore()).add(book, 2)
+
+    async def test_cart_data(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get('/api/cart/', headers={'X-Request-ID': 'upstream-1234'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total'], '8.50')
+        self.assertEqual(response.json()['item_quantity'], 2)
+        self.assertEqual(response['X-Request-ID'], 'upstream-1234')
+        self.assertEqual(response['X-Session-Loads'], '1')
+
+    async def test_user_info(self):
+        await self.async_client.aforce_login(self.user)
+        data = (await self.async_client.get('/api/user/')).json()
+        self.assertEqual(data['email'], 'buyer@example.com')
+        self.assertEqual(data['profile']['city'], 'Pokhara')
+
+    async def test_activity_log_names_the_user(self):
+        await self.async_client.aforce_login(self.user)
+        with self.assertLogs('app.middlewares', 'INFO') as logs:
+            await self.async_client.get('/api/cart/')
+        self.assertIn('User: buyer | Method: GET | Path: /api/cart/', logs.output[-1])
+
+    @override_settings(QUERY_PROFILING={'ENABLED': True})
+    async def test_query_profiling(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get('/api/cart/')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="[1-9]\d* queries", app;dur=')
+
+
+class CategoryCounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = Category.objects.create(name='Books')
+        cls.games = Category.objects.create(name='Games')
+
+    def make(self, category, status='in_stock', **kwargs):
+        return Product.objects.create(name='P', description='', price=Decimal('1.00'),
+                                      category=category, status=status, **kwargs)
+
+    def counts(self, category):
+        category.refresh_from_db()
+        return [getattr(category, field) for field in Category.COUNTER_FIELDS]
+
+    def assertMatchesTable(self):
+        """The counters agree with a fresh count"""
+        self.assertEqual(counters.reconcile(), (Category.objects.count(), 0))
+
+    def test_save_and_delete(self):
+        product = self.make(self.books)
+        self.make(self.books, 'coming_soon')
+        self.assertEqual(self.counts(self.books), [2, 1, 0, 1])
+
+        product.status = 'out_of_stock'
+        product.save()
+        self.assertEqual(self.counts(self.books), [2, 0, 1, 1])
+
+        product = Product.objects.get(id=product.id)
+        product.category = self.games
+        product.save()
+        self.assertEqual(self.counts(self.books), [1, 0, 0, 1])
+        self.assertEqual(self.counts(self.games), [1, 0, 1, 0])
+
+        product.delete()
+        self.assertEqual(self.counts(self.games), [0, 0, 0, 0])
+        self.assertMatchesTable()
+
+    def test_unrelated_saves_do_not_touch_counters(self):
+        product = self.make(self.books)
+        product.stock = 3
+        with self.assertNumQueries(3):      # savepoint, UPDATE product, release
+            product.save(update_fields=['stock'])
+        self.assertMatchesTable()
+
+    def test_instance_without_loaded_state(self):
+        product = self.make(self.books)
+        Product(id=product.id, name='P', description='', price=Decimal('1.00'),
+                category=self.games, status='coming_soon').save(update_fields=['category', 'status'])
+        self.assertEqual(self.counts(self.books), [0, 0, 0, 0])
+        self.assertEqual(self.counts(self.games), [1, 0, 0, 1])
+        self.assertMatchesTable()
+
+    def test_stale_instances_saved_in_sequence(self):
+        product = self.make(self.books)
+        first = Product.objects.get(id=product.id)
+        second = Product.objects.get(id=product.id)
+
+        first.category = self.games
+        first.save()
+        # Loaded while the row was still in Books: the old values must come from the row
+        second.status = 'coming_soon'
+        second.save()
+        self.assertEqual(self.counts(self.books), [1, 0, 0, 1])
+        self.assertEqual(self.counts(self.games), [0, 0, 0, 0])
+        self.assertMatchesTable()
+
+    def test_stale_instances_deleted(self):
+        product = self.make(self.books)
+        stale, also_stale = Product.objects.get(id=product.id), Product.objects.get(id=product.id)
+        Product.objects.filter(id=product.id).update(category=self.games, status='out_of_stock')
+        stale.delete()
+        also_stale.delete()     # the row is already gone: nothing left to count
+        self.assertEqual(self.counts(self.books), [0, 0, 0, 0])
+        self.assertEqual(self.counts(self.games), [0, 0, 0, 0])
+        self.assertMatchesTable()
+
+    def test_bulk_operations(self):
+        Product.objects.bulk_create([
+            Product(name=f'P{i}', description='', price=Decimal('1.00'), category=self.books,
+                    status='out_of_stock' if i % 2 else 'in_stock')
+            for i in range(10)
+        ])
+        self.assertEqual(self.counts(self.books), [10, 5, 5, 0])
+
+        Product.objects.filter(status='out_of_stock').update(status='coming_soon')
+        self.assertEqual(self.counts(self.books), [10, 5, 0, 5])
+
+        Product.objects.filter(status='in_stock').update(category=self.games)
+        self.assertEqual(self.counts(self.games), [5, 5, 0, 0])
+
+        # bulk_update sets category_id to a Case() over the pks
+        moved = list(Product.objects.filter(category=self.games)[:2])
+        for product in moved:
+            product.category = self.books
+        Product.objects.bulk_update(moved, ['category'])
+        self.assertEqual(self.counts(self.games), [3, 3, 0, 0])
+        self.assertEqual(self.counts(self.books), [7, 2, 0, 5])
+
+        # F(): the new category is another column of the same row
+        music = Category.objects.create(name='Music')
+        Product.objects.filter(category=self.games).update(
+            category_id=F('category_id') + (music.id - self.games.id))
+        self.assertEqual(self.counts(self.games), [0, 0, 0, 0])
+        self.assertEqual(self.counts(music), [3, 3, 0, 0])
+        self.assertMatchesTable()
+
+        Product.objects.filter(category=self.books).delete()
+        self.assertEqual(self.counts(self.books), [0, 0, 0, 0])
+        self.assertMatchesTable()
+
+    def test_drifted_counter_does_not_go_below_zero(self):
+        product = self.make(self.books)
+        Category.objects.filter(id=self.books.id).update(product_count=0, in_stock_count=0)
+        product.category = self.games
+        product.save()
+        product.delete()
+        self.assertEqual(self.counts(self.books), [0, 0, 0, 0])
+        self.assertEqual(self.counts(self.games), [0, 0, 0, 0])
+
+    def test_upsert(self):
+        product = self.make(self.books)
+        Product.objects.bulk_create(
+            [
+                Product(id=product.id, name='P', description='', price=Decimal('2.00'), category=self.games),
+                Product(name='New', description='', price=Decimal('2.00'), category=self.games),
+            ],
+            update_conflicts=True, unique_fields=['id'], update_fields=['price', 'category'],
+        )
+        self.assertEqual(self.counts(self.books), [0, 0, 0, 0])
+        self.assertEqual(self.counts(self.games), [2, 2, 0, 0])
+
+    def test_saving_a_stale_category_keeps_counts(self):
+        stale = Category.objects.get(id=self.books.id)
+        self.make(self.books)
+        stale.description = 'Paper'
+        stale.save()
+        self.assertEqual(self.counts(self.books), [1, 1, 0, 0])
+
+    def test_reconcile_fixes_drift(self):
+        self.make(self.books)
+        Category.objects.filter(id=self.books.id).update(product_count=7, in_stock_count=0)
+        self.assertEqual(counters.reconcile(batch_size=1), (2, 1))
+        self.assertEqual(self.counts(self.books), [1, 1, 0, 0])
+
+    @override_settings(TEMPLATES=TEST_TEMPLATES, REQUEST_LOG=NO_REQUEST_LOG)
+    def test_categories_page_is_one_query(self):
+        for category in (self.books, self.games):
+            self.make(category)
+        self.client.force_login(User.objects.create_user('viewer', password='pw'))
+        cache.clear()
+        with self.assertNumQueries(4):      # session, user, role, categories: no join over products
+            response = self.client.get('/categories/')
+        categories = response.context['categories']
+        with self.assertNumQueries(0):
+            self.assertEqual([c.product_count for c in categories], [1, 1])
+
+
+@override_settings(TEMPLATES=TEST_TEMPLATES, REQUEST_LOG=NO_REQUEST_LOG)
+class PageCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Books')
+        cls.products = Product.objects.bulk_create(
+            Product(name=f'Book {i}', description='', price=Decimal('5.00'), category=cls.category)
+            for i in range(3)
+        )
+        cls.user = User.objects.create_user('reader', password='pw')
+        UserProfile.objects.create(user=cls.user, role='customer')
+        cls.staff = User.objects.create_user('clerk', password='pw')
+        UserProfile.objects.create(user=cls.staff, role='staff')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def get(self, url, data=None):
+        response = self.client.get(url, data or {})
+        self.assertEqual(response.status_code, 200)
+        return response['X-Cache']
+
+    def test_second_request_is_a_hit(self):
+        self.assertEqual(self.get('/products/'), 'MISS')
+        with self.assertNumQueries(2):      # session, user; the role is cached
+            self.assertEqual(self.get('/products/'), 'HIT')
+        self.assertEqual(self.get('/products/', {'sort': 'price'}), 'MISS')
+        self.assertEqual(self.get('/products/', {'sort': 'price'}), 'HIT')
+
+        self.client.force_login(self.staff)
+        self.assertEqual(self.get('/products/'), 'MISS')
+
+        stats = pagecache.stats(['products_list'])['products_list']
+        self.assertEqual((stats['hit'], stats['miss']), (2, 3))
+        self.assertAlmostEqual(stats['hit_rate'], 0.4)
+
+    def test_product_changes_invalidate_dependent_pages(self):
+        product, other = self.products[:2]
+        for url in ('/products/', f'/products/{product.id}/', f'/products/{other.id}/', '/categories/'):
+            self.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.price = Decimal('6.00')
+            product.save()
+        self.assertEqual(self.get('/products/'), 'MISS')
+        self.assertEqual(self.get(f'/products/{product.id}/'), 'MISS')
+        self.assertEqual(self.get(f'/products/{other.id}/'), 'HIT')
+        self.assertEqual(self.get('/categories/'), 'MISS')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(id=other.id).update(stock=0)
+        self.assertEqual(self.get(f'/products/{other.id}/'), 'MISS')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Games')
+        self.assertEqual(self.get(f'/products/{other.id}/'), 'MISS')
+
+    def test_stale_entry_served_while_another_request_refreshes(self):
+        self.get('/products/')
+        pagecache.bump('products')
+        response = self.client.get('/products/')
+        key = pagecache.cache_key('products_list', response.wsgi_request, {})
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+        pagecache.bump('products')
+        cache.add(f'{key}:lock', 1)
+        self.assertEqual(self.get('/products/'), 'STALE')
+        cache.delete(f'{key}:lock')
+        self.assertEqual(self.get('/products/'), 'MISS')
+        self.assertEqual(self.get('/products/'), 'HIT')
+
+    def test_cold_miss_renders_without_waiting_for_the_lock(self):
+        response = self.client.get('/categories/')
+        key = pagecache.cache_key('categories_list', response.wsgi_request, {})
+        cache.clear()
+        cache.add(f'{key}:lock', 1)
+        started = time.monotonic()
+        self.assertEqual(self.get('/categories/'), 'MISS')
+        self.assertLess(time.monotonic() - started, 1)
+        # Storing the page is left to the request holding the lock
+        self.assertIsNone(cache.get(key))
+
+    def test_pages_with_messages_are_not_cached(self):
+        self.get('/products/')
+        storage = CookieStorage(self.client.get('/products/').wsgi_request)
+        storage.add(20, 'Saved')
+        response = HttpResponse()
+        storage.update(response)
+        self.client.cookies.update(response.cookies)
+        self.assertNotIn('X-Cache', self.client.get('/products/'))
+
+    @override_settings(TEMPLATES=settings.TEMPLATES)
+    def test_product_cards_are_cached(self):
+        request = RequestFactory().get('/products/')
+        request.user = self.user
+        products = list(Product.objects.select_related('category'))
+        cards = pagecache.render_product_cards(products, request)
+        self.assertIn('Book 0', ''.join(cards))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(pagecache.render_product_cards(products, request), cards)
+
+        products[0].stock = 0
+        products[0].status = 'out_of_stock'
+        fresh = pagecache.render_product_cards(products, request)
+        self.assertIn('Out of Stock', fresh[0])
+        self.assertEqual(fresh[1:], cards[1:])
+
+    @override_settings(TEMPLATES=settings.TEMPLATES)
+    def test_product_list_reuses_cached_cards(self):
+        response = self.client.get('/products/')
+        self.assertEqual(response.content.decode().count('class="product-card"'), 3)
+        # Another sort is another page entry, but the same cards
+        with patch('app.pagecache.render_to_string', side_effect=AssertionError('card re-rendered')):
+            response = self.client.get('/products/', {'sort': 'price'})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, 'Book 2')
+
+
+class RoleCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.clerk = User.objects.create_user('clerk', password='pw')
+        cls.profile = UserProfile.objects.create(user=cls.clerk, role='staff')
+        cls.shopper = User.objects.create_user('shopper', password='pw')
+
+    def setUp(self):
+        cache.clear()
+
+    def fresh(self, user):
+        return User.objects.get(id=user.id)
+
+    def guarded(self, user):
+        view = role_required('staff', 'admin', login_url='/login/')(lambda request: HttpResponse('ok'))
+        request = RequestFactory().get('/products/new/?x=1')
+        request.user = user
+        return view(request)
+
+    def test_role_is_looked_up_once_then_cached(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(get_role(self.clerk), 'staff')
+            self.assertEqual(get_role(self.clerk), 'staff')
+        clerk = self.fresh(self.clerk)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_role(clerk), 'staff')
+        self.assertEqual(get_role(self.shopper), 'customer')
+
+    def test_profile_save_invalidates(self):
+        get_role(self.clerk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile.role = 'customer'
+            self.profile.save()
+        self.assertEqual(get_role(self.fresh(self.clerk)), 'customer')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            UserProfile.objects.create(user=self.shopper, role='admin')
+        self.assertEqual(get_role(self.fresh(self.shopper)), 'admin')
+
+    def test_role_required(self):
+        get_role(self.clerk)
+        clerk = self.fresh(self.clerk)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.guarded(clerk).content, b'ok')
+        response = self.guarded(self.shopper)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.url, '/login/?next=/products/new/%3Fx%3D1')
+
+    async def test_role_required_on_async_views(self):
+        async def view(request):
+            return HttpResponse('ok')
+
+        request = AsyncRequestFactory().get('/')
+
+        async def auser():
+            return self.clerk
+        request.auser = auser
+        response = await role_required('staff', login_url='/login/')(view)(request)
+        self.assertEqual(response.content, b'ok')
+
+    @override_settings(REQUEST_LOG=NO_REQUEST_LOG)
+    def test_middleware_attaches_a_lazy_role(self):
+        self.client.force_login(self.clerk)
+        with self.assertNumQueries(0):
+            request = self.client.get('/static/missing.css').wsgi_request
+        self.assertEqual(request.role, 'staff')
+
+
+class CatalogImportExportTests(TestCase):
+
+    CSV = (
+        'id,name,description,price,category,stock,status,image_url\n'
+        ',Kettle,Boils water,19.99,Kitchen,5,in_stock,\n'
+        ',Toaster,"Two slots,\nchrome",24.50,Kitchen,0,out_of_stock,\n'
+        ',Atlas,Maps,12,Books,3,coming_soon,https://example.com/atlas.png\n'
+    )
+
+    def import_csv(self, text, **kwargs):
+        return catalog_io.import_products(catalog_io.read_rows(io.StringIO(text), 'csv'), **kwargs)
+
+    def test_import_creates_products_and_categories(self):
+        rebuild_index()
+        self.assertEqual(self.import_csv(self.CSV, batch_size=2), (3, 0))
+        kitchen = Category.objects.get(name='Kitchen')
+        self.assertEqual([kitchen.product_count, kitchen.in_stock_count, kitchen.out_of_stock_count], [2, 1, 1])
+        toaster = Product.objects.get(name='Toaster')
+        self.assertEqual((toaster.description, toaster.price), ('Two slots,\nchrome', Decimal('24.50')))
+        self.assertEqual([pk for pk, _ in ranked_search('kettle')], [Product.objects.get(name='Kettle').id])
+
+    def test_rows_with_an_id_update_that_product(self):
+        self.import_csv(self.CSV)
+        kettle = Product.objects.get(name='Kettle')
+        self.import_csv(
+            'id,name,price,category,status\n'
+            f'{kettle.id},Kettle XL,29.99,Appliances,out_of_stock\n'
+        )
+        kettle.refresh_from_db()
+        self.assertEqual((kettle.name, kettle.price, kettle.category.name), ('Kettle XL', Decimal('29.99'), 'Appliances'))
+        self.assertEqual(Product.objects.count(), 3)
+        self.assertEqual(counters.reconcile(), (Category.objects.count(), 0))
+
+    def test_invalid_rows(self):
+        text = 'name,price,category\nLamp,abc,Home\nDesk,10,Home\n,1,Home\n'
+        with self.assertRaisesMessage(catalog_io.RowError, "line 2: invalid price 'abc'"):
+            self.import_csv(text)
+        self.assertEqual(self.import_csv(text, skip_invalid=True), (1, 2))
+
+        rows = catalog_io.read_rows(io.StringIO('{"name": "Lamp"}\n[1]\n'), 'ndjson')
+        with self.assertRaisesMessage(catalog_io.RowError, "line 2: expected a JSON object"):
+            list(rows)
+
+    def test_export_and_reimport_round_trip(self):
+        self.import_csv(self.CSV)
+        for fmt in catalog_io.FORMATS:
+            with self.subTest(fmt=fmt):
+                out = io.StringIO()
+                self.assertEqual(catalog_io.write_rows(out, fmt, catalog_io.export_rows(batch_size=2)), 3)
+                before = list(catalog_io.export_rows())
+                rows = catalog_io.read_rows(io.StringIO(out.getvalue()), fmt)
+                self.assertEqual(catalog_io.import_products(rows), (3, 0))
+                self.assertEqual(list(catalog_io.export_rows()), before)
+
+    def test_commands(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, 'products.csv')
+            with open(source, 'w', encoding='utf-8', newline='') as f:
+                f.write(self.CSV)
+            out = io.StringIO()
+            call_command('import_products', source, '--batch-size', '2', stdout=out)
+            self.assertRegex(out.getvalue(), r'Imported 3 products in [\d.]+s \(\d+ rows/s\)')
+
+            target = os.path.join(directory, 'products.ndjson')
+            call_command('export_products', target, stdout=io.StringIO())
+            with open(target, encoding='utf-8') as f:
+                self.assertEqual(len(f.readlines()), 3)
+
+
+class SQLiteTuningTests(TestCase):
+
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_connections_get_the_tuning_pragmas(self):
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+        self.assertEqual(self.pragma('synchronous'), 1)         # NORMAL
+        self.assertEqual(self.pragma('temp_store'), 2)          # MEMORY
+        self.assertEqual(self.pragma('cache_size'), -20000)
+        self.assertEqual(self.pragma('busy_timeout'), 20000)
+
+    def test_maintenance_command(self):
+        out = io.StringIO()
+        call_command('sqlite_maintenance', stdout=out)
+        # The test database lives in memory, so there is no WAL to checkpoint
+        self.assertIn('Optimized in', out.getvalue())
+
+
+@override_settings(REQUEST_LOG=NO_REQUEST_LOG)
+class ProductSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Office')
+        Product.objects.bulk_create([
+            Product(name='Desk lamp', description='A lamp for your desk', price=Decimal('20.00'), category=category),
+            Product(name='Floor lamp', description='Tall', price=Decimal('40.00'), category=category),
+            Product(name='Desk', description='Oak desk with a drawer', price=Decimal('90.00'), category=category),
+            Product(name='Chair', description='Goes with any desk', price=Decimal('50.00'), category=category),
+        ])
+        cls.user = User.objects.create_user('searcher', password='pw')
+
+    def setUp(self):
+        rebuild_index()
+        self.client.force_login(self.user)
+
+    def search(self, **params):
+        return self.client.get('/api/products/search/', params)
+
+    def names(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [result['name'] for result in response.json()['results']]
+
+    def test_name_matches_rank_above_description_matches(self):
+        names = self.names(self.search(q='desk'))
+        self.assertEqual(set(names), {'Desk lamp', 'Desk', 'Chair'})
+        self.assertEqual(names[-1], 'Chair')
+
+    def test_last_word_matches_as_prefix(self):
+        self.assertEqual(self.names(self.search(q='floor la')), ['Floor lamp'])
+        result = self.search(q='floor la').json()['results'][0]
+        self.assertIn('<mark>', result['highlighted_name'])
+
+    def test_fallback_when_query_has_no_words(self):
+        Product.objects.create(name='C++ primer', description='', price=Decimal('1.00'),
+                               category=Category.objects.get())
+        self.assertEqual(self.names(self.search(q='++')), ['C++ primer'])
+
+    def test_limit_is_clamped(self):
+        self.assertEqual(len(self.names(self.search(q='desk', limit=1))), 1)
+        for limit in (-1, 0):
+            with self.subTest(limit=limit):
+                self.assertEqual(len(self.names(self.search(q='desk', limit=limit))), 1)
+                self.assertEqual(len(self.names(self.search(q='!!', limit=limit))), 0)
+        self.assertEqual(len(self.names(self.search(q='desk', limit=1000))), 3)
+
+    def test_non_integer_limit_is_rejected(self):
+        response = self.search(q='desk', limit='abc')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['status'], 'error')
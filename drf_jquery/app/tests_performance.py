@@ -0,0 +1,294 @@
+"""
+Query-count and performance regression suite for the drf_jquery views.
+
+- Seeds a realistic amount of data (categories, products, users, orders with items)
+- Every view has a fixed query budget; the budget must not change when more
+  rows are added (that would be an N+1)
+- Wall time (best of PERF_REPEAT runs) and peak memory (tracemalloc) are
+  measured for each view and compared with app/perf_baselines.json
+
+Environment variables:
+    PERF_UPDATE_BASELINES=1   write the measured numbers to the baselines file
+    PERF_CHECK_TIMINGS=1      also fail on wall time / peak memory regressions
+                              (query counts are always checked; timings depend
+                              on the machine, so CI opts in)
+    PERF_THRESHOLD=0.5        allowed slowdown as a fraction of the baseline
+    PERF_REPEAT=5             runs per view for the wall time
+"""
+import json
+import os
+import time
+import tracemalloc
+from decimal import Decimal
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from .cart import Cart
+from .models import Category, Product, Order, OrderItem, CartItem, UserProfile
+from .pagination import KeysetPaginator
+from perftools.profiling import QueryProfile
+from .search import rebuild_index, fts_available
+from .sorting import PRODUCT_SORTS
+
+BASELINES_FILE = Path(__file__).with_name('perf_baselines.json')
+
+UPDATE_BASELINES = os.environ.get('PERF_UPDATE_BASELINES') == '1'
+CHECK_TIMINGS = os.environ.get('PERF_CHECK_TIMINGS') == '1'
+THRESHOLD = float(os.environ.get('PERF_THRESHOLD', '0.5'))
+REPEAT = int(os.environ.get('PERF_REPEAT', '5'))
+
+# Timings under this are noise, whatever the relative change
+MIN_WALL_MS = 5.0
+MIN_PEAK_KB = 64.0
+
+# Data volumes; the volume check adds EXTRA_* more and expects the same counts
+CATEGORIES = 10
+PRODUCTS_PER_CATEGORY = 50
+CUSTOMERS = 20
+ORDERS_PER_CUSTOMER = 25
+ITEMS_PER_ORDER = 4
+CART_LINES = 10
+EXTRA_PRODUCTS = 200
+EXTRA_ORDERS = 25
+
+# The real templates are not part of this repo; these touch the same
+# relations the pages display, so lazy querysets are evaluated as they would be
+TEMPLATES = {
+    'dashboard.html': (
+        '{{ profile.role }} {{ total_orders }} {{ total_spent }}'
+        '{% for o in recent_orders %}{{ o.id }} {{ o.status }} {{ o.total_amount }}{% endfor %}'
+    ),
+    'products_list.html': (
+        '{% for p in products %}{{ p.name }} {{ p.price }} {{ p.category.name }} {{ p.get_status_display }}'
+        '{{ p.search_name }} {{ p.search_snippet }}{% endfor %}'
+        '{% for c in categories %}{{ c.name }}{% endfor %}'
+        '{% for key, label in sort_options %}{{ key }}{{ label }}{% endfor %}{{ next_cursor }}'
+    ),
+    'product_detail.html': '{{ product.name }} {{ product.price }} {{ category.name }}',
+    'categories_list.html': '{% for c in categories %}{{ c.name }} {{ c.product_count }}{% endfor %}',
+    'orders_list.html': (
+        '{{ form }}{% for o in orders %}{{ o.id }} {{ o.get_status_display }} {{ o.total_amount }}'
+        '{% for i in o.items.all %}{{ i.product.name }} {{ i.quantity }}{% endfor %}{% endfor %}'
+    ),
+    'order_detail.html': (
+        '{{ order.id }} {{ order.total_amount }}'
+        '{% for i in items %}{{ i.product.name }} {{ i.quantity }} {{ i.price_at_purchase }}{% endfor %}'
+    ),
+    'cart.html': '{% for id, line in cart.items %}{{ line.name }} {{ line.price }} {{ line.qty }}{% endfor %}{{ total }}',
+    'profile.html': '{{ user.username }} {{ profile.role }} {{ profile.city }}',
+    'profile_edit.html': '{{ form }}',
+}
+
+TEST_TEMPLATES = [{
+    'BACKEND': 'django.template.backends.django.DjangoTemplates',
+    'OPTIONS': {
+        'loaders': [('django.template.loaders.locmem.Loader', TEMPLATES)],
+        'context_processors': [
+            'django.template.context_processors.request',
+            'django.contrib.auth.context_processors.auth',
+            'django.contrib.messages.context_processors.messages',
+        ],
+    },
+}]
+
+
+def load_baselines():
+    if not BASELINES_FILE.exists():
+        return {}
+    with open(BASELINES_FILE, encoding='utf-8') as f:
+        return json.load(f)
+
+
+@override_settings(
+    TEMPLATES=TEST_TEMPLATES,
+    REQUEST_LOG={'SINK': 'app.logsinks.FileLogSink', 'PATH': os.devnull},
+    QUERY_PROFILING={'ENABLED': False},
+    # Budgets are for rendering the pages; the page cache would only hide them
+    PAGE_CACHE={'ENABLED': False},
+)
+class ViewPerformanceTests(TestCase):
+
+    results = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper', password='pw')
+        UserProfile.objects.create(user=cls.user, role='customer', city='Kathmandu')
+
+        categories = Category.objects.bulk_create(
+            Category(name=f'Category {i}', description='') for i in range(CATEGORIES)
+        )
+        cls.products = cls.seed_products(categories, CATEGORIES * PRODUCTS_PER_CATEGORY)
+
+        customers = [cls.user] + User.objects.bulk_create(
+            User(username=f'customer{i}') for i in range(CUSTOMERS - 1)
+        )
+        for customer in customers:
+            cls.seed_orders(customer, ORDERS_PER_CUSTOMER)
+
+        cls.order = Order.objects.filter(user=cls.user).first()
+        cls.cart_products = cls.products[:CART_LINES]
+        cls.second_page = KeysetPaginator(
+            Product.objects.all(), PRODUCT_SORTS.get().ordering
+        ).get_page().next_cursor
+        rebuild_index()
+
+    @classmethod
+    def seed_products(cls, categories, count):
+        start = Product.objects.count()
+        return Product.objects.bulk_create(
+            Product(
+                name=f'{("Laptop", "Phone", "Desk", "Chair", "Lamp")[i % 5]} model {start + i}',
+                description=f'A reliable product, batch {i % 7}, suitable for everyday use.',
+                price=Decimal(10 + i % 90) + Decimal('0.99'),
+                category=categories[i % len(categories)],
+                stock=1000,
+            )
+            for i in range(count)
+        )
+
+    @classmethod
+    def seed_orders(cls, user, count):
+        products = Product.objects.order_by('id')[:ITEMS_PER_ORDER * 10]
+        orders = Order.objects.bulk_create(
+            Order(user=user, status=('pending', 'delivered')[i % 2], total_amount=Decimal('100.00'))
+            for i in range(count)
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=products[(o + i) % len(products)], quantity=1,
+                      price_at_purchase=Decimal('25.00'))
+            for o, order in enumerate(orders)
+            for i in range(ITEMS_PER_ORDER)
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        if UPDATE_BASELINES and cls.results:
+            baselines = load_baselines()
+            baselines.update(cls.results)
+            with open(BASELINES_FILE, 'w', encoding='utf-8') as f:
+                json.dump(dict(sorted(baselines.items())), f, indent=2)
+                f.write('\n')
+
+    def setUp(self):
+        cache.clear()
+        # The FTS table check is cached per process; don't count it against one view
+        fts_available()
+        self.client.force_login(self.user)
+
+    def fill_cart(self):
+        CartItem.objects.filter(user=self.user).delete()
+        cart = Cart(self.user)
+        for product in self.cart_products:
+            cart.add(product)
+
+    # ---------- cases ----------
+
+    def cases(self):
+        """(name, method, url, data, prepare) for every view"""
+        product = self.products[0]
+        return [
+            ('dashboard', 'get', '/dashboard/', None, None),
+            ('products_list', 'get', '/products/', None, None),
+            ('products_list_page2', 'get', '/products/', {'cursor': self.second_page}, None),
+            ('products_list_filtered', 'get', '/products/',
+             {'category': product.category_id, 'status': 'in_stock', 'sort': 'price'}, None),
+            ('products_list_search', 'get', '/products/', {'search': 'laptop reliable'}, None),
+            ('product_detail', 'get', f'/products/{product.id}/', None, None),
+            ('categories_list', 'get', '/categories/', None, None),
+            ('orders_list', 'get', '/orders/', None, None),
+            ('order_detail', 'get', f'/orders/{self.order.id}/', None, None),
+            ('cart_view', 'get', '/cart/', None, self.fill_cart),
+            ('add_to_cart', 'post', '/cart/add/', {'item_id': product.id, 'quantity': 1}, None),
+            ('remove_from_cart', 'post', '/cart/remove/', {'item_id': self.cart_products[0].id}, self.fill_cart),
+            ('create_order', 'post', '/orders/create/', None, self.fill_cart),
+            ('profile', 'get', '/profile/', None, None),
+            ('profile_edit', 'get', '/profile/edit/', None, None),
+            ('api_cart', 'get', '/api/cart/', None, self.fill_cart),
+            ('api_user', 'get', '/api/user/', None, None),
+            ('api_product_search', 'get', '/api/products/search/', {'q': 'lap'}, None),
+        ]
+
+    # ---------- measuring ----------
+
+    def request(self, method, url, data):
+        response = getattr(self.client, method)(url, data or {})
+        self.assertLess(response.status_code, 400, f'{method.upper()} {url} -> {response.status_code}')
+        return response
+
+    def count_queries(self, method, url, data, prepare):
+        if prepare:
+            prepare()
+        cache.clear()
+        profile = QueryProfile()
+        with profile.capture():
+            self.request(method, url, data)
+        return profile
+
+    def measure(self, method, url, data, prepare):
+        """Best-of-REPEAT wall time in ms and peak traced memory in KB"""
+        best = None
+        for _ in range(REPEAT):
+            if prepare:
+                prepare()
+            started = time.perf_counter()
+            self.request(method, url, data)
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+
+        if prepare:
+            prepare()
+        tracemalloc.start()
+        try:
+            self.request(method, url, data)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return best, peak / 1024
+
+    # ---------- tests ----------
+
+    def test_views_stay_within_baselines(self):
+        baselines = load_baselines()
+        for name, method, url, data, prepare in self.cases():
+            with self.subTest(view=name):
+                profile = self.count_queries(method, url, data, prepare)
+                wall_ms, peak_kb = self.measure(method, url, data, prepare)
+                self.results[name] = {
+                    'queries': profile.count,
+                    'wall_ms': round(wall_ms, 2),
+                    'peak_kb': round(peak_kb, 1),
+                }
+                if UPDATE_BASELINES:
+                    continue
+
+                baseline = baselines.get(name)
+                self.assertIsNotNone(baseline, f"No baseline for '{name}', run with PERF_UPDATE_BASELINES=1")
+                self.assertLessEqual(
+                    profile.count, baseline['queries'],
+                    f"{name} query budget exceeded:\n{profile.report()}",
+                )
+                if CHECK_TIMINGS:
+                    limit = max(baseline['wall_ms'] * (1 + THRESHOLD), MIN_WALL_MS)
+                    self.assertLessEqual(wall_ms, limit, f"{name} wall time {wall_ms:.1f}ms")
+                    limit = max(baseline['peak_kb'] * (1 + THRESHOLD), MIN_PEAK_KB)
+                    self.assertLessEqual(peak_kb, limit, f"{name} peak memory {peak_kb:.0f}KB")
+
+    def test_query_counts_do_not_grow_with_data(self):
+        before = {
+            name: self.count_queries(method, url, data, prepare).count
+            for name, method, url, data, prepare in self.cases()
+        }
+
+        self.seed_products(list(Category.objects.all()), EXTRA_PRODUCTS)
+        self.seed_orders(self.user, EXTRA_ORDERS)
+        self.cart_products = Product.objects.order_by('-id')[:CART_LINES * 2]
+
+        for name, method, url, data, prepare in self.cases():
+            with self.subTest(view=name):
+                profile = self.count_queries(method, url, data, prepare)
+                self.assertEqual(profile.count, before[name], profile.report())
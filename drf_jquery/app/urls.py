@@ -41,6 +41,7 @@ urlpatterns = [
     # ==================== API ENDPOINTS ====================
     path('api/cart/', views.api_cart_data, name='api_cart'),
     path('api/user/', views.api_user_info, name='api_user'),
+    path('api/products/search/', views.api_product_search, name='api_product_search'),
     
     # ==================== LEGACY ROUTES ====================
     path('items/', views.listItems, name='items'),
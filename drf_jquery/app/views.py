@@ -1,16 +1,22 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
-from django.contrib.auth.models import User
-from django.contrib.auth.decorators import login_required, user_passes_test
-from django.http import JsonResponse, HttpResponse
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse, HttpResponseBadRequest
 from django.views.decorators.http import require_http_methods
-from django.db.models import Q, Sum, Count
+from django.utils.html import escape
 from decimal import Decimal
 from datetime import datetime
 import logging
 
-from .models import Item, Product, Category, Order, OrderItem, UserProfile
+from .models import Item, Product, Category, Order, UserProfile
 from .forms import UserRegistrationForm, UserLoginForm, ProductForm, CategoryForm, UserProfileForm, OrderFilterForm
+from .pagination import KeysetPaginator, InvalidCursor
+from .search import search_products, ranked_search, attach_snippets
+from .sorting import PRODUCT_SORTS, UnknownSort
+from .cart import Cart, format_cents
+from .services import place_order, OrderError, get_dashboard_stats
+from .pagecache import cached_view
+from .roles import staff_required
 
 logger = logging.getLogger(__name__)
 
@@ -121,38 +127,41 @@ def dashboard(request):
     except UserProfile.DoesNotExist:
         profile = UserProfile.objects.create(user=request.user, role='customer')
     
-    # Get statistics
-    total_orders = Order.objects.filter(user=request.user).count()
-    total_spent = Order.objects.filter(user=request.user).aggregate(Sum('total_amount'))['total_amount__sum'] or 0
+    # Statistics come from the per-user cache (app/services.py)
+    stats = get_dashboard_stats(request.user.id)
     
     context = {
         'profile': profile,
-        'total_orders': total_orders,
-        'total_spent': total_spent,
-        'recent_orders': Order.objects.filter(user=request.user).order_by('-created_at')[:5],
+        'total_orders': stats['total_orders'],
+        'total_spent': Decimal(stats['total_spent']),
+        'recent_orders': stats['recent_orders'],
     }
     
     return render(request, 'dashboard.html', context)
 
 
+PRODUCTS_PER_PAGE = 20
+
+
 @login_required(login_url='login')
+@cached_view(lambda request: ['products', 'categories'])
 def products_list(request):
     """
     Product List View
     - Demonstrates CRUD Read operation
     - Shows filter and search functionality
-    - Implements pagination-like behavior
+    - Search results carry highlighted `search_name` / `search_snippet`
+    - Keyset (cursor) pagination: ?cursor=... continues from the previous page
+    - Cached per filters/sort/cursor and role (app/pagecache.py); the product
+      cards inside are cached fragments shared by every page that shows them
     """
     products = Product.objects.all().select_related('category')
     categories = Category.objects.all()
     
-    # Search functionality
+    # Search functionality (full-text index, see app/search.py)
     search_query = request.GET.get('search', '')
     if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) | 
-            Q(description__icontains=search_query)
-        )
+        products = search_products(products, search_query)
     
     # Filter by category
     category_id = request.GET.get('category', '')
@@ -164,27 +173,49 @@ def products_list(request):
     if status:
         products = products.filter(status=status)
     
-    # Sorting
-    sort_by = request.GET.get('sort', '-created_at')
-    products = products.order_by(sort_by)
+    # Sorting - only whitelisted, index-backed sorts (see app/sorting.py)
+    try:
+        sort = PRODUCT_SORTS.get(request.GET.get('sort'))
+    except UnknownSort:
+        # Don't echo the requested key back: it is caller-controlled
+        allowed = ', '.join(key for key, _ in PRODUCT_SORTS.choices())
+        return HttpResponseBadRequest(f"Unknown sort option. Allowed: {allowed}", content_type='text/plain')
+    
+    # Pagination
+    paginator = KeysetPaginator(products, sort.ordering, page_size=PRODUCTS_PER_PAGE)
+    try:
+        page = paginator.get_page(request.GET.get('cursor'))
+    except InvalidCursor:
+        logger.warning(f"Invalid product list cursor from {request.user.username}")
+        page = paginator.get_page()
+    
+    if search_query:
+        attach_snippets(page.items, search_query)
     
     context = {
-        'products': products,
+        'products': page.items,
+        'page': page,
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
         'categories': categories,
         'search_query': search_query,
         'selected_category': category_id,
         'selected_status': status,
+        'selected_sort': sort.key,
+        'sort_options': PRODUCT_SORTS.choices(),
     }
     
     return render(request, 'products_list.html', context)
 
 
 @login_required(login_url='login')
+@cached_view(lambda request, product_id: [f'product:{product_id}', 'products:bulk', 'categories'])
 def product_detail(request, product_id):
     """
     Product Detail View
     - Shows single product details
     - Demonstrates one-to-many relationships
+    - Cached per product and role (app/pagecache.py)
     """
     product = get_object_or_404(Product, id=product_id)
     
@@ -196,16 +227,8 @@ def product_detail(request, product_id):
     return render(request, 'product_detail.html', context)
 
 
-def is_staff(user):
-    """Check if user is staff member"""
-    try:
-        return user.profile.role in ['staff', 'admin']
-    except UserProfile.DoesNotExist:
-        return False
-
-
 @login_required(login_url='login')
-@user_passes_test(is_staff, login_url='dashboard')
+@staff_required
 def product_create(request):
     """
     Create Product View
@@ -230,7 +253,7 @@ def product_create(request):
 
 
 @login_required(login_url='login')
-@user_passes_test(is_staff, login_url='dashboard')
+@staff_required
 def product_update(request, product_id):
     """
     Update Product View
@@ -253,7 +276,7 @@ def product_update(request, product_id):
 
 
 @login_required(login_url='login')
-@user_passes_test(is_staff, login_url='dashboard')
+@staff_required
 @require_http_methods(["POST"])
 def product_delete(request, product_id):
     """
@@ -277,9 +300,15 @@ def product_delete(request, product_id):
 # ==================== CATEGORY VIEWS ====================
 
 @login_required(login_url='login')
+@cached_view(lambda request: ['categories', 'products'])
 def categories_list(request):
-    """List all categories"""
-    categories = Category.objects.annotate(product_count=Count('products'))
+    """
+    List all categories
+    - product_count and the per-status counts are columns on Category (app/counters.py),
+      so this is a plain scan of the category table
+    - Cached per role; the counts change with the products (app/pagecache.py)
+    """
+    categories = Category.objects.all()
     
     context = {
         'categories': categories,
@@ -289,7 +318,7 @@ def categories_list(request):
 
 
 @login_required(login_url='login')
-@user_passes_test(is_staff, login_url='dashboard')
+@staff_required
 def category_create(request):
     """Create new category"""
     if request.method == 'POST':
@@ -365,32 +394,21 @@ def order_detail(request, order_id):
 def create_order_from_cart(request):
     """
     Create Order from Cart
-    - Demonstrates conversion of session cart to database records
+    - Demonstrates conversion of the cart to database records
     - CRUD Create for multiple related models
+    - Uses current database prices and checks stock
     """
-    cart = request.session.get('cart', {})
+    cart = Cart(request.user)
+    lines = cart.lines()
     
-    if not cart:
+    if not lines:
         return JsonResponse({'status': 'error', 'message': 'Cart is empty'}, status=400)
     
     try:
-        # Create order
-        total_amount = sum(Decimal(item['price']) * item['qty'] for item in cart.values())
-        order = Order.objects.create(user=request.user, total_amount=total_amount)
+        # Products, stock and order items are handled in one transaction (app/services.py)
+        order = place_order(request.user, lines)
         
-        # Create order items
-        for item_id, item_data in cart.items():
-            product = Product.objects.get(id=int(item_id))
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                quantity=item_data['qty'],
-                price_at_purchase=Decimal(item_data['price'])
-            )
-        
-        # Clear cart session
-        request.session['cart'] = {}
-        request.session.modified = True
+        cart.clear()
         
         logger.info(f"Order created for {request.user.username}: Order #{order.id}")
         
@@ -400,26 +418,28 @@ def create_order_from_cart(request):
             'order_id': order.id
         })
     
+    except OrderError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
     except Exception as e:
         logger.error(f"Error creating order: {str(e)}")
         return JsonResponse({'status': 'error', 'message': 'Error creating order'}, status=500)
 
 
 # ==================== CART VIEWS ====================
+# The cart lives in a server-side store behind the Cart API (app/cart.py).
+# Totals are precomputed; add/remove responses only carry the changed line.
 
 @login_required(login_url='login')
 def cart_view(request):
     """
     Shopping Cart View
-    - Demonstrates session handling
     - Shows add/update/delete cart functionality
     - Uses AJAX for dynamic updates
     """
     if request.method == 'GET':
-        cart = request.session.get('cart', {})
-        total = sum(Decimal(item['price']) * item['qty'] for item in cart.values())
+        cart = Cart(request.user)
         
-        return render(request, 'cart.html', {'cart': cart, 'total': total})
+        return render(request, 'cart.html', {'cart': cart.lines(), 'total': cart.subtotal})
     
     return redirect('products_list')
 
@@ -430,43 +450,31 @@ def add_to_cart(request):
     """
     Add item to cart (AJAX endpoint)
     - Demonstrates form data handling via POST
-    - Manages session data
-    - Returns JSON response
+    - Updates a single cart line
+    - Returns JSON response with the changed line only
     """
     try:
         item_id = str(request.POST.get('item_id'))
         quantity = int(request.POST.get('quantity', 1))
+        if quantity < 1:
+            return JsonResponse({'status': 'error', 'message': 'Quantity must be at least 1'}, status=400)
         
         product = Product.objects.get(id=item_id)
         
-        cart = request.session.get('cart', {})
-        
-        if item_id in cart:
-            cart[item_id]['qty'] += quantity
-        else:
-            cart[item_id] = {
-                'name': product.name,
-                'price': str(product.price),
-                'qty': quantity,
-                'image_url': product.image_url or ''
-            }
-        
-        request.session['cart'] = cart
-        request.session.modified = True
-        
-        total = sum(Decimal(item['price']) * item['qty'] for item in cart.values())
+        cart = Cart(request.user)
+        line = cart.add(product, quantity)
         
         logger.info(f"Item added to cart by {request.user.username}: {product.name}")
         
         return JsonResponse({
             'status': 'success',
             'message': f'{product.name} added to cart',
-            'cart': cart,
-            'total': str(total),
-            'cart_count': len(cart)
+            'item_id': item_id,
+            'item': line,
+            **cart.totals()
         })
     
-    except Product.DoesNotExist:
+    except (Product.DoesNotExist, ValueError):
         return JsonResponse({'status': 'error', 'message': 'Product not found'}, status=404)
     except Exception as e:
         logger.error(f"Error adding to cart: {str(e)}")
@@ -479,20 +487,18 @@ def remove_from_cart(request):
     """Remove item from cart"""
     try:
         item_id = str(request.POST.get('item_id'))
-        cart = request.session.get('cart', {})
+        if not item_id.isdigit():
+            return JsonResponse({'status': 'error', 'message': 'Item not found in cart'}, status=404)
         
-        if item_id in cart:
-            removed_item = cart.pop(item_id)
-            request.session['cart'] = cart
-            request.session.modified = True
-            
-            total = sum(Decimal(item['price']) * item['qty'] for item in cart.values())
-            
+        cart = Cart(request.user)
+        removed_item = cart.remove(item_id)
+        
+        if removed_item is not None:
             return JsonResponse({
                 'status': 'success',
                 'message': f'{removed_item["name"]} removed from cart',
-                'cart': cart,
-                'total': str(total)
+                'removed_item_id': item_id,
+                **cart.totals()
             })
         else:
             return JsonResponse({'status': 'error', 'message': 'Item not found in cart'}, status=404)
@@ -551,38 +557,89 @@ def profile_edit(request):
 # ==================== API ENDPOINTS ====================
 
 @login_required(login_url='login')
-def api_cart_data(request):
-    """API endpoint to get cart data as JSON"""
-    cart = request.session.get('cart', {})
-    total = sum(Decimal(item['price']) * item['qty'] for item in cart.values())
+async def api_cart_data(request):
+    """
+    API endpoint to get the full cart as JSON
+    - Async: under ASGI the cart and session reads don't hold a worker thread
+    """
+    cart = Cart(await request.auser())
+    lines = await cart.alines()
+    await cart.aload_summary()
     
     return JsonResponse({
-        'cart': cart,
-        'total': str(total),
-        'item_count': len(cart)
+        'cart': lines,
+        'total': format_cents(cart.subtotal_cents),
+        'item_count': cart.count,
+        'item_quantity': cart.quantity
     })
 
 
 @login_required(login_url='login')
-def api_user_info(request):
-    """API endpoint to get user information as JSON"""
-    try:
-        profile = request.user.profile
-    except UserProfile.DoesNotExist:
-        profile = None
+async def api_user_info(request):
+    """
+    API endpoint to get user information as JSON
+    - Async, like api_cart_data
+    """
+    user = await request.auser()
+    profile = await UserProfile.objects.filter(user_id=user.id).afirst()
     
     return JsonResponse({
-        'username': request.user.username,
-        'email': request.user.email,
-        'first_name': request.user.first_name,
-        'last_name': request.user.last_name,
-        'is_authenticated': request.user.is_authenticated,
+        'username': user.username,
+        'email': user.email,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'is_authenticated': user.is_authenticated,
         'profile': {
             'role': profile.role if profile else 'customer',
             'phone': profile.phone if profile else '',
             'city': profile.city if profile else '',
         } if profile else None,
-        'login_time': request.session.get('login_time', '')
+        'login_time': await request.session.aget('login_time', '')
+    })
+
+
+SEARCH_LIMIT_DEFAULT = 10
+SEARCH_LIMIT_MAX = 50
+
+
+@login_required(login_url='login')
+def api_product_search(request):
+    """
+    API endpoint for ranked product search (BM25), e.g. for autocomplete
+    - ?q=<text>&limit=<n>, limit clamped to 1..50; a non-integer limit is a 400
+    - Returns best matches first with highlighted name/description snippets
+    """
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = max(1, min(int(request.GET.get('limit', SEARCH_LIMIT_DEFAULT)), SEARCH_LIMIT_MAX))
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'limit must be a whole number'}, status=400)
+    
+    if not query:
+        return JsonResponse({'query': query, 'results': []})
+    
+    scores = dict(ranked_search(query, limit=limit))
+    if scores:
+        products = Product.objects.in_bulk(list(scores))
+        results = sorted(products.values(), key=lambda p: scores[p.id])
+    else:
+        # No full-text index (or query too short for it) - plain filter instead
+        results = list(search_products(Product.objects.all(), query)[:limit])
+    
+    attach_snippets(results, query)
+    
+    return JsonResponse({
+        'query': query,
+        'results': [
+            {
+                'id': product.id,
+                'name': product.name,
+                'price': str(product.price),
+                'highlighted_name': getattr(product, 'search_name', escape(product.name)),
+                'snippet': getattr(product, 'search_snippet', ''),
+            }
+            for product in results
+        ],
     })
 
 
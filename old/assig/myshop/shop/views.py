@@ -40,13 +40,14 @@ def view_cart(request):
     cart = request.session.get('cart', {})
     products = []
     total = 0
+    # One query for the whole cart instead of one per line
+    found = Product.objects.in_bulk([int(pid) for pid in cart])
     for pid, qty in cart.items():
-        try:
-            product = Product.objects.get(id=pid)
-            product.qty = qty
-            product.total_price = qty * product.price
-            total += product.total_price
-            products.append(product)
-        except Product.DoesNotExist:
+        product = found.get(int(pid))
+        if product is None:
             continue
+        product.qty = qty
+        product.total_price = qty * product.price
+        total += product.total_price
+        products.append(product)
     return render(request, 'cart.html', {'products': products, 'total': total})
@@ -0,0 +1,3 @@
+# Performance helpers shared by the Django projects in this repository
+# - Each project's settings puts the repository root on sys.path and lists
+#   'perftools' in INSTALLED_APPS (for its management commands)
@@ -0,0 +1,188 @@
+import decimal
+import json
+from json.encoder import encode_basestring
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db import models
+from django.utils import timezone
+from rest_framework import fields as drf_fields
+from rest_framework import relations
+from rest_framework.settings import api_settings
+
+# Compiled read-only serializers
+# - A ModelSerializer runs get_attribute() + to_representation() for every
+#   field of every row, on model instances built just to be serialized
+# - CompiledSerializer looks at the serializer's fields once and generates a
+#   function that turns .values_list() tuples into the same dicts
+# - Fields whose representation is the database value (ints, strings, bools,
+#   primary keys) are copied as-is; decimals and datetimes get a specialised
+#   converter; anything else falls back to the field's own to_representation
+# - json_rows() goes one step further for streaming: each row straight to
+#   the JSON text JSONRenderer would produce for it (ints, non-null strings
+#   and decimals are formatted inline, anything else goes through json)
+# - Read-only: for list GETs. Writes still go through the regular serializer
+
+IDENTITY_FIELDS = (
+    drf_fields.BooleanField,
+    drf_fields.CharField,
+    drf_fields.IntegerField,
+    drf_fields.FloatField,
+    drf_fields.ChoiceField,
+    relations.PrimaryKeyRelatedField,
+)
+
+
+def _decimal_converter(field):
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if field.decimal_places is None or field.normalize_output or field.localize or not coerce_to_string:
+        return None
+
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    rounding = field.rounding
+
+    def convert(value):
+        return f'{value.quantize(exponent, rounding=rounding, context=context):f}'
+    return convert
+
+
+def _datetime_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != drf_fields.ISO_8601 or hasattr(field, 'timezone'):
+        return None
+    if not settings.USE_TZ:
+        return None
+
+    # Resolved per call, like DRF does, in case a view activates another timezone
+    def make_converter():
+        current = timezone.get_current_timezone()
+
+        def convert(value):
+            if value.tzinfo is None:
+                return field.to_representation(value)
+            value = value.astimezone(current).isoformat()
+            if value.endswith('+00:00'):
+                value = value[:-6] + 'Z'
+            return value
+        return convert
+    return make_converter
+
+
+# The separators and escaping JSONRenderer uses by default
+_encode_json = json.JSONEncoder(ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode
+
+
+def _concatenation(parts):
+    """[(is_expression, text)] -> one `'literal' + expression + ...` expression"""
+    merged = []
+    for is_expression, text in parts:
+        if merged and not is_expression and not merged[-1][0]:
+            merged[-1] = (False, merged[-1][1] + text)
+        else:
+            merged.append((is_expression, text))
+    return ' + '.join(text if is_expression else repr(text) for is_expression, text in merged)
+
+
+class CompiledSerializer:
+    """
+    Fast, read-only stand-in for `serializer_class(queryset, many=True).data`.
+
+        TASK_ROWS = CompiledSerializer(TaskSerializer)
+        TASK_ROWS.serialize(Task.objects.all())   # -> [{'id': 1, 'title': ...}, ...]
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        serializer = serializer_class()
+        model = serializer_class.Meta.model
+
+        self.names = []
+        self.sources = []
+        self.converters = []    # (argument name, converter or factory, is_factory)
+        expressions = []
+        json_parts = []         # (is_expression, literal text or value expression)
+
+        for index, field in enumerate(serializer._readable_fields):
+            source = field.source
+            if source == '*' or '.' in source:
+                raise ImproperlyConfigured(
+                    f"{serializer_class.__name__}.{field.field_name}: only plain model fields can be compiled"
+                )
+            try:
+                model_field = model._meta.get_field(source)
+            except FieldDoesNotExist:
+                raise ImproperlyConfigured(
+                    f"{serializer_class.__name__}.{field.field_name}: '{source}' is not a model field"
+                )
+
+            self.names.append(field.field_name)
+            self.sources.append(source)
+
+            value = f'row[{index}]'
+            key = json.dumps(field.field_name, ensure_ascii=False)
+            json_parts.append((False, ('{' if not json_parts else ',') + key + ':'))
+            if isinstance(field, drf_fields.DecimalField):
+                converter, factory = _decimal_converter(field), False
+            elif isinstance(field, drf_fields.DateTimeField):
+                converter, factory = _datetime_converter(field), True
+            elif isinstance(field, IDENTITY_FIELDS) and not isinstance(field, drf_fields.MultipleChoiceField):
+                expressions.append(f'{field.field_name!r}: {value}')
+                if model_field.null:
+                    json_parts.append((True, f'_json({value})'))
+                elif isinstance(field, drf_fields.IntegerField) and isinstance(model_field, models.IntegerField):
+                    json_parts.append((True, f'str({value})'))
+                elif isinstance(field, drf_fields.CharField) and isinstance(model_field, (models.CharField, models.TextField)):
+                    json_parts.append((True, f'_string({value})'))
+                else:
+                    json_parts.append((True, f'_json({value})'))
+                continue
+            else:
+                converter, factory = None, False
+
+            specialised = converter is not None
+            if converter is None:
+                converter, factory = field.to_representation, False
+            name = f'c{index}'
+            self.converters.append((name, converter, factory))
+            call = f'{name}({value})'
+            if model_field.null or isinstance(field, drf_fields.DateTimeField):
+                call = f'(None if {value} is None else {call})'
+            expressions.append(f'{field.field_name!r}: {call}')
+            if specialised and isinstance(field, drf_fields.DecimalField) and not model_field.null:
+                # The converter returns plain digits, nothing to escape
+                json_parts += [(False, '"'), (True, call), (False, '"')]
+            else:
+                json_parts.append((True, f'_json({call})'))
+        json_parts.append((False, '}' if json_parts else '{}'))
+
+        arguments = ''.join(f', {name}' for name, _, _ in self.converters)
+        json_expression = _concatenation(json_parts)
+        source_code = (
+            f"def to_dicts(rows{arguments}):\n"
+            f"    return [{{{', '.join(expressions)}}} for row in rows]\n"
+            f"\n"
+            f"def to_json(rows, _string, _json{arguments}):\n"
+            f"    return [{json_expression} for row in rows]\n"
+        )
+        namespace = {}
+        exec(compile(source_code, f'<compiled {serializer_class.__name__}>', 'exec'), namespace)
+        self._to_dicts = namespace['to_dicts']
+        self._to_json = namespace['to_json']
+        self.source_code = source_code
+
+    def serialize_rows(self, rows):
+        """values_list() tuples in the order of `self.sources` -> list of dicts"""
+        return self._to_dicts(rows, *self._resolve_converters())
+
+    def json_rows(self, rows):
+        """values_list() tuples -> list of compact JSON objects, as JSONRenderer writes them"""
+        return self._to_json(rows, encode_basestring, _encode_json, *self._resolve_converters())
+
+    def _resolve_converters(self):
+        return [converter() if factory else converter for _, converter, factory in self.converters]
+
+    def serialize(self, queryset):
+        return self.serialize_rows(queryset.values_list(*self.sources))
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+class Command(BaseCommand):
+    help = (
+        "SQLite housekeeping: PRAGMA optimize (refresh query planner statistics) and a "
+        "WAL checkpoint (fold the -wal file back into the database). Schedule it "
+        "(cron, systemd timer) or pass --interval to keep it running."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=0, help="Repeat every N seconds (default: run once)")
+        parser.add_argument(
+            '--truncate', action='store_true',
+            help="Wait for readers and truncate the WAL file (default: PASSIVE, never blocks)",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("sqlite_maintenance only applies to SQLite databases")
+        mode = 'TRUNCATE' if options['truncate'] else 'PASSIVE'
+        while True:
+            self.run_once(mode)
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    def run_once(self, mode):
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA optimize")
+            cursor.execute("PRAGMA journal_mode")
+            if cursor.fetchone()[0] != 'wal':
+                elapsed = (time.perf_counter() - started) * 1000
+                self.stdout.write(f"Optimized in {elapsed:.0f}ms (database is not in WAL mode)")
+                return
+            cursor.execute(f"PRAGMA wal_checkpoint({mode})")
+            busy, wal_pages, checkpointed = cursor.fetchone()
+        elapsed = (time.perf_counter() - started) * 1000
+        style = self.style.WARNING if busy else self.style.SUCCESS
+        self.stdout.write(style(
+            f"Optimized and checkpointed {checkpointed}/{wal_pages} WAL pages in {elapsed:.0f}ms"
+            + (" (readers still on old pages, will retry next run)" if busy else "")
+        ))
@@ -0,0 +1,207 @@
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Per-request SQL profiling
+# - QueryProfile is installed with connection.execute_wrapper() on every
+#   database connection, so it sees each query the ORM (or raw cursors) run
+# - Queries are grouped by fingerprint: the SQL with literals and IN lists
+#   collapsed, so `WHERE id = 1` and `WHERE id = 2` count as the same query
+# - The same fingerprint running many times with different parameters is the
+#   usual N+1 shape (one query per row of an earlier result)
+# - QueryProfilingMiddleware below reports it per request;
+#   query_budget() below fails a test when a block runs too many queries
+
+DEFAULTS = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 1.0,        # fraction of requests profiled
+    'N_PLUS_ONE_THRESHOLD': 5,  # same fingerprint this many times -> N+1
+    'SERVER_TIMING': True,      # add a Server-Timing header to profiled responses
+}
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_VALUES_ROWS_RE = re.compile(r'\((?:\s*\?\s*,?)+\)(?:\s*,\s*\((?:\s*\?\s*,?)+\))+')
+
+
+def get_profiling_settings():
+    return {**DEFAULTS, **getattr(settings, 'QUERY_PROFILING', {})}
+
+
+def fingerprint(sql):
+    """
+    Normalise SQL so queries that only differ in their values compare equal.
+    SELECT ... WHERE id IN (%s, %s, %s) -> SELECT ... WHERE id IN (...)
+    INSERT ... VALUES (%s, %s), (%s, %s) -> INSERT ... VALUES (...)
+    """
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    sql = _VALUES_ROWS_RE.sub('(...)', sql)
+    return ' '.join(sql.split())
+
+
+class QueryProfile:
+    """Callable for connection.execute_wrapper() that records every query"""
+
+    def __init__(self, n_plus_one_threshold=5):
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+        self.executions = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+            self.executions[(sql, repr(params))] += 1
+
+    @contextmanager
+    def capture(self):
+        """Record the queries of every configured database inside the block"""
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    def duplicates(self):
+        """[(sql, times)] for identical queries (same SQL and params) run more than once"""
+        return [(sql, n) for (sql, _), n in self.executions.most_common() if n > 1]
+
+    def fingerprints(self):
+        """Counter of fingerprint -> times; normalised here rather than per query"""
+        counts = Counter()
+        for sql, n in self.statements.items():
+            counts[fingerprint(sql)] += n
+        return counts
+
+    def n_plus_one(self):
+        """
+        [(fingerprint, times)] for query shapes repeated at least the threshold.
+        Multi-row INSERTs are left out: repeating those is batching, not N+1.
+        """
+        return [
+            (sql, n) for sql, n in self.fingerprints().most_common()
+            if n >= self.n_plus_one_threshold and 'VALUES (...)' not in sql
+        ]
+
+    def server_timing(self):
+        return f'db;dur={self.duration * 1000:.2f};desc="{self.count} queries"'
+
+    def summary(self):
+        return (
+            f"{self.count} queries in {self.duration * 1000:.1f}ms, "
+            f"{len(self.duplicates())} duplicated, {len(self.n_plus_one())} N+1 pattern(s)"
+        )
+
+    def report(self):
+        lines = [self.summary()]
+        lines += [f"  N+1 x{n}: {sql}" for sql, n in self.n_plus_one()]
+        lines += [f"  duplicate x{n}: {sql}" for sql, n in self.duplicates()]
+        return '\n'.join(lines)
+
+
+@contextmanager
+def query_budget(max_queries, n_plus_one_threshold=None):
+    """
+    Fail (AssertionError) when the block runs more than `max_queries` queries.
+    The message lists the repeated query shapes, which is usually the fix.
+
+        with query_budget(6):
+            self.client.get('/api/...')
+    """
+    threshold = n_plus_one_threshold or get_profiling_settings()['N_PLUS_ONE_THRESHOLD']
+    profile = QueryProfile(threshold)
+    with profile.capture():
+        yield profile
+    if profile.count > max_queries:
+        raise AssertionError(f"Query budget of {max_queries} exceeded: {profile.report()}")
+
+
+class QueryProfilingMiddleware:
+    """
+    Per-request SQL profiling.
+    - Adds `Server-Timing: db;dur=..;desc="N queries", app;dur=..` so the
+      numbers show up in the browser dev tools
+    - Logs a warning when an N+1 pattern is found; describe() names the
+      request in that warning, subclasses can add to it (e.g. a request ID)
+    - settings.QUERY_PROFILING['SAMPLE_RATE'] profiles only a fraction of requests;
+      when disabled the middleware removes itself at startup (no per-request cost)
+    - Sync and async capable
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = get_profiling_settings()
+        if not config['ENABLED'] or config['SAMPLE_RATE'] <= 0:
+            raise MiddlewareNotUsed
+        self.sample_rate = config['SAMPLE_RATE']
+        self.threshold = config['N_PLUS_ONE_THRESHOLD']
+        self.server_timing = config['SERVER_TIMING']
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        profile = QueryProfile(self.threshold)
+        started = time.perf_counter()
+        with profile.capture():
+            response = self.get_response(request)
+        return self.report(request, response, profile, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return await self.get_response(request)
+
+        # Connections are per thread and async ORM queries run on asgiref's
+        # thread for this request, so the wrappers are installed over there
+        profile = QueryProfile(self.threshold)
+        capture = profile.capture()
+        started = time.perf_counter()
+        await sync_to_async(capture.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(capture.__exit__)(None, None, None)
+        return self.report(request, response, profile, time.perf_counter() - started)
+
+    def describe(self, request):
+        return f"{request.method} {request.path}"
+
+    def report(self, request, response, profile, duration):
+        if profile.n_plus_one():
+            logger.warning(f"N+1 queries on {self.describe(request)}: {profile.report()}")
+        else:
+            logger.debug(f"Queries for {request.path}: {profile.summary()}")
+
+        if self.server_timing:
+            timing = f'{profile.server_timing()}, app;dur={duration * 1000:.2f}'
+            if response.has_header('Server-Timing'):
+                timing = f"{response['Server-Timing']}, {timing}"
+            response['Server-Timing'] = timing
+        return response
@@ -0,0 +1,24 @@
+# SQLite tuned for concurrent readers and writers, used as DATABASES OPTIONS
+# by every project in this repository
+# - WAL: reads don't block the writer and the writer doesn't block reads
+# - synchronous=NORMAL: durable with WAL, fsyncs only at checkpoints
+# - mmap_size / cache_size (128MB / 20MB) and temp_store=MEMORY: fewer read
+#   syscalls, temporary sort/index b-trees stay in memory
+# - timeout: SQLite's busy_timeout in seconds; wait for the lock instead of
+#   failing with "database is locked"
+# - transaction_mode IMMEDIATE: atomic() takes the write lock at BEGIN, so a
+#   transaction that reads then writes can't deadlock on the lock upgrade
+# Projects with perftools in INSTALLED_APPS should run
+# `python manage.py sqlite_maintenance` periodically (PRAGMA optimize, WAL checkpoint)
+
+SQLITE_OPTIONS = {
+    'init_command': (
+        'PRAGMA journal_mode=WAL;'
+        'PRAGMA synchronous=NORMAL;'
+        'PRAGMA mmap_size=134217728;'
+        'PRAGMA cache_size=-20000;'
+        'PRAGMA temp_store=MEMORY;'
+    ),
+    'transaction_mode': 'IMMEDIATE',
+    'timeout': 20,
+}